@@ -1,31 +1,43 @@
 import os
 import json
 import asyncio
-import psutil
-import platform
 import requests
 import time
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Request, Query, UploadFile, File, Form, Body
+from fastapi import FastAPI, HTTPException, Depends, Request, Query, UploadFile, File, Form, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from fastapi.routing import APIRoute
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Union, Literal
-from llama_cpp import Llama
+from typing import List, Optional, Dict, Any, Union, Literal, Tuple
 from sse_starlette.sse import EventSourceResponse
 from contextlib import asynccontextmanager
 import uuid
+import weakref
 import logging
 import traceback
 from rag import (
     RAGSystem as RagSystem, RagQuery, RagResponse, RagCollection, RagDocument,
-    get_rag_system, Document, Chroma, VECTORS_DIR
+    get_rag_system, validate_collection_name, Document
 )
 import mimetypes
 from turbosearch import TurboSearch, SearchQuery as TsSearchQuery, SearchResponse as TsSearchResponse
 import re
 from quiz_manager import QuizManager
 from models import Quiz, QuizQuestion, QuizAttempt, QuizResult, QuizGenerationRequest, StudentProgressReport
+from profiling import ProfilingMiddleware, request_profiler, memory_profiler
+from system_monitor import system_sampler
+from loop_monitor import loop_watchdog, LOOP_WATCHDOG_ENABLED
+from startup import startup_report
+from embeddings import embedding_stats, default_embedding_model_id
+from embedding_cache import get_embedding_cache
+from reranker import get_reranker
+from ingestion import ingestion_queue
+from directory_sync import directory_watcher
+from parsing import document_parser
+from document_registry import HASH_BLOCK_SIZE, new_content_hasher
+from chunking import ChunkingSettings
+from near_duplicates import NEAR_DUPLICATE_MEASURE_QUERIES
 
 # Configuration
 MODEL_PATH = os.environ.get("MODEL_PATH", "models/DISABLED_Meta-Llama-3.1-8B-Instruct.Q4_K_M.gguf")  # Temporarily disabled
@@ -36,6 +48,14 @@ TOP_P = 0.9
 TOP_K = 40
 FREQUENCY_PENALTY = 0.0
 PRESENCE_PENALTY = 0.0
+# Préchauffage au démarrage : complétion factice, collections RAG ("*" = toutes, vide = aucune)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+WARMUP_COLLECTIONS = os.environ.get("WARMUP_COLLECTIONS", "*")
+WARMUP_MAX_TOKENS = int(os.environ.get("WARMUP_MAX_TOKENS", "8"))
+# Jeton requis pour les endpoints d'administration (désactivés s'il n'est pas défini)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Nombre maximal de requêtes d'un appel à /rag/query/batch
+RAG_BATCH_MAX_QUERIES = int(os.environ.get("RAG_BATCH_MAX_QUERIES", "100"))
 SYSTEM_PROMPT = """Tu es TURBO PECH, un assistant pédagogique pour les élèves du collège et du lycée. 
 Tu es spécialisé dans l'explication de cours et l'aide aux devoirs.
 Tu donnes des explications claires, concises et adaptées au niveau scolaire de l'élève.
@@ -44,6 +64,7 @@ Tu encourages l'élève à réfléchir par lui-même."""
 
 # Ajouter les chemins pour les données RAG
 DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "documents")
+UPLOADS_TMP_DIR = os.path.join(DOCUMENTS_DIR, ".uploads")
 
 # Model instance and information
 model_instance = None
@@ -124,8 +145,11 @@ async def cleanup_expired_sessions():
 # API-specific adaptateurs
 class ModelAdapterBase:
     """Base class for model adapters"""
+    # Adaptateurs vivants, pour le suivi mémoire de leur historique
+    instances = weakref.WeakSet()
+    
     def __init__(self):
-        pass
+        ModelAdapterBase.instances.add(self)
     
     async def generate_response(self, messages, params):
         """Generate a response from the model"""
@@ -467,6 +491,9 @@ class GeminiAdapter(ModelAdapterBase):
             "output_tokens": output_tokens,
             "input_preview": input_text[:100] + "..." if len(input_text) > 100 else input_text
         })
+        # Keep only recent history, like token_usage["history"]
+        if len(self.history) > 100:
+            self.history = self.history[-100:]
         
         return {
             "input_tokens": input_tokens,
@@ -1160,6 +1187,12 @@ class OpenRouterAdapter(ModelAdapterBase):
 def get_model_adapter():
     """Get the appropriate model adapter based on current configuration"""
     if model_info["model_type"] == "local":
+        if model_instance is None and startup_report.is_loading("llama_model"):
+            raise HTTPException(
+                status_code=503,
+                detail="Le modèle local est en cours de chargement, veuillez réessayer dans quelques instants.",
+                headers={"Retry-After": "5"}
+            )
         if model_instance is None:
             # Si le modèle local n'est pas chargé, essayer de basculer vers une API disponible
             print("Local model not available, attempting to switch to API model...")
@@ -1205,40 +1238,113 @@ def get_model_adapter():
     else:
         raise Exception(f"Unknown model type: {model_info['model_type']}")
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Load model on startup - Fixed indentation issues (June 2, 2025)
+def load_llama_model(model_path, n_ctx, n_batch, n_gpu_layers):
+    """Charge un modèle llama.cpp (import différé de llama_cpp, coûteux au démarrage)"""
+    from llama_cpp import Llama
+    return Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,
+        n_batch=n_batch,
+        n_gpu_layers=n_gpu_layers
+    )
+
+def load_startup_model():
+    """Charge le modèle local configuré au démarrage (exécuté hors de la boucle d'événements)"""
     global model_instance
-    model_instance = None  # Initialize to None
+    
+    if not os.path.exists(MODEL_PATH):
+        print(f"Model file not found: {MODEL_PATH}")
+        print("TurboChat will start without local model, API models will be available")
+        startup_report.skip("llama_model", f"Model file not found: {MODEL_PATH}")
+        return
     
     try:
-        if os.path.exists(MODEL_PATH):
-            print(f"Attempting to load model from: {MODEL_PATH}")
-            start_time = datetime.now()
-            model_instance = Llama(
-                model_path=MODEL_PATH,
-                n_ctx=model_info["n_ctx"],
-                n_batch=model_info["n_batch"],
-                n_gpu_layers=model_info["n_gpu_layers"]
-            )
-            load_time = (datetime.now() - start_time).total_seconds()
-            model_info["load_time"] = load_time
-            print(f"Model loaded successfully in {load_time:.2f} seconds")
-        else:
-            print(f"Model file not found: {MODEL_PATH}")
-            print("TurboChat will start without local model, API models will be available")
+        print(f"Attempting to load model from: {MODEL_PATH}")
+        start_time = datetime.now()
+        model_instance = load_llama_model(
+            MODEL_PATH,
+            model_info["n_ctx"],
+            model_info["n_batch"],
+            model_info["n_gpu_layers"]
+        )
+        load_time = (datetime.now() - start_time).total_seconds()
+        model_info["load_time"] = load_time
+        print(f"Model loaded successfully in {load_time:.2f} seconds")
     except Exception as e:
         print(f"Error loading model: {e}")
         print("TurboChat will start without local model, API models will be available")
         model_instance = None
+        raise
+
+def warm_up_model():
+    """Exécute une complétion courte pour charger les poids du modèle en mémoire"""
+    if model_instance is None:
+        startup_report.skip("warmup_model", "Aucun modèle local chargé")
+        return
+    
+    model_instance.create_chat_completion(
+        messages=[{"role": "user", "content": "Bonjour"}],
+        max_tokens=WARMUP_MAX_TOKENS,
+        temperature=0.0
+    )
+
+def warm_up_rag():
+    """Préchauffe les encodeurs et les collections RAG configurées"""
+    if WARMUP_COLLECTIONS.strip() == "*":
+        collection_names = None
+    else:
+        collection_names = [name.strip() for name in WARMUP_COLLECTIONS.split(",") if name.strip()]
+    return get_rag_system().warm_up(collection_names)
+
+async def run_warmup(*init_tasks):
+    """Attend la fin de l'initialisation, préchauffe l'instance puis la déclare prête"""
+    await asyncio.gather(*init_tasks)
+    
+    if WARMUP_ENABLED:
+        await startup_report.run_in_background("warmup_model", warm_up_model)
+        await startup_report.run_in_background("warmup_rag", warm_up_rag)
+    
+    startup_report.mark_ready()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Les sous-systèmes lourds sont initialisés en tâche de fond :
+    # l'API accepte des requêtes immédiatement
+    global model_instance
+    model_instance = None  # Initialize to None
+    
+    model_task = startup_report.run_in_background("llama_model", load_startup_model)
+    rag_task = startup_report.run_in_background("rag_system", lambda: get_rag_system().initialize())
+    if WARMUP_ENABLED:
+        startup_report.register("warmup_model")
+        startup_report.register("warmup_rag")
+    warmup_task = asyncio.create_task(run_warmup(model_task, rag_task))
     
     # Démarrer la tâche de nettoyage des sessions
     cleanup_task = asyncio.create_task(cleanup_expired_sessions())
     
+    # Démarrer l'échantillonneur des métriques système
+    system_sampler.start()
+    
+    # Démarrer la surveillance des répertoires synchronisés
+    directory_watcher.start(ingestion_queue.submit_sync)
+    
+    # Démarrer la détection des blocages de la boucle d'événements
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start(app.routes)
+    
+    startup_report.mark_serving()
+    
     # Yield control to the application
     yield
     
     # Cleanup on shutdown
+    warmup_task.cancel()
+    try:
+        await warmup_task
+    except asyncio.CancelledError:
+        pass
+    await asyncio.gather(model_task, rag_task)
     model_instance = None
     
     # Annuler la tâche de nettoyage
@@ -1247,8 +1353,28 @@ async def lifespan(app: FastAPI):
         await cleanup_task
     except asyncio.CancelledError:
         pass
+    
+    await system_sampler.stop()
+    await loop_watchdog.stop()
+    
+    # Arrêter la surveillance des répertoires et les workers d'indexation
+    directory_watcher.stop()
+    await asyncio.get_running_loop().run_in_executor(None, ingestion_queue.shutdown)
+    await asyncio.get_running_loop().run_in_executor(None, document_parser.shutdown)
+
+class ProfiledRoute(APIRoute):
+    """
+    Route dont l'endpoint synchrone (exécuté dans le pool de threads) est
+    échantillonné avec sa requête lorsqu'elle est profilée
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = request_profiler.traced(endpoint)
+        super().__init__(path, endpoint, **kwargs)
 
 app = FastAPI(lifespan=lifespan)
+app.router.route_class = ProfiledRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -1259,6 +1385,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profilage à la demande des requêtes correspondant à une session armée
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Vérifie le jeton d'administration transmis dans l'en-tête X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoints d'administration désactivés (ADMIN_TOKEN non défini)")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+def check_collection_name(collection_name: str) -> str:
+    """Refuse (400) un nom de collection qui ne peut pas servir de nom de répertoire"""
+    try:
+        return validate_collection_name(collection_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def rag_collection_exists(collection_name: str) -> bool:
+    """
+    Indique si une collection existe, hors de la boucle d'événements
+    
+    Au premier appel, `has_collection` peut parcourir les collections
+    ChromaDB pour compléter leurs statistiques.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None, lambda: get_rag_system().has_collection(collection_name)
+    )
+
 class ChatMessage(BaseModel):
     role: str
     content: str
@@ -1291,6 +1445,8 @@ async def root():
 @app.get("/status")
 async def status():
     if model_info["model_type"] == "local" and model_instance is None:
+        if startup_report.is_loading("llama_model"):
+            return {"status": "Model loading"}
         return {"status": "Model not loaded"}
     
     # Return extended model information
@@ -1319,21 +1475,161 @@ async def status():
     return status_info
 
 @app.get("/system-stats")
-async def system_stats():
-    """Return system statistics (CPU, memory, etc.)"""
+async def system_stats(history: int = Query(30, ge=0, le=system_sampler.samples.maxlen)):
+    """Return the latest system statistics recorded by the background sampler"""
+    latest = system_sampler.latest()
+    if latest is None:
+        # Premier relevé en cours (juste après le démarrage) : pas d'appel bloquant ici
+        return JSONResponse(status_code=503, content={"detail": "Premier relevé système en cours"})
+
     return {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory": {
-            "total": psutil.virtual_memory().total,
-            "available": psutil.virtual_memory().available,
-            "percent": psutil.virtual_memory().percent,
-            "used": psutil.virtual_memory().used
-        },
-        "platform": platform.platform(),
-        "python_version": platform.python_version(),
-        "uptime": datetime.now().timestamp() - psutil.boot_time()
+        **latest,
+        "platform": system_sampler.static_info["platform"],
+        "python_version": system_sampler.static_info["python_version"],
+        "uptime": time.time() - system_sampler.static_info["boot_time"],
+        "sampler_interval": system_sampler.interval,
+        "history": system_sampler.history(history)
     }
 
+@app.get("/ready")
+async def ready():
+    """Readiness : 200 une fois le modèle chargé et l'instance préchauffée, 503 sinon"""
+    report = startup_report.report()
+    if not startup_report.ready:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+@app.get("/startup")
+async def startup_status():
+    """Rapport de démarrage : durée d'initialisation de chaque sous-système"""
+    return startup_report.report()
+
+@app.get("/metrics")
+async def metrics():
+    """Compteurs de fonctionnement du backend"""
+    def collect() -> Dict[str, Any]:
+        # Ouverture du cache SQLite et requêtes de comptage : hors de la boucle d'événements
+        embedding_cache = get_embedding_cache()
+        reranker = get_reranker()
+        return {
+            "embeddings": embedding_stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "reranker": reranker.stats() if reranker else None,
+            "rag_query_cache": get_rag_system().query_cache.stats()
+        }
+
+    collected = await asyncio.get_running_loop().run_in_executor(None, collect)
+    return {"event_loop": loop_watchdog.metrics(), **collected}
+
+# Endpoints d'administration : profilage et instantanés mémoire
+class ProfilingRequest(BaseModel):
+    route: str
+    count: int = 10
+    interval_ms: float = 5.0
+
+class MemorySnapshotRequest(BaseModel):
+    label: Optional[str] = None
+
+memory_profiler.watch("stream_sessions", lambda: len(stream_sessions))
+memory_profiler.watch("token_usage.history", lambda: len(token_usage["history"]))
+memory_profiler.watch(
+    "model_adapters.history",
+    lambda: sum(len(getattr(adapter, "history", ())) for adapter in list(ModelAdapterBase.instances))
+)
+memory_profiler.watch("rag.vectorstores", lambda: len(get_rag_system().vectorstores))
+
+@app.post("/admin/profiling/sessions", dependencies=[Depends(require_admin)])
+async def start_profiling(request: ProfilingRequest):
+    """Active le profilage par échantillonnage pour les N prochaines requêtes d'une route"""
+    try:
+        session = request_profiler.arm(request.route, request.count, request.interval_ms / 1000)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session.to_dict()
+
+@app.get("/admin/profiling/sessions", dependencies=[Depends(require_admin)])
+async def list_profiling_sessions():
+    """Liste les sessions de profilage"""
+    return {"sessions": request_profiler.list_sessions()}
+
+@app.get("/admin/profiling/sessions/{session_id}/flamegraph", dependencies=[Depends(require_admin)])
+async def download_flamegraph(session_id: str):
+    """Télécharge les piles échantillonnées au format folded (flamegraph.pl, speedscope)"""
+    try:
+        folded = request_profiler.export_folded(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session de profilage {session_id} non trouvée")
+    return PlainTextResponse(
+        folded,
+        headers={"Content-Disposition": f'attachment; filename="profile-{session_id}.folded"'}
+    )
+
+@app.delete("/admin/profiling/sessions/{session_id}", dependencies=[Depends(require_admin)])
+async def delete_profiling_session(session_id: str):
+    """Supprime une session de profilage"""
+    if not request_profiler.delete_session(session_id):
+        raise HTTPException(status_code=404, detail=f"Session de profilage {session_id} non trouvée")
+    return {"message": f"Session {session_id} supprimée"}
+
+@app.get("/admin/event-loop/blocks", dependencies=[Depends(require_admin)])
+async def list_event_loop_blocks(limit: int = Query(20, ge=1, le=50)):
+    """Derniers blocages de la boucle d'événements avec la pile complète"""
+    return {"blocks": loop_watchdog.recent(limit)}
+
+@app.delete("/admin/event-loop/blocks", dependencies=[Depends(require_admin)])
+async def reset_event_loop_blocks():
+    """Remet à zéro les compteurs de blocage"""
+    loop_watchdog.reset()
+    return {"message": "Compteurs de blocage réinitialisés"}
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def memory_status():
+    """État du traçage mémoire et taille des conteneurs surveillés"""
+    return memory_profiler.status()
+
+@app.post("/admin/memory/start", dependencies=[Depends(require_admin)])
+async def start_memory_tracing(nframes: int = Query(25, ge=1, le=100)):
+    """Démarre tracemalloc"""
+    return memory_profiler.start(nframes)
+
+@app.post("/admin/memory/stop", dependencies=[Depends(require_admin)])
+async def stop_memory_tracing():
+    """Arrête tracemalloc et supprime les instantanés"""
+    return memory_profiler.stop()
+
+@app.post("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(request: MemorySnapshotRequest = Body(None)):
+    """Prend un instantané tracemalloc"""
+    try:
+        return memory_profiler.take_snapshot(request.label if request else None)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/memory/snapshots/{snapshot_id}", dependencies=[Depends(require_admin)])
+async def get_memory_snapshot(
+    snapshot_id: str,
+    limit: int = Query(25, ge=1),
+    key_type: Literal["lineno", "filename", "traceback"] = "lineno"
+):
+    """Renvoie les principaux postes d'allocation d'un instantané"""
+    try:
+        return memory_profiler.top(snapshot_id, limit, key_type)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Instantané {snapshot_id} non trouvé")
+
+@app.get("/admin/memory/diff", dependencies=[Depends(require_admin)])
+async def diff_memory_snapshots(
+    base: str,
+    current: str,
+    limit: int = Query(25, ge=1),
+    key_type: Literal["lineno", "filename", "traceback"] = "lineno"
+):
+    """Compare deux instantanés tracemalloc"""
+    try:
+        return memory_profiler.diff(base, current, limit, key_type)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Instantané {e.args[0]} non trouvé")
+
 @app.post("/set-api-key")
 async def set_api_key(request: ApiKeyRequest):
     """Set the API key for external API services"""
@@ -1581,11 +1877,11 @@ async def switch_to_local(model_file: str = Query(...)):
     # Load new model
     try:
         start_time = datetime.now()
-        model_instance = Llama(
-            model_path=model_path,
-            n_ctx=model_info["n_ctx"],
-            n_batch=model_info["n_batch"],
-            n_gpu_layers=model_info["n_gpu_layers"]
+        model_instance = load_llama_model(
+            model_path,
+            model_info["n_ctx"],
+            model_info["n_batch"],
+            model_info["n_gpu_layers"]
         )
         load_time = (datetime.now() - start_time).total_seconds()
         model_info["load_time"] = load_time
@@ -1939,12 +2235,7 @@ async def change_model(model_request: ModelChangeRequest = None, model_file: str
         
         # Load new model
         start_time = datetime.now()
-        model_instance = Llama(
-            model_path=new_model_path,
-            n_ctx=n_ctx,
-            n_batch=n_batch,
-            n_gpu_layers=n_gpu_layers
-        )
+        model_instance = load_llama_model(new_model_path, n_ctx, n_batch, n_gpu_layers)
         load_time = (datetime.now() - start_time).total_seconds()
         model_info["load_time"] = load_time
         
@@ -1963,7 +2254,6 @@ async def change_model(model_request: ModelChangeRequest = None, model_file: str
 # Imports pour le système RAG
 from fastapi import UploadFile, File, Form
 from fastapi.responses import JSONResponse
-import shutil
 from rag import (
     RAGSystem as RagSystem, RagQuery, RagResponse, RagCollection, RagDocument,
     get_rag_system
@@ -1981,6 +2271,31 @@ class RagQueryRequest(BaseModel):
     hybrid_search: bool = True
     use_in_prompt: bool = True
     filter: Optional[Dict] = None
+    nprobe: Optional[int] = None
+    fusion: Optional[str] = None
+    vector_weight: Optional[float] = None
+    min_score: Optional[float] = None
+    rerank: Optional[bool] = None
+    mmr_lambda: Optional[float] = None
+
+    def to_rag_query(self) -> RagQuery:
+        """Requête RAG correspondante"""
+        return RagQuery(
+            query=self.query,
+            collection_name=validate_collection_name(self.collection_name),
+            top_k=self.top_k,
+            hybrid_search=self.hybrid_search,
+            filter=self.filter,
+            nprobe=self.nprobe,
+            fusion=self.fusion,
+            vector_weight=self.vector_weight,
+            min_score=self.min_score,
+            rerank=self.rerank,
+            mmr_lambda=self.mmr_lambda
+        )
+
+class RagQueryBatchRequest(BaseModel):
+    queries: List[RagQueryRequest]
 
 class RagChat(BaseModel):
     query: str
@@ -2010,31 +2325,41 @@ async def list_rag_collections():
 
 # Endpoint pour créer une nouvelle collection RAG
 @app.post("/rag/collections/{name}")
-async def create_rag_collection(name: str, description: Optional[str] = None):
+async def create_rag_collection(
+    name: str,
+    description: Optional[str] = None,
+    vector_backend: Optional[str] = None,
+    quantization: Optional[str] = None
+):
     """
     Crée une nouvelle collection RAG
+    
+    `vector_backend` choisit le stockage des vecteurs : "chroma", "flat"
+    (fichier projeté en mémoire, recherche exacte) ou "ivf" (même stockage,
+    recherche approchée par listes inversées). `quantization` ("int8" ou
+    "binary", stockage "flat" uniquement) réduit la mémoire occupée par les
+    vecteurs.
     """
+    check_collection_name(name)
     try:
         # Vérifier si la collection existe déjà
-        collections = get_rag_system().list_collections()
-        if name in [col.name for col in collections]:
+        if await rag_collection_exists(name):
             return JSONResponse(
                 status_code=400,
                 content={"message": f"La collection '{name}' existe déjà"}
             )
         
         # Créer la collection en ajoutant un document vide
-        from langchain_core.documents import Document
-        empty_document = Document(page_content="", metadata={"source": "init"})
-        
-        rag_system = get_rag_system()
-        vectorstore = Chroma(
-            collection_name=name,
-            embedding_function=rag_system.embedding_model,
-            persist_directory=VECTORS_DIR
-        )
-        vectorstore.add_documents([empty_document])
-        vectorstore.persist()
+        try:
+            # Encodage et écriture du document d'initialisation hors de la boucle d'événements
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                request_profiler.traced(
+                    lambda: get_rag_system().create_collection(name, vector_backend=vector_backend, quantization=quantization)
+                )
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
         
         return JSONResponse(
             status_code=201,
@@ -2050,8 +2375,11 @@ async def delete_rag_collection(name: str):
     """
     Supprime une collection RAG
     """
+    check_collection_name(name)
     try:
-        result = get_rag_system().delete_collection(name)
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(get_rag_system().delete_collection), name
+        )
         if result:
             return {"message": f"Collection '{name}' supprimée avec succès"}
         else:
@@ -2063,6 +2391,106 @@ async def delete_rag_collection(name: str):
         logging.error(f"Erreur lors de la suppression de la collection RAG: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+# Endpoints de réglage du découpage d'une collection
+@app.get("/rag/collections/{name}/chunking")
+async def get_rag_chunking(name: str):
+    """
+    Réglages de découpage d'une collection (taille et chevauchement en tokens)
+    """
+    check_collection_name(name)
+    return get_rag_system().get_chunking_settings(name).dict()
+
+@app.put("/rag/collections/{name}/chunking", dependencies=[Depends(require_admin)])
+async def set_rag_chunking(name: str, settings: ChunkingSettings):
+    """
+    Modifie les réglages de découpage d'une collection
+    
+    Les documents déjà indexés ne sont pas redécoupés : les réglages
+    s'appliquent aux prochaines indexations.
+    """
+    check_collection_name(name)
+    try:
+        settings = get_rag_system().set_chunking_settings(name, settings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Découpage de la collection '{name}' mis à jour", "chunking": settings.dict()}
+
+@app.get("/rag/collections/{name}/near-duplicates")
+async def get_rag_near_duplicates(name: str, queries: int = NEAR_DUPLICATE_MEASURE_QUERIES):
+    """
+    Chunks quasi identiques écartés à l'indexation d'une collection, place et
+    temps de recherche gagnés (`queries` requêtes BM25 chronométrées ; 0 : pas de mesure)
+    """
+    check_collection_name(name)
+    if not await rag_collection_exists(name):
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' non trouvée")
+    if not 0 <= queries <= 1000:
+        raise HTTPException(status_code=400, detail="queries doit être compris entre 0 et 1000")
+    return await asyncio.get_running_loop().run_in_executor(
+        None, request_profiler.traced(get_rag_system().near_duplicate_stats), name, queries
+    )
+
+@app.get("/rag/collections/{name}/ann-report", dependencies=[Depends(require_admin)])
+async def get_rag_ann_report(name: str, queries: int = 100, k: int = 10):
+    """
+    Rappel et latence de la recherche approchée d'une collection "ivf" (pour
+    chaque valeur de `nprobe`) ou quantifiée, mesurés face à la recherche exacte
+    """
+    check_collection_name(name)
+    if not await rag_collection_exists(name):
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' non trouvée")
+    try:
+        # Plusieurs centaines de recherches : hors de la boucle d'événements
+        return await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(lambda: get_rag_system().ann_report(name, queries=queries, k=k))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def save_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Enregistre un fichier téléversé par blocs en calculant son empreinte
+    
+    Returns:
+        Chemin du fichier temporaire et empreinte du contenu
+    """
+    os.makedirs(UPLOADS_TMP_DIR, exist_ok=True)
+    temp_file_path = os.path.join(UPLOADS_TMP_DIR, str(uuid.uuid4()))
+    hasher = new_content_hasher()
+    with open(temp_file_path, "wb") as temp_file:
+        while True:
+            block = await file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            temp_file.write(block)
+    return temp_file_path, hasher.hexdigest()
+
+def check_upload_filename(filename: Optional[str]) -> str:
+    """
+    Nom sous lequel ranger un fichier téléversé (sans les répertoires du client)
+    
+    Refuse (400) un nom vide, "." ou ".." et un nom réduit à des séparateurs :
+    le fichier remplacerait sinon son répertoire de destination.
+    """
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail=f"Nom de fichier invalide: {filename!r}")
+    return name
+
+def store_upload(temp_file_path: str, filename: str, collection_name: str, content_hash: str) -> str:
+    """
+    Range un fichier téléversé sous DOCUMENTS_DIR/<collection>/<empreinte>/<nom>
+    
+    Deux fichiers de même nom mais de contenus différents ne s'écrasent pas.
+    Le nom doit avoir été vérifié par check_upload_filename.
+    """
+    target_dir = os.path.join(DOCUMENTS_DIR, validate_collection_name(collection_name), content_hash[:16])
+    os.makedirs(target_dir, exist_ok=True)
+    file_path = os.path.join(target_dir, filename)
+    os.replace(temp_file_path, file_path)
+    return file_path
+
 # Endpoint pour télécharger et indexer un fichier
 @app.post("/rag/upload")
 async def upload_document(
@@ -2070,60 +2498,290 @@ async def upload_document(
     collection_name: str = Form("default")
 ):
     """
-    Télécharge et indexe un fichier dans une collection RAG
+    Télécharge un fichier et met en file son indexation dans une collection RAG
+    
+    L'indexation se poursuit en arrière-plan : l'avancement se consulte
+    via /rag/jobs/{job_id}.
     """
+    check_collection_name(collection_name)
+    filename = check_upload_filename(file.filename)
     try:
         # Vérifier si la collection existe
-        collections = get_rag_system().list_collections()
-        if collection_name not in [col.name for col in collections]:
+        if not await rag_collection_exists(collection_name):
             # Créer la collection si elle n'existe pas
             await create_rag_collection(collection_name)
         
-        # Enregistrer le fichier temporairement
-        temp_file_path = os.path.join(DOCUMENTS_DIR, file.filename)
-        with open(temp_file_path, "wb") as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
+        # Enregistrer le fichier en calculant son empreinte
+        temp_file_path, content_hash = await save_upload(file)
+        
+        # Un contenu déjà indexé dans la collection n'est pas réindexé
+        existing = get_rag_system().document_registry(collection_name).get(content_hash)
+        if existing is not None:
+            os.remove(temp_file_path)
+            return {
+                "message": f"Fichier '{file.filename}' déjà indexé ({existing['filename']})",
+                "document_id": existing["document_id"],
+                "job_id": None,
+                "status": "duplicate"
+            }
         
-        # Indexer le fichier
-        result = get_rag_system().process_file(temp_file_path, collection_name)
+        file_path = store_upload(temp_file_path, filename, collection_name, content_hash)
+        
+        # Mettre en file l'indexation (une archive passe par l'indexation en masse)
+        if filename.lower().endswith(".zip"):
+            job = ingestion_queue.submit_bulk([file_path], collection_name)
+        else:
+            job = ingestion_queue.submit(file_path, collection_name, filename, content_hash)
         
         return {
-            "message": f"Fichier '{file.filename}' indexé avec succès",
-            "document_id": result.id,
-            "status": result.status,
-            "chunks": len(result.chunks)
+            "message": f"Fichier '{file.filename}' en file d'indexation",
+            "job_id": job.id,
+            "status": job.status
         }
     except Exception as e:
         logging.error(f"Erreur lors de l'upload et de l'indexation: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+# Endpoint pour télécharger et indexer un lot de fichiers ou une archive zip
+@app.post("/rag/upload/bulk")
+async def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    collection_name: str = Form("default")
+):
+    """
+    Télécharge plusieurs fichiers ou archives zip et les indexe en une seule tâche
+    
+    Les archives sont extraites membre par membre au fil de l'indexation.
+    """
+    check_collection_name(collection_name)
+    filenames = [check_upload_filename(file.filename) for file in files]
+    try:
+        if not await rag_collection_exists(collection_name):
+            await create_rag_collection(collection_name)
+        
+        paths = []
+        content_hashes = {}
+        for file, filename in zip(files, filenames):
+            temp_file_path, content_hash = await save_upload(file)
+            path = store_upload(temp_file_path, filename, collection_name, content_hash)
+            paths.append(path)
+            content_hashes[path] = content_hash
+        
+        job = ingestion_queue.submit_bulk(paths, collection_name, content_hashes)
+        
+        return {
+            "message": f"{len(paths)} fichier(s) en file d'indexation",
+            "job_id": job.id,
+            "status": job.status
+        }
+    except Exception as e:
+        logging.error(f"Erreur lors de l'upload en masse: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+
+class RagSyncRequest(BaseModel):
+    directory: str
+    watch: bool = False
+
+# Endpoints de synchronisation d'une collection avec un répertoire du serveur
+@app.post("/rag/collections/{name}/sync", dependencies=[Depends(require_admin)])
+async def sync_rag_collection(name: str, request: RagSyncRequest):
+    """
+    Synchronise une collection avec un répertoire : seuls les fichiers nouveaux
+    ou modifiés sont réindexés, les chunks des fichiers supprimés sont retirés
+    
+    Avec `watch`, le répertoire est ensuite surveillé et resynchronisé à chaque changement.
+    """
+    check_collection_name(name)
+    if not os.path.isdir(request.directory):
+        raise HTTPException(status_code=400, detail=f"Répertoire {request.directory} introuvable")
+    
+    if not await rag_collection_exists(name):
+        await create_rag_collection(name)
+    
+    job = ingestion_queue.submit_sync(name, request.directory)
+    if request.watch:
+        directory_watcher.watch(name, request.directory)
+    
+    return {"job_id": job.id, "status": job.status, "watched": request.watch}
+
+@app.get("/rag/sync/watched", dependencies=[Depends(require_admin)])
+async def list_watched_directories():
+    """
+    Répertoires surveillés, par collection
+    """
+    return {"interval": directory_watcher.interval, "watched": directory_watcher.list_watched()}
+
+@app.delete("/rag/collections/{name}/sync", dependencies=[Depends(require_admin)])
+async def unwatch_rag_collection(name: str):
+    """
+    Arrête la surveillance du répertoire d'une collection
+    """
+    check_collection_name(name)
+    if not directory_watcher.unwatch(name):
+        raise HTTPException(status_code=404, detail=f"Aucun répertoire surveillé pour la collection {name}")
+    return {"message": f"Surveillance arrêtée pour la collection {name}"}
+
+def get_ingestion_job(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Tâche d'indexation {job_id} non trouvée")
+    return job
+
+# Endpoints de suivi des tâches d'indexation
+@app.get("/rag/jobs")
+async def list_ingestion_jobs(collection_name: Optional[str] = None):
+    """
+    Liste les tâches d'indexation, des plus récentes aux plus anciennes
+    """
+    if collection_name is not None:
+        check_collection_name(collection_name)
+    return {"jobs": ingestion_queue.list_jobs(collection_name), **ingestion_queue.stats()}
+
+@app.get("/rag/jobs/{job_id}")
+async def get_ingestion_job_status(job_id: str):
+    """
+    Avancement d'une tâche d'indexation
+    """
+    return get_ingestion_job(job_id).to_dict()
+
+@app.get("/rag/jobs/{job_id}/events")
+async def stream_ingestion_job(job_id: str):
+    """
+    Diffuse l'avancement d'une tâche d'indexation (SSE) jusqu'à sa fin
+    """
+    job = get_ingestion_job(job_id)
+    
+    async def event_generator():
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield {"event": "progress", "data": json.dumps(job.to_dict())}
+                if job.finished:
+                    yield {"event": "done", "data": json.dumps(job.to_dict())}
+                    return
+            await asyncio.sleep(0.5)
+    
+    return EventSourceResponse(event_generator())
+
+@app.post("/rag/jobs/{job_id}/cancel")
+async def cancel_ingestion_job(job_id: str):
+    """
+    Annule une tâche d'indexation en attente ou en cours
+    """
+    get_ingestion_job(job_id)
+    try:
+        return ingestion_queue.cancel(job_id).to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/rag/jobs/{job_id}/retry")
+async def retry_ingestion_job(job_id: str):
+    """
+    Relance une tâche d'indexation échouée ou annulée
+    """
+    get_ingestion_job(job_id)
+    try:
+        return ingestion_queue.retry(job_id).to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Endpoint pour consulter les performances des moteurs d'embedding
+@app.get("/rag/embeddings/stats")
+async def get_embedding_stats():
+    """
+    Débit d'indexation et latence des requêtes des moteurs d'embedding
+    """
+    cache = get_embedding_cache()
+    return {
+        "default_model": default_embedding_model_id(),
+        "engines": embedding_stats(),
+        "cache": cache.stats() if cache else None
+    }
+
+# Endpoint pour consulter les performances du reclassement
+@app.get("/rag/rerank/stats")
+async def get_rerank_stats():
+    """
+    Latence du modèle de reclassement et taux de succès de son cache
+    """
+    reranker = get_reranker()
+    return reranker.stats() if reranker else {"model": None}
+
+# Endpoint pour consulter le cache des réponses RAG
+@app.get("/rag/query/cache/stats")
+async def get_rag_query_cache_stats():
+    """
+    Taux de succès du cache des réponses RAG, global et par collection
+    """
+    return get_rag_system().query_cache.stats()
+
 # Endpoint pour interroger une collection RAG
 @app.post("/rag/query")
 async def query_rag_collection(request: RagQueryRequest):
     """
     Interroge une collection RAG
+    
+    Chaque source porte son score fusionné (`score`, entre 0 et 1), ses
+    scores d'origine (`bm25_score`, `vector_score` : similarité cosinus) et,
+    si les chunks ont été reclassés, le score du cross-encoder (`rerank_score`).
+    Avec `mmr_lambda`, les sources sont diversifiées et suivent l'ordre de sélection MMR.
     """
     try:
-        rag_query = RagQuery(
-            query=request.query,
-            collection_name=request.collection_name,
-            top_k=request.top_k,
-            hybrid_search=request.hybrid_search,
-            filter=request.filter
+        # Recherche, reclassement et MMR hors de la boucle d'événements
+        response = await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(get_rag_system().query), request.to_rag_query()
         )
         
-        response = get_rag_system().query(rag_query)
-        
         return {
             "query": response.query,
             "contexts": response.contexts,
             "sources": response.sources,
             "elapsed_time": response.elapsed_time
         }
+    except ValueError as e:
+        # Collection inconnue ou réglage de recherche invalide
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Erreur lors de la requête RAG: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+# Endpoint pour interroger des collections RAG avec plusieurs requêtes
+@app.post("/rag/query/batch")
+async def query_rag_batch(request: RagQueryBatchRequest):
+    """
+    Interroge des collections RAG avec plusieurs requêtes en un seul appel
+    
+    Les requêtes sont encodées en un seul lot et cherchées ensemble (voir
+    `RAGSystem.query_batch`) ; les résultats suivent l'ordre des requêtes.
+    Une requête invalide fait échouer tout le lot.
+    """
+    if len(request.queries) > RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Au plus {RAG_BATCH_MAX_QUERIES} requêtes par lot")
+    try:
+        rag_queries = [query.to_rag_query() for query in request.queries]
+        responses = await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(get_rag_system().query_batch), rag_queries
+        )
+        
+        return {
+            "results": [
+                {
+                    "query": response.query,
+                    "contexts": response.contexts,
+                    "sources": response.sources,
+                    "elapsed_time": response.elapsed_time
+                }
+                for response in responses
+            ]
+        }
+    except ValueError as e:
+        # Collection inconnue ou réglage de recherche invalide
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Erreur lors de la requête RAG par lot: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+
 def create_rag_system_prompt(context):
     """Crée un prompt système amélioré pour le RAG."""
     return (
@@ -2182,15 +2840,14 @@ async def rag_chat(request: RagChat):
         
     if not collection_name:
         raise HTTPException(status_code=400, detail="Collection name is required")
+    check_collection_name(collection_name)
     
     try:
         # Initialize RAG system
         rag = get_rag_system()
         
         # Check if collection exists
-        collections = rag.list_collections()
-        collection_names = [col.name for col in collections]
-        if collection_name not in collection_names:
+        if not await rag_collection_exists(collection_name):
             raise HTTPException(
                 status_code=404, 
                 detail=f"Collection '{collection_name}' not found"
@@ -2204,7 +2861,9 @@ async def rag_chat(request: RagChat):
             hybrid_search=True
         )
         
-        rag_result = rag.query(rag_query)
+        rag_result = await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(rag.query), rag_query
+        )
         if not rag_result.contexts:
             return {
                 "query": query,
@@ -2465,10 +3124,11 @@ async def create_test_collection():
         description = "Collection de test créée automatiquement"
         
         # Vérifier si la collection existe déjà
-        collections = get_rag_system().list_collections()
-        if collection_name in [col.name for col in collections]:
+        if await rag_collection_exists(collection_name):
             # Supprimer la collection existante
-            get_rag_system().delete_collection(collection_name)
+            await asyncio.get_running_loop().run_in_executor(
+                None, request_profiler.traced(get_rag_system().delete_collection), collection_name
+            )
         
         # Créer la collection
         from langchain_core.documents import Document
@@ -2508,15 +3168,10 @@ async def create_test_collection():
             )
         ]
         
-        # Créer la collection
-        rag_system = get_rag_system()
-        vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=rag_system.embedding_model,
-            persist_directory=VECTORS_DIR
+        # Créer la collection (encodage des documents hors de la boucle d'événements)
+        await asyncio.get_running_loop().run_in_executor(
+            None, request_profiler.traced(get_rag_system().create_collection), collection_name, documents
         )
-        vectorstore.add_documents(documents)
-        vectorstore.persist()
         
         return JSONResponse(
             status_code=201,
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module d'index BM25 pour TurboChat
+
+Ce module fournit un index inversé persistant par collection :
+- Stocké dans une base SQLite (listes de postings et statistiques des termes)
+- Mis à jour à l'indexation et à la suppression des chunks, sans reconstruction
+- Interrogé en ne lisant que les postings des termes de la requête
+- Avec un découpage en termes adapté au français (minuscules, sans accents, mots vides retirés)
+"""
+
+import os
+import re
+import math
+import heapq
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-bm25")
+
+# Paramètres BM25 (mêmes valeurs par défaut que BM25Okapi)
+BM25_K1 = float(os.environ.get("BM25_K1", "1.5"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+
+# Nombre maximal de paramètres par requête SQLite
+SQL_BATCH = 500
+
+_WORD = re.compile(r"\w+")
+# Mots vides : trop fréquents pour départager les chunks
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "d", "dans", "de", "des", "du", "elle", "en", "est",
+    "et", "il", "ils", "je", "l", "la", "le", "les", "leur", "lui", "m", "mais", "me", "n", "ne", "nous",
+    "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "s", "sa", "se", "ses", "son", "sont", "sur",
+    "t", "ta", "te", "tu", "un", "une", "vous", "y",
+    "an", "and", "are", "is", "of", "on", "or", "the", "to", "in", "it"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte en termes d'index
+
+    Args:
+        text: Texte d'un chunk ou d'une requête
+
+    Returns:
+        Termes en minuscules et sans accents, mots vides retirés
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word for word in _WORD.findall(text) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Index inversé BM25 persistant d'une collection
+
+    Chaque chunk est enregistré avec sa longueur et son document ; chaque
+    terme avec sa fréquence documentaire et ses postings (chunk, fréquence
+    du terme). Une recherche ne lit que les postings des termes de la
+    requête : son coût dépend du nombre de postings parcourus, pas de la
+    taille de la collection.
+    """
+
+    def __init__(self, path: str, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # Connexions de lecture, une par thread : en WAL, les recherches
+        # avancent en parallèle, entre elles et pendant les écritures
+        self._readers = threading.local()
+        self._reader_connections: List[sqlite3.Connection] = []
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                document_id TEXT,
+                length INTEGER NOT NULL,
+                terms TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS stats (
+                key TEXT PRIMARY KEY,
+                value REAL NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        self._load_stats()
+
+    def _load_stats(self) -> None:
+        # Statistiques globales gardées en mémoire, réécrites à chaque transaction
+        stats = dict(self._conn.execute("SELECT key, value FROM stats"))
+        self.chunk_count = int(stats.get("chunk_count", 0))
+        self.total_length = int(stats.get("total_length", 0))
+        # Index entièrement construit (ou reconstruit depuis le vectorstore)
+        self.initialized = bool(stats.get("initialized", 0))
+
+    @contextmanager
+    def _transaction(self):
+        """Transaction d'écriture : les statistiques en mémoire suivent le sort de la transaction"""
+        with self._lock:
+            try:
+                with self._conn:
+                    yield
+                    self._save_stats()
+            except BaseException:
+                self._load_stats()
+                raise
+
+    def _save_stats(self) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+            [
+                ("chunk_count", self.chunk_count),
+                ("total_length", self.total_length),
+                ("initialized", int(self.initialized))
+            ]
+        )
+
+    def _remove_rows(self, rows: List[Tuple[int, int, str]]) -> None:
+        """Retire des chunks (id interne, longueur, termes) et leurs postings (transaction déjà ouverte)"""
+        if not rows:
+            return
+        df = Counter()
+        for row_id, _, terms in rows:
+            terms = terms.split()
+            df.update(terms)
+            self._conn.executemany("DELETE FROM postings WHERE term = ? AND chunk = ?", [(term, row_id) for term in terms])
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(row_id,) for row_id, _, _ in rows])
+        self._conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(count, term) for term, count in df.items()])
+        self._conn.executemany("DELETE FROM terms WHERE term = ? AND df <= 0", [(term,) for term in df])
+        self.chunk_count -= len(rows)
+        self.total_length -= sum(length for _, length, _ in rows)
+
+    def _select_rows(self, column: str, values: List[str]) -> List[Tuple[int, int, str]]:
+        rows = []
+        for start in range(0, len(values), SQL_BATCH):
+            batch = values[start:start + SQL_BATCH]
+            rows.extend(self._conn.execute(
+                f"SELECT id, length, terms FROM chunks WHERE {column} IN ({','.join('?' * len(batch))})",
+                batch
+            ))
+        return rows
+
+    def add(self, chunk_ids: List[str], texts: List[str], document_ids: Iterable[str]) -> None:
+        """
+        Ajoute des chunks à l'index (un chunk déjà présent est remplacé)
+
+        Args:
+            chunk_ids: Identifiants des chunks dans le vectorstore
+            texts: Textes des chunks
+            document_ids: Document d'origine de chaque chunk
+        """
+        with self._transaction():
+            self._remove_rows(self._select_rows("chunk_id", list(chunk_ids)))
+
+            df = Counter()
+            for chunk_id, text, document_id in zip(chunk_ids, texts, document_ids):
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                # Les termes du chunk sont conservés pour retrouver ses postings à la suppression
+                row_id = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, document_id, length, terms) VALUES (?, ?, ?, ?)",
+                    (chunk_id, document_id, length, " ".join(terms))
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings (term, chunk, tf, length) VALUES (?, ?, ?, ?)",
+                    [(term, row_id, tf, length) for term, tf in terms.items()]
+                )
+                df.update(terms.keys())
+                self.chunk_count += 1
+                self.total_length += length
+
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items()
+            )
+
+    def remove_chunks(self, chunk_ids: List[str]) -> int:
+        """
+        Retire des chunks de l'index
+
+        Returns:
+            Nombre de chunks retirés
+        """
+        with self._transaction():
+            rows = self._select_rows("chunk_id", list(chunk_ids))
+            self._remove_rows(rows)
+        return len(rows)
+
+    def remove_document(self, document_id: str) -> int:
+        """
+        Retire tous les chunks d'un document de l'index
+
+        Returns:
+            Nombre de chunks retirés
+        """
+        with self._transaction():
+            rows = self._select_rows("document_id", [document_id])
+            self._remove_rows(rows)
+        return len(rows)
+
+    def clear(self) -> None:
+        """Vide l'index (avant une reconstruction)"""
+        with self._transaction():
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM chunks")
+            self.chunk_count = 0
+            self.total_length = 0
+            self.initialized = False
+
+    def mark_initialized(self) -> None:
+        with self._transaction():
+            self.initialized = True
+
+    def _reader(self) -> sqlite3.Connection:
+        """Connexion de lecture du thread courant (ouverte à sa première recherche)"""
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            self._readers.conn = conn
+            with self._lock:
+                self._reader_connections.append(conn)
+        return conn
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Recherche les chunks les plus pertinents pour une requête
+
+        Args:
+            query: Texte de la requête
+            k: Nombre de chunks à renvoyer
+
+        Returns:
+            (identifiant du chunk, score BM25), par score décroissant
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        conn = self._reader()
+        # Statistiques, termes et postings lus dans une même transaction de lecture :
+        # en WAL, une écriture concurrente ne bloque pas la recherche et reste invisible
+        conn.execute("BEGIN")
+        try:
+            stats = dict(conn.execute("SELECT key, value FROM stats"))
+            chunk_count = int(stats.get("chunk_count", 0))
+            total_length = int(stats.get("total_length", 0))
+            if chunk_count == 0:
+                return []
+            avg_length = total_length / chunk_count
+            scores: Dict[int, float] = {}
+            placeholders = ",".join("?" * len(terms))
+            for term, df in conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms).fetchall():
+                idf = math.log(1 + max(chunk_count - df + 0.5, 0.0) / (df + 0.5))
+                for row_id, tf, length in conn.execute(
+                    "SELECT chunk, tf, length FROM postings WHERE term = ?", (term,)
+                ):
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not best:
+                return []
+            chunk_ids = dict(conn.execute(
+                f"SELECT id, chunk_id FROM chunks WHERE id IN ({','.join('?' * len(best))})",
+                [row_id for row_id, _ in best]
+            ))
+        finally:
+            conn.rollback()
+        return [(chunk_ids[row_id], score) for row_id, score in best]
+
+    def sample_queries(self, count: int, terms: int = 5) -> List[str]:
+        """
+        Requêtes tirées des chunks indexés (premiers termes de chunks pris au hasard)
+
+        Args:
+            count: Nombre de requêtes
+            terms: Nombre de termes par requête
+
+        Returns:
+            Requêtes (moins de `count` si l'index a moins de chunks)
+        """
+        rows = self._reader().execute("SELECT terms FROM chunks ORDER BY random() LIMIT ?", (count,)).fetchall()
+        return [" ".join(chunk_terms.split()[:terms]) for (chunk_terms,) in rows if chunk_terms]
+
+    def count_chunks(self) -> int:
+        """Nombre de chunks sur disque (écritures des autres processus comprises)"""
+        return self._reader().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Taille de l'index"""
+        with self._lock:
+            terms = self._conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {
+            "chunks": self.chunk_count,
+            "terms": terms,
+            "avg_chunk_length": round(self.total_length / self.chunk_count, 1) if self.chunk_count else 0.0,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._reader_connections:
+                conn.close()
+            self._reader_connections.clear()
+            self._conn.close()
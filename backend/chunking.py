@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de découpage des documents pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Découper les documents en chunks mesurés en tokens du tokenizer cible
+- Couper aux frontières de paragraphes et de phrases (règles adaptées au français)
+- Régler taille et chevauchement des chunks par collection
+- Mesurer le débit et la qualité du découpage face au découpage par caractères
+"""
+
+import os
+import re
+import types
+import base64
+import hashlib
+import sys
+import time
+import logging
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel
+from langchain_core.documents import Document
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-chunking")
+
+# Réglages par défaut des collections (en tokens)
+CHUNK_SIZE_TOKENS = int(os.environ.get("CHUNK_SIZE_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "32"))
+CHUNK_TOKENIZER = os.environ.get("CHUNK_TOKENIZER", "cl100k_base")
+# Fichiers BPE de tiktoken, lus localement (tiktoken les télécharge sinon à
+# la première utilisation) ; le dossier sert de cache au premier chargement
+# en ligne et peut être copié tel quel sur une machine hors ligne. Un fichier
+# y est nommé d'après le sha1 de son URL (nom du cache de tiktoken) ou,
+# copié à la main, d'après l'URL elle-même (ex: cl100k_base.tiktoken)
+TIKTOKEN_CACHE_DIR = os.environ.get(
+    "TIKTOKEN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "tiktoken")
+)
+# Tokenizer de repli (encodage tiktoken indisponible) : caractères par token
+APPROXIMATE_CHARS_PER_TOKEN = 4
+
+# Taille minimale d'un chunk, en tokens
+MIN_CHUNK_SIZE = 16
+# Remplissage à partir duquel un chunk est clos au début d'un nouveau paragraphe
+PARAGRAPH_FILL = 0.6
+
+# Paragraphes : au moins une ligne vide
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# Fin de phrase : ponctuation finale (éventuellement suivie de guillemets ou
+# parenthèses fermantes) puis blancs, devant une majuscule, un chiffre, un
+# guillemet ouvrant ou un tiret de dialogue ; ou retour à la ligne devant
+# un élément de liste
+SENTENCE_BREAK = re.compile(
+    r"(?<=[.!?…])[»\"”’)\]]*(\s+)(?=[«\"“(\[A-ZÀ-ÖØ-Þ0-9—–-])"
+    r"|(\n\s*)(?=(?:[-•*–—]|\d+[.)])\s)"
+)
+# Abréviations courantes qui ne terminent pas une phrase
+ABBREVIATIONS = {
+    "m", "mm", "mme", "mmes", "mlle", "mlles", "dr", "pr", "me", "mgr", "st", "ste",
+    "p", "pp", "cf", "ex", "env", "av", "apr", "j.-c", "fig", "chap", "vol", "t",
+    "n", "no", "n°", "art", "al", "éd", "coll", "op", "cit", "ibid", "vs", "approx"
+}
+
+
+class ChunkingSettings(BaseModel):
+    """
+    Réglages de découpage d'une collection
+    """
+    chunk_size: int = CHUNK_SIZE_TOKENS
+    chunk_overlap: int = CHUNK_OVERLAP_TOKENS
+    tokenizer: str = CHUNK_TOKENIZER
+
+
+# Tokenizers partagés (chargés à la première utilisation)
+_tokenizers: Dict[str, Any] = {}
+_tokenizers_lock = threading.Lock()
+
+
+class ApproximateTokenizer:
+    """
+    Tokenizer de repli, sans fichier ni réseau
+
+    Chaque token est un fragment d'au plus `APPROXIMATE_CHARS_PER_TOKEN`
+    caractères : les comptes approchent ceux d'un encodage BPE et les
+    fenêtres de tokens se recollent à l'identique.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return [text[i:i + APPROXIMATE_CHARS_PER_TOKEN] for i in range(0, len(text), APPROXIMATE_CHARS_PER_TOKEN)]
+
+    def encode_ordinary(self, text: str) -> List[str]:
+        return self.encode(text)
+
+    def encode_ordinary_batch(self, texts: List[str], **kwargs) -> List[List[str]]:
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+def tiktoken_file_names(url: str) -> List[str]:
+    """Noms acceptés pour le fichier BPE d'une URL dans `TIKTOKEN_CACHE_DIR`"""
+    return [hashlib.sha1(url.encode()).hexdigest(), url.rsplit("/", 1)[-1]]
+
+
+def _load_tiktoken_bpe(url: str) -> Dict[bytes, int]:
+    """
+    Lit un fichier BPE dans `TIKTOKEN_CACHE_DIR`, ou le télécharge et l'y dépose
+
+    Args:
+        url: URL du fichier dans la définition de l'encodage
+
+    Returns:
+        Rangs des fragments d'octets
+    """
+    for file_name in tiktoken_file_names(url):
+        path = os.path.join(TIKTOKEN_CACHE_DIR, file_name)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                contents = f.read()
+            break
+    else:
+        from tiktoken.load import read_file
+        contents = read_file(url)
+        os.makedirs(TIKTOKEN_CACHE_DIR, exist_ok=True)
+        path = os.path.join(TIKTOKEN_CACHE_DIR, tiktoken_file_names(url)[0])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+    return {
+        base64.b64decode(token): int(rank)
+        for token, rank in (line.split() for line in contents.splitlines() if line)
+    }
+
+
+def _load_encoding(name: str):
+    """
+    Construit un encodage tiktoken dont le fichier BPE est lu dans `TIKTOKEN_CACHE_DIR`
+
+    La définition de l'encodage (motif, tokens spéciaux) est celle de
+    tiktoken ; seul le chargement du fichier est remplacé, sur une copie de
+    la fonction, sans toucher à os.environ ni au module de tiktoken.
+    """
+    import tiktoken
+    from tiktoken_ext import openai_public
+
+    constructor = getattr(openai_public, name, None)
+    if constructor is None or "load_tiktoken_bpe" not in constructor.__code__.co_names:
+        # Encodage d'un autre format ou d'un autre paquet : chargement par tiktoken
+        return tiktoken.get_encoding(name)
+    local_constructor = types.FunctionType(
+        constructor.__code__, {**constructor.__globals__, "load_tiktoken_bpe": _load_tiktoken_bpe}
+    )
+    return tiktoken.Encoding(**local_constructor())
+
+
+def get_tokenizer(name: str = CHUNK_TOKENIZER):
+    """
+    Renvoie un encodage tiktoken (ex: "cl100k_base")
+
+    L'encodage est lu dans `TIKTOKEN_CACHE_DIR`. S'il n'y est pas et ne peut
+    pas être téléchargé (machine hors ligne), un tokenizer approché par
+    caractères le remplace plutôt que de faire échouer l'indexation.
+
+    Args:
+        name: Nom de l'encodage
+
+    Returns:
+        L'encodage tiktoken, ou le tokenizer de repli
+    """
+    if name not in _tokenizers:
+        with _tokenizers_lock:
+            if name not in _tokenizers:
+                try:
+                    _tokenizers[name] = _load_encoding(name)
+                except (ImportError, OSError) as e:
+                    url = f"https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+                    logger.warning(
+                        f"Encodage tiktoken {name} indisponible ({e}) : comptage approché "
+                        f"({APPROXIMATE_CHARS_PER_TOKEN} caractères par token). Pour un comptage exact, "
+                        f"placez dans {TIKTOKEN_CACHE_DIR} le fichier {url}, sous le nom "
+                        f"{' ou '.join(tiktoken_file_names(url))}."
+                    )
+                    _tokenizers[name] = ApproximateTokenizer(name)
+    return _tokenizers[name]
+
+
+def _ends_with_abbreviation(sentence: str) -> bool:
+    """Indique si une phrase se termine par une abréviation ou une initiale (ex: "M.", "J.")"""
+    if not sentence.endswith("."):
+        return False
+    last_word = sentence[:-1].rsplit(None, 1)[-1] if sentence[:-1].strip() else ""
+    last_word = last_word.lstrip("(«\"“")
+    return last_word.lower() in ABBREVIATIONS or (len(last_word) == 1 and last_word.isupper())
+
+
+def split_sentences(paragraph: str) -> List[List[str]]:
+    """
+    Découpe un paragraphe en phrases
+
+    Args:
+        paragraph: Texte d'un paragraphe
+
+    Returns:
+        Liste de [séparateur précédent, phrase] ; le séparateur conserve
+        les blancs d'origine (espace ou retour à la ligne)
+    """
+    sentences = []
+    separator = ""
+    start = 0
+    for match in SENTENCE_BREAK.finditer(paragraph):
+        whitespace = match.group(1) if match.group(1) is not None else match.group(2)
+        end = match.start(1) if match.group(1) is not None else match.start(2)
+        sentence = paragraph[start:end]
+        if sentences and _ends_with_abbreviation(sentences[-1][1]):
+            # La coupure précédente suivait une abréviation : on recolle
+            sentences[-1][1] += separator + sentence
+        else:
+            sentences.append([separator, sentence])
+        separator = whitespace
+        start = match.end()
+
+    tail = paragraph[start:]
+    if tail:
+        if sentences and _ends_with_abbreviation(sentences[-1][1]):
+            sentences[-1][1] += separator + tail
+        else:
+            sentences.append([separator, tail])
+    return sentences
+
+
+class _Unit(NamedTuple):
+    # Texte de l'unité, précédé de son séparateur d'origine
+    text: str
+    tokens: int
+    paragraph_start: bool
+
+
+class TokenChunker:
+    """
+    Découpage en chunks mesurés en tokens
+
+    Le texte est découpé en paragraphes puis en phrases ; toutes les
+    phrases sont tokenisées en un seul appel, puis regroupées jusqu'à
+    `chunk_size` tokens. Un chunk est clos de préférence en fin de
+    paragraphe. Le chevauchement reprend les dernières phrases du chunk
+    précédent, dans la limite de `chunk_overlap` tokens. Une phrase plus
+    longue qu'un chunk est coupée par fenêtres de tokens.
+    """
+
+    def __init__(self, settings: Optional[ChunkingSettings] = None):
+        settings = settings or ChunkingSettings()
+        if settings.chunk_size < MIN_CHUNK_SIZE:
+            raise ValueError(f"chunk_size doit être au moins {MIN_CHUNK_SIZE} tokens")
+        if not 0 <= settings.chunk_overlap < settings.chunk_size // 2:
+            raise ValueError("chunk_overlap doit être positif et inférieur à la moitié de chunk_size")
+        self.settings = settings
+        self.chunk_size = settings.chunk_size
+        self.chunk_overlap = settings.chunk_overlap
+        self.encoding = get_tokenizer(settings.tokenizer)
+
+    def _units(self, text: str) -> List[_Unit]:
+        pieces = []
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for i, (separator, sentence) in enumerate(split_sentences(paragraph)):
+                pieces.append(("\n\n" if i == 0 and pieces else separator, sentence, i == 0))
+        if not pieces:
+            return []
+
+        # Une seule tokenisation pour toutes les phrases (séparateur inclus,
+        # pour que la somme des comptes corresponde au texte recollé)
+        encoded = self.encoding.encode_ordinary_batch([separator + sentence for separator, sentence, _ in pieces])
+
+        units = []
+        for (separator, sentence, paragraph_start), tokens in zip(pieces, encoded):
+            if len(tokens) <= self.chunk_size:
+                units.append(_Unit(separator + sentence, len(tokens), paragraph_start))
+                continue
+            # Phrase plus longue qu'un chunk : fenêtres de tokens
+            start = 0
+            while start < len(tokens):
+                end, window_text = self._window(tokens, start)
+                units.append(_Unit(window_text, end - start, paragraph_start and start == 0))
+                start = end
+        return units
+
+    def _window(self, tokens: List[Any], start: int) -> Tuple[int, str]:
+        """
+        Fenêtre d'au plus `chunk_size` tokens à partir de `start`, et son texte
+
+        Un caractère multioctet peut être réparti sur plusieurs tokens : une
+        fenêtre qui le couperait (texte terminé par U+FFFD) est raccourcie
+        d'au plus 3 tokens pour finir sur un caractère complet.
+        """
+        end = min(start + self.chunk_size, len(tokens))
+        text = self.encoding.decode(tokens[start:end])
+        if end == len(tokens) or not text.endswith("\ufffd"):
+            return end, text
+        for shorter_end in range(end - 1, max(start, end - 4), -1):
+            shorter_text = self.encoding.decode(tokens[start:shorter_end])
+            if not shorter_text.endswith("\ufffd"):
+                return shorter_end, shorter_text
+        return end, text
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Découpe un texte en chunks
+
+        Args:
+            text: Texte à découper
+
+        Returns:
+            Chunks de texte, d'au plus `chunk_size` tokens chacun
+        """
+        chunks = []
+        current: List[_Unit] = []
+        current_tokens = 0
+        paragraph_fill = self.chunk_size * PARAGRAPH_FILL
+
+        for unit in self._units(text):
+            if current and (
+                current_tokens + unit.tokens > self.chunk_size
+                or (unit.paragraph_start and current_tokens >= paragraph_fill)
+            ):
+                chunks.append("".join(u.text for u in current).strip())
+
+                # Chevauchement : dernières phrases du chunk, dans la limite du budget
+                overlap: List[_Unit] = []
+                overlap_tokens = 0
+                for previous in reversed(current):
+                    if overlap_tokens + previous.tokens > self.chunk_overlap:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += previous.tokens
+                if overlap_tokens + unit.tokens > self.chunk_size:
+                    overlap, overlap_tokens = [], 0
+                current, current_tokens = overlap, overlap_tokens
+
+            current.append(unit)
+            current_tokens += unit.tokens
+
+        if current:
+            chunks.append("".join(u.text for u in current).strip())
+        return [chunk for chunk in chunks if chunk]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Découpe des documents en chunks, en conservant leurs métadonnées
+
+        Args:
+            documents: Pages ou sections à découper
+
+        Returns:
+            Chunks, dans l'ordre des documents
+        """
+        return [
+            Document(page_content=chunk, metadata=dict(document.metadata))
+            for document in documents
+            for chunk in self.split_text(document.page_content)
+        ]
+
+
+def legacy_text_splitter():
+    """Découpage historique : 1000 caractères avec 200 de chevauchement"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def benchmark_chunkers(texts: List[str], settings: Optional[ChunkingSettings] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare le découpage en tokens au découpage historique par caractères
+
+    Args:
+        texts: Textes à découper
+        settings: Réglages du découpage en tokens
+
+    Returns:
+        Pour chaque découpeur : débit (caractères/s), nombre de chunks,
+        taille moyenne et maximale en tokens, part des chunks qui dépassent
+        le budget, et inflation de l'index (tokens indexés / tokens source)
+    """
+    chunker = TokenChunker(settings)
+    encoding = chunker.encoding
+    total_chars = sum(len(text) for text in texts)
+    source_tokens = sum(len(tokens) for tokens in encoding.encode_ordinary_batch(texts))
+
+    report = {}
+    for name, split in (("token", chunker.split_text), ("legacy", legacy_text_splitter().split_text)):
+        start_time = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in split(text)]
+        elapsed = time.perf_counter() - start_time
+
+        sizes = [len(tokens) for tokens in encoding.encode_ordinary_batch(chunks)] or [0]
+        report[name] = {
+            "seconds": round(elapsed, 4),
+            "chars_per_second": round(total_chars / elapsed) if elapsed else None,
+            "chunks": len(chunks),
+            "avg_tokens": round(sum(sizes) / len(sizes), 1),
+            "max_tokens": max(sizes),
+            "over_budget": round(sum(size > chunker.chunk_size for size in sizes) / len(sizes), 4),
+            "index_inflation": round(sum(sizes) / source_tokens, 3) if source_tokens else None
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # Banc d'essai : python chunking.py fichier.pdf [fichier2.docx ...]
+    from parsing import document_parser
+
+    paths = sys.argv[1:]
+    if not paths:
+        print("Usage: python chunking.py <fichier> [<fichier> ...]")
+        sys.exit(1)
+
+    texts = [page.page_content for pages in document_parser.parse_files(paths) for page in pages]
+    print(f"{len(texts)} pages, {sum(len(text) for text in texts)} caractères")
+    for name, stats in benchmark_chunkers(texts).items():
+        print(f"{name:>7}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+    document_parser.shutdown()
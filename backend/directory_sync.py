@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de synchronisation de répertoires pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Synchroniser une collection avec un répertoire (ex: dossier partagé d'un enseignant)
+- Comparer date de modification, taille et empreinte avec l'état de la dernière synchronisation
+- Réindexer uniquement les fichiers nouveaux ou modifiés
+- Retirer les chunks des fichiers supprimés
+- Surveiller un répertoire et le resynchroniser dès qu'il change
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from rag import IngestionCancelled, RAGSystem, get_rag_system
+from pipeline import BulkIngestionPipeline, SUPPORTED_EXTENSIONS
+from document_registry import hash_file
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-directory-sync")
+
+# Intervalle entre deux vérifications d'un répertoire surveillé (en secondes)
+SYNC_WATCH_INTERVAL = float(os.environ.get("SYNC_WATCH_INTERVAL", "60"))
+# Répertoires surveillés dès le démarrage : "collection=/chemin;collection2=/chemin2"
+SYNC_DIRECTORIES = os.environ.get("SYNC_DIRECTORIES", "")
+
+
+def scan_directory(directory: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Liste les documents indexables d'un répertoire (récursivement)
+
+    Args:
+        directory: Répertoire à parcourir
+
+    Returns:
+        Pour chaque chemin relatif : chemin absolu, date de modification et taille
+    """
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        # Répertoires cachés ignorés (.git, .uploads, ...)
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in names:
+            if name.startswith(".") or name.rsplit(".", 1)[-1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, directory).replace(os.sep, "/")] = {
+                "path": path,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size
+            }
+    return files
+
+
+class DirectorySync:
+    """
+    Synchronisation incrémentale d'une collection avec un répertoire
+
+    L'état de la dernière synchronisation (date de modification, taille,
+    empreinte et document de chaque fichier) est conservé dans
+    `indices/<collection>/sync.json`. Un fichier dont la date et la taille
+    n'ont pas changé n'est pas relu ; un fichier modifié n'est réindexé
+    que si son empreinte a changé. Un fichier qui n'a pas pu être indexé
+    est aussi enregistré (marqué `failed`) : il n'est retenté qu'une fois
+    sa date ou sa taille modifiée.
+    """
+
+    def __init__(self, rag: RAGSystem, collection_name: str, directory: str):
+        self.rag = rag
+        self.collection_name = collection_name
+        self.directory = os.path.abspath(directory)
+        self.state_path = os.path.join(RAGSystem.collection_dir(collection_name), "sync.json")
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        # L'état d'un autre répertoire ne s'applique pas
+        if state.get("directory") != self.directory:
+            state = {"directory": self.directory, "files": {}}
+        return state
+
+    def _save_state(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def has_changes(self) -> bool:
+        """
+        Indique si le répertoire a changé depuis la dernière synchronisation
+
+        Ne compare que les dates et tailles : aucun fichier n'est lu.
+        """
+        known = self.state["files"]
+        current = scan_directory(self.directory)
+        if current.keys() != known.keys():
+            return True
+        return any(
+            info["mtime"] != known[relpath]["mtime"] or info["size"] != known[relpath]["size"]
+            for relpath, info in current.items()
+        )
+
+    def plan(self) -> Dict[str, Any]:
+        """
+        Compare le répertoire à l'état de la dernière synchronisation
+
+        Returns:
+            Fichiers nouveaux, modifiés, supprimés et inchangés, avec les
+            empreintes calculées pour les fichiers dont la date ou la taille a changé
+        """
+        known = self.state["files"]
+        current = scan_directory(self.directory)
+        plan = {"new": [], "changed": [], "touched": [], "unchanged": [], "removed": [], "files": current}
+
+        for relpath, info in current.items():
+            previous = known.get(relpath)
+            if previous is not None and info["mtime"] == previous["mtime"] and info["size"] == previous["size"]:
+                plan["unchanged"].append(relpath)
+                continue
+
+            info["content_hash"] = hash_file(info["path"])
+            if previous is None:
+                plan["new"].append(relpath)
+            elif info["content_hash"] == previous["content_hash"]:
+                # Date modifiée sans changement de contenu
+                plan["touched"].append(relpath)
+            else:
+                plan["changed"].append(relpath)
+
+        plan["removed"] = [relpath for relpath in known if relpath not in current]
+        return plan
+
+    def _forget_hashes(self, content_hashes: List[str]) -> int:
+        """
+        Retire les documents des empreintes qui ne sont plus référencées par aucun fichier
+
+        Returns:
+            Nombre de documents supprimés
+        """
+        referenced = {entry["content_hash"] for entry in self.state["files"].values()}
+        orphans = list(dict.fromkeys(h for h in content_hashes if h is not None and h not in referenced))
+        if not orphans:
+            return 0
+        # Registre réécrit une seule fois pour tout le lot
+        registry = self.rag.document_registry(self.collection_name)
+        entries = [entry for entry in registry.remove_many(orphans) if entry is not None]
+        for entry in entries:
+            self.rag.delete_document(self.collection_name, entry["document_id"], update_stats=False)
+        return len(entries)
+
+    def run(
+        self,
+        progress: Optional[Callable[..., None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Synchronise la collection avec le répertoire
+
+        Args:
+            progress: Fonction appelée avec les compteurs d'avancement
+            should_cancel: Fonction indiquant si la synchronisation doit être annulée
+
+        Returns:
+            Rapport de synchronisation
+
+        Raises:
+            IngestionCancelled: Si la synchronisation a été annulée
+        """
+        start_time = time.perf_counter()
+        if not os.path.isdir(self.directory):
+            raise FileNotFoundError(f"Le répertoire {self.directory} n'existe pas")
+
+        plan = self.plan()
+        files = plan["files"]
+        known = self.state["files"]
+        to_index = plan["new"] + plan["changed"]
+        logger.info(
+            f"Synchronisation de {self.collection_name} avec {self.directory}: "
+            f"{len(plan['new'])} nouveaux, {len(plan['changed'])} modifiés, "
+            f"{len(plan['removed'])} supprimés, {len(plan['unchanged']) + len(plan['touched'])} inchangés"
+        )
+
+        result = {"documents": [], "failed_files": []}
+        if to_index:
+            paths = [files[relpath]["path"] for relpath in to_index]
+            # Les anciennes versions sont retirées ci-dessous, seulement si aucun autre fichier ne les référence
+            pipeline = BulkIngestionPipeline(
+                self.rag,
+                self.collection_name,
+                progress=progress,
+                should_cancel=should_cancel,
+                replace_previous=False,
+                # Les anciennes versions des fichiers modifiés ne comptent pas pour les quasi-doublons
+                exclude_document_ids=[
+                    known[relpath]["document_id"] for relpath in plan["changed"]
+                    if known[relpath].get("document_id") is not None
+                ]
+            )
+            result = pipeline.run(
+                paths,
+                content_hashes={files[relpath]["path"]: files[relpath]["content_hash"] for relpath in to_index},
+                filenames={files[relpath]["path"]: relpath for relpath in to_index}
+            )
+        elif should_cancel is not None and should_cancel():
+            raise IngestionCancelled("Synchronisation annulée")
+
+        # Mise à jour de l'état des fichiers indexés (ou déjà présents sous une autre forme)
+        registry = self.rag.document_registry(self.collection_name)
+        failed = {entry["file"] for entry in result["failed_files"]}
+        replaced_hashes = []
+        for relpath in to_index:
+            info = files[relpath]
+            entry = None if relpath in failed else registry.get(info["content_hash"])
+            if entry is None:
+                # Fichier illisible ou sans document : l'éventuelle version précédente reste
+                # indexée, et le fichier n'est retenté que si sa date ou sa taille change
+                previous = known.get(relpath, {})
+                known[relpath] = {
+                    "mtime": info["mtime"],
+                    "size": info["size"],
+                    "content_hash": previous.get("content_hash"),
+                    "document_id": previous.get("document_id"),
+                    "failed": True
+                }
+                continue
+            if relpath in known:
+                replaced_hashes.append(known[relpath]["content_hash"])
+            known[relpath] = {
+                "mtime": info["mtime"],
+                "size": info["size"],
+                "content_hash": info["content_hash"],
+                "document_id": entry["document_id"]
+            }
+        for relpath in plan["touched"]:
+            # Contenu revenu à la dernière version indexée
+            known[relpath].update(mtime=files[relpath]["mtime"], size=files[relpath]["size"])
+            known[relpath].pop("failed", None)
+
+        # Fichiers supprimés et anciennes versions des fichiers modifiés
+        removed_hashes = [known.pop(relpath)["content_hash"] for relpath in plan["removed"]]
+        deleted_documents = self._forget_hashes(removed_hashes + replaced_hashes)
+        if deleted_documents:
+            self.rag.update_collection_stats(self.collection_name)
+
+        self.state["synced_at"] = datetime.now().isoformat()
+        self._save_state()
+
+        report = {
+            "collection_name": self.collection_name,
+            "directory": self.directory,
+            "new": len(plan["new"]),
+            "changed": len(plan["changed"]),
+            "removed": len(plan["removed"]),
+            "unchanged": len(plan["unchanged"]) + len(plan["touched"]),
+            "indexed_documents": len(result["documents"]),
+            "chunks_dropped": result.get("chunks_dropped", 0),
+            "deleted_documents": deleted_documents,
+            "failed_files": result["failed_files"],
+            "duration": round(time.perf_counter() - start_time, 3)
+        }
+        logger.info(f"Synchronisation de {self.collection_name} terminée en {report['duration']:.2f} secondes")
+        return report
+
+
+class DirectoryWatcher:
+    """
+    Surveillance périodique de répertoires synchronisés
+
+    Un thread vérifie chaque répertoire surveillé à intervalle régulier
+    (dates et tailles seulement) et soumet une synchronisation quand
+    il a changé.
+    """
+
+    def __init__(self, interval: float = SYNC_WATCH_INTERVAL):
+        self.interval = interval
+        self.watched: Dict[str, Dict[str, Any]] = {}
+        self._submit = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, submit: Callable[[str, str], Any]) -> None:
+        """
+        Démarre la surveillance
+
+        Args:
+            submit: Fonction qui lance la synchronisation d'une collection
+                avec un répertoire (ex: `ingestion_queue.submit_sync`)
+        """
+        self._submit = submit
+        for entry in filter(None, SYNC_DIRECTORIES.split(";")):
+            collection_name, _, directory = entry.partition("=")
+            self.watch(collection_name.strip(), directory.strip())
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="turbochat-directory-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Arrête la surveillance"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def watch(self, collection_name: str, directory: str) -> None:
+        """Ajoute (ou remplace) le répertoire surveillé d'une collection"""
+        with self._lock:
+            self.watched[collection_name] = {
+                "directory": os.path.abspath(directory),
+                "last_check": None,
+                "last_sync": None
+            }
+        logger.info(f"Surveillance de {directory} pour la collection {collection_name}")
+
+    def unwatch(self, collection_name: str) -> bool:
+        """Arrête de surveiller le répertoire d'une collection"""
+        with self._lock:
+            return self.watched.pop(collection_name, None) is not None
+
+    def list_watched(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self.watched.items()}
+
+    def check(self, rag: RAGSystem) -> List[str]:
+        """
+        Vérifie les répertoires surveillés et synchronise ceux qui ont changé
+
+        Returns:
+            Collections pour lesquelles une synchronisation a été soumise
+        """
+        submitted = []
+        for collection_name, entry in self.list_watched().items():
+            try:
+                changed = DirectorySync(rag, collection_name, entry["directory"]).has_changes()
+            except Exception as e:
+                logger.error(f"Vérification de {entry['directory']} impossible: {e}")
+                continue
+
+            with self._lock:
+                if collection_name in self.watched:
+                    self.watched[collection_name]["last_check"] = datetime.now().isoformat()
+                    if changed:
+                        self.watched[collection_name]["last_sync"] = datetime.now().isoformat()
+            if changed:
+                self._submit(collection_name, entry["directory"])
+                submitted.append(collection_name)
+        return submitted
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            if self.watched:
+                self.check(get_rag_system())
+
+
+# Instance globale de la surveillance des répertoires
+directory_watcher = DirectoryWatcher()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de registre des documents pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Calculer l'empreinte du contenu d'un fichier pendant son écriture sur disque
+- Tenir, pour chaque collection, le registre des documents indexés par empreinte
+- Détecter en O(1) un document déjà indexé ou en cours d'indexation
+- Retrouver la version précédente d'un document portant le même nom
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-document-registry")
+
+# Taille des blocs lus pour calculer les empreintes
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def new_content_hasher():
+    """Renvoie l'objet de hachage utilisé pour les empreintes de contenu"""
+    return hashlib.sha256()
+
+
+def copy_and_hash(src: BinaryIO, dst: BinaryIO) -> str:
+    """
+    Copie un flux bloc par bloc en calculant son empreinte au passage
+
+    Args:
+        src: Flux source (binaire)
+        dst: Flux destination (binaire)
+
+    Returns:
+        Empreinte hexadécimale du contenu copié
+    """
+    hasher = new_content_hasher()
+    while True:
+        block = src.read(HASH_BLOCK_SIZE)
+        if not block:
+            break
+        hasher.update(block)
+        dst.write(block)
+    return hasher.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """Empreinte hexadécimale du contenu d'un fichier"""
+    hasher = new_content_hasher()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class DocumentRegistry:
+    """
+    Registre des documents d'une collection, indexé par empreinte de contenu
+
+    Le registre est conservé en mémoire (deux dictionnaires : par empreinte
+    et par nom de fichier) et réécrit atomiquement sur disque à chaque
+    modification.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Empreintes en cours d'indexation, pour ne pas indexer deux fois un envoi concurrent
+        self._in_flight = set()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.documents: Dict[str, Dict[str, Any]] = json.load(f).get("documents", {})
+        except FileNotFoundError:
+            self.documents = {}
+        self.by_filename = {entry["filename"]: content_hash for content_hash, entry in self.documents.items()}
+
+    def _save(self) -> None:
+        """Écrit le registre (verrou déjà pris)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Renvoie le document indexé avec cette empreinte"""
+        entry = self.documents.get(content_hash)
+        return {"content_hash": content_hash, **entry} if entry else None
+
+    def get_by_filename(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Renvoie le document indexé sous ce nom de fichier"""
+        content_hash = self.by_filename.get(filename)
+        return self.get(content_hash) if content_hash else None
+
+    def claim(self, content_hash: str) -> bool:
+        """
+        Réserve une empreinte avant indexation
+
+        Returns:
+            False si le contenu est déjà indexé ou en cours d'indexation
+        """
+        with self._lock:
+            if content_hash in self.documents or content_hash in self._in_flight:
+                return False
+            self._in_flight.add(content_hash)
+            return True
+
+    def release(self, content_hash: str) -> None:
+        """Libère une empreinte réservée dont l'indexation n'a pas abouti"""
+        with self._lock:
+            self._in_flight.discard(content_hash)
+
+    def register(
+        self,
+        content_hash: str,
+        document_id: str,
+        filename: str,
+        source: str,
+        chunks: int,
+        replace: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Enregistre un document indexé
+
+        Args:
+            content_hash: Empreinte du contenu
+            document_id: Identifiant du document (présent dans les métadonnées de ses chunks)
+            filename: Nom du fichier
+            source: Chemin du fichier sur disque
+            chunks: Nombre de chunks indexés
+            replace: Retirer du registre le document de même nom et de contenu
+                différent ; sinon l'appelant décide de son sort
+
+        Returns:
+            Le document remplacé (même nom, contenu différent), s'il y en avait un
+        """
+        return self.register_many([{
+            "content_hash": content_hash,
+            "document_id": document_id,
+            "filename": filename,
+            "source": source,
+            "chunks": chunks
+        }], replace=replace)[0]
+
+    def register_many(self, documents: List[Dict[str, Any]], replace: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """
+        Enregistre un lot de documents indexés (registre écrit une seule fois)
+
+        Args:
+            documents: Documents (content_hash, document_id, filename, source, chunks)
+            replace: Voir register
+
+        Returns:
+            Pour chaque document, le document remplacé s'il y en avait un
+        """
+        indexed_at = datetime.now().isoformat()
+        replaced_documents = []
+        with self._lock:
+            for document in documents:
+                content_hash, filename = document["content_hash"], document["filename"]
+                self._in_flight.discard(content_hash)
+                replaced = None
+                previous_hash = self.by_filename.get(filename)
+                if replace and previous_hash is not None and previous_hash != content_hash:
+                    replaced = {"content_hash": previous_hash, **self.documents.pop(previous_hash)}
+                replaced_documents.append(replaced)
+
+                self.documents[content_hash] = {
+                    "document_id": document["document_id"],
+                    "filename": filename,
+                    "source": document["source"],
+                    "chunks": document["chunks"],
+                    "indexed_at": indexed_at
+                }
+                self.by_filename[filename] = content_hash
+            if documents:
+                self._save()
+        return replaced_documents
+
+    def remove(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Retire un document du registre"""
+        return self.remove_many([content_hash])[0]
+
+    def remove_many(self, content_hashes: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Retire un lot de documents du registre (registre écrit une seule fois)"""
+        removed = []
+        with self._lock:
+            for content_hash in content_hashes:
+                entry = self.documents.pop(content_hash, None)
+                if entry is None:
+                    removed.append(None)
+                    continue
+                if self.by_filename.get(entry["filename"]) == content_hash:
+                    del self.by_filename[entry["filename"]]
+                removed.append({"content_hash": content_hash, **entry})
+            if any(entry is not None for entry in removed):
+                self._save()
+        return removed
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """Renvoie les documents indexés"""
+        with self._lock:
+            return [{"content_hash": content_hash, **entry} for content_hash, entry in self.documents.items()]
+
+    def __len__(self) -> int:
+        return len(self.documents)
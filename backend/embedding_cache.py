@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de cache d'embeddings pour TurboChat
+
+Ce module fournit un cache persistant des vecteurs d'embedding :
+- Adressé par le contenu : clé = hash(identifiant du modèle + texte du chunk)
+- Stocké dans une base SQLite compacte (vecteurs float32 bruts)
+- Borné en taille avec éviction des entrées les moins récemment utilisées
+- Avec suivi du taux de succès
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-embedding-cache")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get("EMBEDDING_CACHE_MAX_MB", "512"))
+
+# Nombre maximal de paramètres par requête SQLite
+SQL_BATCH = 500
+# Après éviction, la taille redescend à cette fraction du plafond
+EVICTION_TARGET = 0.9
+# Dates d'accès des succès gardées en mémoire, écrites par paquets (nombre d'entrées, secondes)
+TOUCH_FLUSH_SIZE = 1000
+TOUCH_FLUSH_INTERVAL = 60.0
+
+
+def cache_key(model_id: str, text: str) -> bytes:
+    """Clé de cache d'un texte pour un modèle donné"""
+    return hashlib.blake2b(f"{model_id}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Cache persistant d'embeddings adressé par le contenu
+
+    Un succès ne coûte qu'une lecture : sa date d'accès, qui ne sert qu'à
+    l'éviction, est gardée en mémoire et écrite avec les suivantes.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Dates d'accès pas encore écrites, par clé
+        self._touched: Dict[bytes, float] = {}
+        self._touched_since = time.monotonic()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+        self.size_bytes, self.entries = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+        ).fetchone()
+        logger.info(f"Cache d'embeddings ouvert: {self.entries} entrées, {self.size_bytes / 1e6:.1f} Mo")
+
+    def get_many(self, model_id: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """
+        Recherche les vecteurs déjà calculés
+
+        Args:
+            model_id: Identifiant du modèle d'embedding
+            texts: Textes à rechercher
+
+        Returns:
+            Vecteurs trouvés, indexés par position dans `texts`
+        """
+        keys = [cache_key(model_id, text) for text in texts]
+        positions = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        found = {}
+        unique_keys = list(positions)
+        with self._lock:
+            for start in range(0, len(unique_keys), SQL_BATCH):
+                batch = unique_keys[start:start + SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, vector in rows:
+                    vector = np.frombuffer(vector, dtype=np.float32)
+                    for i in positions[key]:
+                        found[i] = vector
+
+            if found:
+                now = time.time()
+                for i in found:
+                    self._touched[keys[i]] = now
+                if (
+                    len(self._touched) >= TOUCH_FLUSH_SIZE
+                    or time.monotonic() - self._touched_since >= TOUCH_FLUSH_INTERVAL
+                ):
+                    self._flush_touches()
+                    self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, model_id: str, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Enregistre des vecteurs calculés
+
+        Args:
+            model_id: Identifiant du modèle d'embedding
+            texts: Textes encodés
+            vectors: Matrice des vecteurs (une ligne par texte)
+        """
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            rows[cache_key(model_id, text)] = (model_id, np.asarray(vector, dtype=np.float32).tobytes(), now)
+
+        with self._lock:
+            keys = list(rows)
+            existing = set()
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                existing.update(key for (key,) in self._conn.execute(
+                    f"SELECT key FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+            new_rows = [(key, *row) for key, row in rows.items() if key not in existing]
+            if not new_rows:
+                return
+
+            self._conn.executemany(
+                "INSERT INTO embeddings (key, model_id, vector, last_access) VALUES (?, ?, ?, ?)",
+                new_rows
+            )
+            self.entries += len(new_rows)
+            self.size_bytes += sum(len(row[2]) for row in new_rows)
+
+            if self.size_bytes > self.max_bytes:
+                self._flush_touches()
+                self._evict()
+            self._conn.commit()
+
+    def _flush_touches(self) -> None:
+        """Écrit les dates d'accès en attente (verrou déjà pris, sans valider la transaction)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key, now in self._touched.items()]
+            )
+            self._touched.clear()
+        self._touched_since = time.monotonic()
+
+    def flush(self) -> None:
+        """Écrit les dates d'accès en attente"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées (verrou déjà pris)"""
+        target = self.max_bytes * EVICTION_TARGET
+        evicted = 0
+        while self.size_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT ?",
+                (SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+
+            to_delete = []
+            for key, size in rows:
+                if self.size_bytes <= target:
+                    break
+                to_delete.append((key,))
+                self.size_bytes -= size
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", to_delete)
+            self.entries -= len(to_delete)
+            evicted += len(to_delete)
+
+        self.evictions += evicted
+        logger.info(f"Cache d'embeddings: {evicted} entrées évincées")
+
+    def clear(self) -> None:
+        """Vide le cache"""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self.size_bytes = 0
+            self.entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Taux de succès et occupation du cache"""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self.entries,
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions
+        }
+
+
+# Instance globale du cache (ouverte à la première utilisation)
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Renvoie le cache d'embeddings partagé, ou None s'il est désactivé
+    """
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+    return _embedding_cache
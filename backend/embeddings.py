@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module d'embeddings pour TurboChat
+
+Ce module fournit les moteurs d'embedding utilisés par le système RAG :
+- Un moteur sémantique basé sur un modèle sentence-transformers local
+- Un moteur lexical par hachage de n-grammes, sans modèle, pour les installations hors ligne
+- Un moteur simplifié historique, conservé pour les anciennes collections
+- Des statistiques de débit d'indexation et de latence des requêtes
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import get_embedding_cache
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-embeddings")
+
+# Répertoire des modèles d'embedding locaux
+EMBEDDING_MODELS_DIR = os.environ.get(
+    "EMBEDDING_MODELS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "embeddings")
+)
+# Modèle sentence-transformers par défaut (nom d'un sous-répertoire de
+# EMBEDDING_MODELS_DIR ou chemin absolu). Vide : moteur lexical par hachage.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "")
+# Dimension des vecteurs du moteur par hachage
+HASHING_DIMENSION = int(os.environ.get("HASHING_EMBEDDING_DIMENSION", "384"))
+# Taille maximale d'un lot et plafond de caractères par lot (borne la mémoire)
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_BATCH_CHARS = int(os.environ.get("EMBEDDING_MAX_BATCH_CHARS", "200000"))
+# Nombre de lots encodés en parallèle
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS", "2"))
+
+SENTENCE_TRANSFORMERS_PREFIX = "sentence-transformers/"
+HASHING_PREFIX = "hashing-v1-"
+
+# Poids des familles de caractéristiques du moteur par hachage
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+CHAR_NGRAM_WEIGHT = 0.3
+
+WORD_PATTERN = re.compile(r"\w+")
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Base des moteurs d'embedding
+
+    Chaque moteur est identifié par un `model_id` enregistré avec les
+    collections qu'il a indexées, et mesure son débit.
+    """
+
+    model_id = "base"
+    dimension = 0
+    # Les vecteurs ne dépendent que du texte et du modèle : ils peuvent être mis en cache
+    cacheable = True
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "documents": 0,
+            "document_batches": 0,
+            "document_time": 0.0,
+            "queries": 0,
+            "query_time": 0.0
+        }
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode des textes en une matrice float32 normalisée (une ligne par texte)"""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def encode_cached(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode des textes en réutilisant les vecteurs du cache d'embeddings
+
+        Seuls les textes absents du cache sont encodés (une seule fois s'ils
+        apparaissent plusieurs fois dans le lot), puis ajoutés au cache.
+        """
+        cache = get_embedding_cache() if self.cacheable else None
+        if cache is None or not texts:
+            return self.encode(texts)
+
+        found = cache.get_many(self.model_id, texts)
+        if len(found) == len(texts):
+            return np.vstack([found[i] for i in range(len(texts))])
+
+        missing = {}
+        for i, text in enumerate(texts):
+            if i not in found:
+                missing.setdefault(text, []).append(i)
+        missing_texts = list(missing)
+        computed = self.encode(missing_texts)
+        cache.put_many(self.model_id, missing_texts, computed)
+
+        vectors = np.empty((len(texts), computed.shape[1]), dtype=np.float32)
+        for i, vector in found.items():
+            vectors[i] = vector
+        for text, vector in zip(missing_texts, computed):
+            vectors[missing[text]] = vector
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Créer des embeddings de documents"""
+        start_time = time.perf_counter()
+        vectors = self.encode_cached(texts)
+        elapsed = time.perf_counter() - start_time
+
+        with self._stats_lock:
+            self._stats["documents"] += len(texts)
+            self._stats["document_batches"] += 1
+            self._stats["document_time"] += elapsed
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Créer un embedding de requête"""
+        # Hors cache : une requête répétée est servie par le cache de réponses RAG,
+        # et un échec coûterait une lecture et une écriture SQLite pour un seul texte
+        start_time = time.perf_counter()
+        vector = self.encode([text])[0]
+        elapsed = time.perf_counter() - start_time
+
+        with self._stats_lock:
+            self._stats["queries"] += 1
+            self._stats["query_time"] += elapsed
+        return vector.tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Créer les embeddings de plusieurs requêtes en un seul lot (hors cache, voir `embed_query`)"""
+        start_time = time.perf_counter()
+        vectors = self.encode(texts)
+        elapsed = time.perf_counter() - start_time
+
+        with self._stats_lock:
+            self._stats["queries"] += len(texts)
+            self._stats["query_time"] += elapsed
+        return vectors.tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        """Débit d'indexation et latence moyenne des requêtes"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            "model_id": self.model_id,
+            "dimension": self.dimension,
+            **stats,
+            "documents_per_second": round(stats["documents"] / stats["document_time"], 1) if stats["document_time"] else None,
+            "avg_query_latency_ms": round(1000 * stats["query_time"] / stats["queries"], 2) if stats["queries"] else None
+        }
+
+
+class SimpleEmbeddings(EmbeddingEngine):
+    """
+    Embeddings simplifiés qui utilisent une représentation basique pour les tests
+    """
+
+    model_id = "simple-hash"
+    # hash() est salé par processus : ses vecteurs ne doivent pas être persistés
+    cacheable = False
+
+    def __init__(self, dimension: int = 384):
+        super().__init__()
+        self.dimension = dimension
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.array([self._get_embedding(text) for text in texts], dtype=np.float32)
+
+    def _get_embedding(self, text: str) -> List[float]:
+        """Méthode interne de génération d'embedding simplifiée"""
+        # Hachage simple basé sur le texte
+        hash_val = hash(text) % (10**8)
+        # Convertir en une liste de valeurs pseudo-aléatoires mais déterministes
+        result = []
+        for i in range(self.dimension):
+            val = ((hash_val + i) * 1.0) / (10**8)
+            result.append(val - 0.5)  # Valeurs entre -0.5 et 0.5
+
+        # Normaliser le vecteur
+        norm = sum(x*x for x in result) ** 0.5
+        return [x/norm for x in result]
+
+
+@lru_cache(maxsize=1 << 18)
+def _hash_feature(feature: str, dimension: int) -> Tuple[int, float]:
+    """
+    Colonne et signe d'une caractéristique, stables d'un processus à l'autre
+
+    Contrairement à `hash()`, salé à chaque démarrage de l'interpréteur,
+    blake2b donne la même valeur pour un même texte dans tous les processus.
+    """
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    # Le bit de poids fort donne le signe, ce qui compense les collisions en moyenne
+    return value % dimension, (1.0 if value >> 63 else -1.0)
+
+
+@lru_cache(maxsize=1 << 16)
+def _word_features(word: str, dimension: int, min_n: int, max_n: int) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+    """
+    Colonnes et valeurs signées d'un mot et de ses n-grammes de caractères
+
+    Les mots se répètent énormément d'un texte à l'autre : le cache évite de
+    recalculer leurs n-grammes et leurs hachages.
+    """
+    column, sign = _hash_feature("w:" + word, dimension)
+    columns = [column]
+    values = [sign * WORD_WEIGHT]
+
+    padded = f"<{word}>"
+    for n in range(min_n, min(max_n, len(padded)) + 1):
+        for i in range(len(padded) - n + 1):
+            column, sign = _hash_feature("c:" + padded[i:i + n], dimension)
+            columns.append(column)
+            values.append(sign * CHAR_NGRAM_WEIGHT)
+    return tuple(columns), tuple(values)
+
+
+class HashingEmbeddings(EmbeddingEngine):
+    """
+    Embeddings lexicaux par hachage de caractéristiques (feature hashing)
+
+    Chaque texte est décrit par ses mots, ses paires de mots consécutifs et
+    les n-grammes de caractères de ses mots (robustes aux flexions et aux
+    fautes de frappe). Les caractéristiques sont projetées dans un vecteur de
+    taille fixe par un hachage stable : les vecteurs sont identiques d'un
+    redémarrage à l'autre et aucun modèle n'est chargé. Un lot entier est
+    assemblé en une seule opération NumPy.
+    """
+
+    # Recalculer un vecteur coûte moins qu'une lecture du cache SQLite
+    cacheable = False
+
+    def __init__(self, dimension: int = 384, char_ngram_range: Tuple[int, int] = (3, 5)):
+        super().__init__()
+        self.dimension = dimension
+        self.char_ngram_range = char_ngram_range
+        self.model_id = f"{HASHING_PREFIX}{dimension}"
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        # Minuscules sans accents : "Élève" et "eleve" partagent leurs caractéristiques
+        text = COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text.lower()))
+        return WORD_PATTERN.findall(text)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        min_n, max_n = self.char_ngram_range
+        columns = []
+        values = []
+        row_lengths = []
+
+        for text in texts:
+            start = len(columns)
+            words = self._tokenize(text)
+            for word in words:
+                word_columns, word_values = _word_features(word, self.dimension, min_n, max_n)
+                columns.extend(word_columns)
+                values.extend(word_values)
+            for first, second in zip(words, words[1:]):
+                column, sign = _hash_feature("b:" + first + " " + second, self.dimension)
+                columns.append(column)
+                values.append(sign * BIGRAM_WEIGHT)
+            row_lengths.append(len(columns) - start)
+
+        # Assemblage du lot entier : une case par (texte, colonne)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), row_lengths)
+        flat_index = rows * self.dimension + np.asarray(columns, dtype=np.int64)
+        matrix = np.bincount(
+            flat_index,
+            weights=np.asarray(values, dtype=np.float64),
+            minlength=len(texts) * self.dimension
+        ).reshape(len(texts), self.dimension)
+
+        # Atténuation des termes très fréquents, puis normalisation L2
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+
+class SentenceTransformerEmbeddings(EmbeddingEngine):
+    """
+    Embeddings sémantiques calculés sur CPU par un modèle sentence-transformers local
+
+    Le modèle est chargé depuis le disque à la première utilisation, sans
+    accès réseau. Les textes sont triés par longueur pour limiter le padding,
+    regroupés en lots bornés en nombre et en caractères, puis encodés en
+    parallèle sur un pool de threads.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_batch_chars: int = EMBEDDING_MAX_BATCH_CHARS, workers: int = EMBEDDING_WORKERS):
+        super().__init__()
+        self.model_name = model_name
+        self.model_id = SENTENCE_TRANSFORMERS_PREFIX + model_name
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.workers = max(1, workers)
+        self.model_path = model_name if os.path.isabs(model_name) else os.path.join(EMBEDDING_MODELS_DIR, model_name)
+        self._model = None
+        self._executor = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Modèle sentence-transformers (chargé à la première utilisation)"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        if not os.path.isdir(self.model_path):
+            raise FileNotFoundError(
+                f"Modèle d'embedding introuvable: {self.model_path}. "
+                f"Copiez le modèle dans {EMBEDDING_MODELS_DIR} pour un fonctionnement hors ligne."
+            )
+
+        # Aucun téléchargement : le modèle doit être présent sur le disque
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+        start_time = time.perf_counter()
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        # Répartir les cœurs entre les lots encodés en parallèle
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+        model = SentenceTransformer(self.model_path, device="cpu")
+        self.dimension = model.get_sentence_embedding_dimension()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="turbochat-embed")
+        logger.info(
+            f"Modèle d'embedding {self.model_name} chargé en {time.perf_counter() - start_time:.2f} secondes "
+            f"(dimension {self.dimension}, {self.workers} worker(s))"
+        )
+        return model
+
+    def _make_batches(self, order: List[int], texts: List[str]) -> List[List[int]]:
+        """Regroupe les indices en lots bornés en nombre de textes et en caractères"""
+        batches = []
+        current = []
+        current_chars = 0
+        for index in order:
+            length = len(texts[index])
+            if current and (len(current) >= self.batch_size or current_chars + length > self.max_batch_chars):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append(index)
+            current_chars += length
+        if current:
+            batches.append(current)
+        return batches
+
+    def _encode_batch(self, batch: List[str]) -> np.ndarray:
+        return self.model.encode(
+            batch,
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        model = self.model
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        # Un seul lot (cas des requêtes) : pas de passage par le pool
+        if len(texts) <= self.batch_size and sum(len(text) for text in texts) <= self.max_batch_chars:
+            return self._encode_batch(texts).astype(np.float32, copy=False)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = self._make_batches(order, texts)
+        results = self._executor.map(lambda batch: self._encode_batch([texts[i] for i in batch]), batches)
+
+        vectors = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for batch, batch_vectors in zip(batches, results):
+            vectors[batch] = batch_vectors
+        return vectors
+
+
+# Moteurs déjà instanciés, par identifiant de modèle
+_engines: Dict[str, EmbeddingEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def default_embedding_model_id() -> str:
+    """Identifiant du moteur utilisé pour les nouvelles collections"""
+    if EMBEDDING_MODEL:
+        return SENTENCE_TRANSFORMERS_PREFIX + EMBEDDING_MODEL
+    return f"{HASHING_PREFIX}{HASHING_DIMENSION}"
+
+
+def get_embedding_engine(model_id: Optional[str] = None) -> EmbeddingEngine:
+    """
+    Renvoie le moteur d'embedding correspondant à un identifiant de modèle
+
+    Args:
+        model_id: Identifiant enregistré avec une collection (défaut si None)
+
+    Returns:
+        Le moteur d'embedding partagé
+    """
+    model_id = model_id or default_embedding_model_id()
+
+    with _engines_lock:
+        if model_id not in _engines:
+            if model_id.startswith(SENTENCE_TRANSFORMERS_PREFIX):
+                _engines[model_id] = SentenceTransformerEmbeddings(model_id[len(SENTENCE_TRANSFORMERS_PREFIX):])
+            elif model_id.startswith(HASHING_PREFIX):
+                _engines[model_id] = HashingEmbeddings(int(model_id[len(HASHING_PREFIX):]))
+            elif model_id == SimpleEmbeddings.model_id:
+                _engines[model_id] = SimpleEmbeddings()
+            else:
+                raise ValueError(f"Modèle d'embedding inconnu: {model_id}")
+        return _engines[model_id]
+
+
+def embedding_stats() -> List[Dict[str, Any]]:
+    """Statistiques de tous les moteurs utilisés depuis le démarrage"""
+    with _engines_lock:
+        engines = list(_engines.values())
+    return [engine.stats() for engine in engines]
@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de stockage vectoriel plat pour TurboChat
+
+Ce module fournit une alternative à ChromaDB pour une collection :
+- Vecteurs float32 contigus dans un fichier projeté en mémoire (partagé
+  entre les processus par le cache de pages du système)
+- Identifiants, textes et métadonnées des chunks dans une base SQLite
+- Recherche exacte par un produit matriciel et `argpartition`, par lots de requêtes
+- Ajouts en fin de fichier, suppressions marquées puis compactées
+- Index IVF optionnel (recherche approchée réglable par `nprobe`) et rapport rappel/latence
+- Quantification optionnelle (int8 ou binaire) : parcours des codes puis réordonnancement exact
+- Banc d'essai comparant ce stockage à ChromaDB
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ivf_index import IVFIndex, IVF_MIN_ROWS, IVF_NPROBE, IVF_RETRAIN_FACTOR
+from quantization import QUANTIZERS, Quantizer, get_quantizer
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-flat-vectors")
+
+# Nombre maximal de paramètres par requête SQLite
+SQL_BATCH = 500
+# Compactage dès que les lignes supprimées dépassent cette part du fichier
+COMPACT_RATIO = 0.3
+# ... et ce nombre de lignes
+COMPACT_MIN_ROWS = 1000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise les lignes (produit scalaire = similarité cosinus)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FlatVectorStore:
+    """
+    Stockage vectoriel plat d'une collection
+
+    Les vecteurs (normalisés) sont ajoutés en fin de `vectors.f32` et lus
+    par projection en mémoire : plusieurs processus qui servent la même
+    collection partagent les mêmes pages. La ligne `i` du fichier
+    correspond à la ligne `row = i` de la table `rows` de `rows.sqlite3`.
+    Un compteur de version, incrémenté à chaque écriture, indique aux
+    lecteurs (éventuellement dans un autre processus) de reprojeter le
+    fichier.
+
+    Avec `index="ivf"`, les lignes sont en outre réparties en listes
+    inversées (voir `ivf_index`) dès que la collection atteint
+    IVF_MIN_ROWS vecteurs : une requête ne parcourt alors que les
+    `nprobe` listes les plus proches.
+
+    Avec `quantization` ("int8" ou "binary"), chaque vecteur est aussi
+    codé dans `codes.<quantification>` : la recherche parcourt ces codes,
+    4 à 32 fois plus petits, et ne lit les vecteurs exacts que pour
+    réordonner les meilleurs candidats. Seuls les codes restent alors en
+    mémoire.
+
+    Expose le sous-ensemble de l'interface du vectorstore Chroma et de sa
+    collection utilisé par `RAGSystem` (`_collection` renvoie le stockage
+    lui-même).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding_function: Any,
+        index: Optional[str] = None,
+        quantization: Optional[str] = None
+    ):
+        if index not in (None, "ivf"):
+            raise ValueError(f"Index inconnu: {index}")
+        if quantization is not None and quantization not in QUANTIZERS:
+            raise ValueError(f"Quantification inconnue: {quantization} (choix: {', '.join(QUANTIZERS)})")
+        if index and quantization:
+            raise ValueError("La quantification ne s'applique qu'à la recherche exhaustive (sans index IVF)")
+        self.directory = directory
+        self.embeddings = embedding_function
+        self.ivf = IVFIndex(directory) if index == "ivf" else None
+        self.quantization = quantization
+        self.codes_path = os.path.join(directory, f"codes.{quantization}") if quantization else None
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "rows.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+
+        self._version = None
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._quantizer: Optional[Quantizer] = None
+        self._codes = np.zeros(0)
+
+    @property
+    def _collection(self) -> "FlatVectorStore":
+        return self
+
+    def _state(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT key, value FROM state"))
+
+    def _refresh(self) -> None:
+        """Reprojette le fichier si une écriture a eu lieu depuis la dernière lecture"""
+        state = self._state()
+        if state.get("version", 0) == self._version:
+            return
+        rows, dimension = state.get("rows", 0), state.get("dimension", 0)
+        if rows and dimension:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dimension))
+        else:
+            self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._alive = np.ones(rows, dtype=bool)
+        deleted = [row for (row,) in self._conn.execute("SELECT row FROM rows WHERE deleted = 1")]
+        self._alive[deleted] = False
+        if self.quantization and rows and dimension:
+            self._quantizer = get_quantizer(self.quantization, dimension)
+            self._codes = np.memmap(self.codes_path, dtype=self._quantizer.dtype, mode="r", shape=(rows,))
+        if self.ivf is not None:
+            # Nouvel objet : les recherches en cours gardent les listes qu'elles lisent
+            self.ivf = IVFIndex(self.directory)
+            self.ivf.load(rows if state.get("ivf_rows") else 0)
+        self._version = state.get("version", 0)
+
+    def _bump(self, **values) -> None:
+        """Enregistre l'état et incrémente la version (transaction déjà ouverte)"""
+        state = self._state()
+        state.update(values, version=state.get("version", 0) + 1)
+        self._conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", state.items())
+
+    def _where_rows(self, where: Dict[str, Any]) -> List[int]:
+        """Lignes vivantes dont les métadonnées vérifient un filtre d'égalité"""
+        clauses, params = [], []
+        for key, value in where.items():
+            if key.startswith("$") or isinstance(value, dict):
+                raise ValueError("Seuls les filtres d'égalité sur les métadonnées sont pris en charge")
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f'$."{key}"', value])
+        return [row for (row,) in self._conn.execute(
+            f"SELECT row FROM rows WHERE deleted = 0 AND {' AND '.join(clauses)}", params
+        )]
+
+    # Écritures
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        documents: Optional[List[str]] = None
+    ) -> None:
+        """
+        Ajoute des chunks (un identifiant existant est remplacé)
+
+        Args:
+            ids: Identifiants des chunks
+            embeddings: Vecteurs des chunks
+            metadatas: Métadonnées des chunks
+            documents: Textes des chunks
+        """
+        if not ids:
+            return
+        vectors = _normalize(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        documents = documents or [None for _ in ids]
+
+        with self._lock, self._conn:
+            state = self._state()
+            rows, dimension = state.get("rows", 0), state.get("dimension", vectors.shape[1])
+            if vectors.shape[1] != dimension:
+                raise ValueError(f"Dimension {vectors.shape[1]} incompatible avec la collection ({dimension})")
+
+            for start in range(0, len(ids), SQL_BATCH):
+                batch = ids[start:start + SQL_BATCH]
+                self._conn.execute(
+                    f"UPDATE rows SET deleted = 1, chunk_id = chunk_id || ':' || row "
+                    f"WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+
+            # Un ajout interrompu peut avoir laissé des vecteurs au-delà des lignes enregistrées
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(rows * dimension * 4)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._conn.executemany(
+                "INSERT INTO rows (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (rows + i, chunk_id, document, json.dumps(metadata, ensure_ascii=False))
+                    for i, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                ]
+            )
+            if self.quantization:
+                quantizer = get_quantizer(self.quantization, dimension)
+                with open(self.codes_path, "ab") as f:
+                    f.truncate(rows * quantizer.dtype.itemsize)
+                    f.write(quantizer.encode(vectors).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            values = {"rows": rows + len(ids), "dimension": dimension}
+            if self.ivf is not None:
+                values.update(self._update_ivf(rows, vectors, state.get("ivf_rows", 0)))
+            self._bump(**values)
+
+    def _update_ivf(self, rows: int, vectors: np.ndarray, trained_rows: int) -> Dict[str, int]:
+        """
+        Affecte les nouvelles lignes à l'index IVF, ou (ré)entraîne l'index
+
+        L'index est entraîné quand la collection atteint IVF_MIN_ROWS
+        vecteurs, puis réentraîné chaque fois qu'elle a grossi d'un facteur
+        IVF_RETRAIN_FACTOR (les centroïdes ne représentent plus les données).
+
+        Returns:
+            Valeurs d'état à enregistrer (lignes à l'entraînement)
+        """
+        total = rows + len(vectors)
+        if trained_rows and total <= trained_rows * IVF_RETRAIN_FACTOR:
+            self.ivf.append(rows, vectors)
+            return {}
+        if total < IVF_MIN_ROWS:
+            return {}
+        self.ivf.train(np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(total, vectors.shape[1])))
+        return {"ivf_rows": total}
+
+    def add(self, ids, embeddings, metadatas=None, documents=None) -> None:
+        self.upsert(ids, embeddings, metadatas, documents)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Supprime des chunks, par identifiant ou par filtre sur les métadonnées
+
+        Les lignes sont marquées supprimées ; le fichier est compacté quand
+        elles deviennent trop nombreuses.
+        """
+        with self._lock, self._conn:
+            rows = self._where_rows(where) if where else []
+            for start in range(0, len(ids or []), SQL_BATCH):
+                batch = ids[start:start + SQL_BATCH]
+                rows.extend(row for (row,) in self._conn.execute(
+                    f"SELECT row FROM rows WHERE deleted = 0 AND chunk_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ))
+            if not rows:
+                return
+            self._conn.executemany(
+                "UPDATE rows SET deleted = 1, chunk_id = chunk_id || ':' || row WHERE row = ?",
+                [(row,) for row in rows]
+            )
+            self._bump()
+
+        deleted, total = self._conn.execute("SELECT SUM(deleted), COUNT(*) FROM rows").fetchone()
+        if deleted >= COMPACT_MIN_ROWS and deleted > total * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self) -> None:
+        """Réécrit le fichier de vecteurs sans les lignes supprimées"""
+        start_time = time.time()
+        with self._lock, self._conn:
+            self._version = None
+            self._refresh()
+            alive = np.flatnonzero(self._alive)
+            tmp_path = self.vectors_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(alive), 65536):
+                    f.write(np.ascontiguousarray(self._matrix[alive[start:start + 65536]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            if self.ivf is not None and self._state().get("ivf_rows"):
+                self.ivf.compact(self._alive)
+            if self.quantization and len(self._codes):
+                with open(self.codes_path + ".tmp", "wb") as f:
+                    for start in range(0, len(alive), 65536):
+                        f.write(np.ascontiguousarray(self._codes[alive[start:start + 65536]]).tobytes())
+                os.replace(self.codes_path + ".tmp", self.codes_path)
+
+            kept = self._conn.execute(
+                "SELECT chunk_id, document, metadata FROM rows WHERE deleted = 0 ORDER BY row"
+            ).fetchall()
+            self._conn.execute("DELETE FROM rows")
+            self._conn.executemany(
+                "INSERT INTO rows (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, *values) for row, values in enumerate(kept)]
+            )
+            # Les lecteurs qui projettent encore l'ancien fichier le gardent jusqu'à leur prochaine lecture
+            os.replace(tmp_path, self.vectors_path)
+            self._bump(rows=len(kept))
+        self._version = None
+        logger.info(f"Vecteurs de {self.directory} compactés ({len(kept)} lignes) en {time.time() - start_time:.2f} secondes")
+
+    def persist(self) -> None:
+        """Les écritures sont persistées au fil de l'eau"""
+
+    # Lectures
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows WHERE deleted = 0").fetchone()[0]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, List[Any]]:
+        """
+        Lit des chunks (même format de réponse que `Collection.get` de ChromaDB)
+        """
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = []
+                for start in range(0, len(ids), SQL_BATCH):
+                    batch = ids[start:start + SQL_BATCH]
+                    rows.extend(self._conn.execute(
+                        f"SELECT row, chunk_id, document, metadata FROM rows "
+                        f"WHERE deleted = 0 AND chunk_id IN ({','.join('?' * len(batch))})",
+                        batch
+                    ))
+                if where:
+                    allowed = set(self._where_rows(where))
+                    rows = [row for row in rows if row[0] in allowed]
+            else:
+                query = "SELECT row, chunk_id, document, metadata FROM rows WHERE deleted = 0"
+                params: List[Any] = []
+                if where:
+                    allowed = self._where_rows(where)
+                    query += f" AND row IN ({','.join(str(row) for row in allowed) or 'NULL'})"
+                query += " ORDER BY row LIMIT ? OFFSET ?"
+                params += [limit if limit is not None else -1, offset]
+                rows = self._conn.execute(query, params).fetchall()
+
+            result = {"ids": [chunk_id for _, chunk_id, _, _ in rows]}
+            if "documents" in include:
+                result["documents"] = [document for _, _, document, _ in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [json.loads(metadata) for _, _, _, metadata in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [np.array(self._matrix[row]) for row, _, _, _ in rows]
+        return result
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        exact: bool = False
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche des k plus proches voisins de plusieurs requêtes
+
+        Args:
+            query_vectors: Matrice des vecteurs de requête (une ligne par requête)
+            k: Nombre de voisins par requête
+            where: Filtre d'égalité sur les métadonnées
+            nprobe: Listes IVF parcourues par requête (IVF_NPROBE par défaut ;
+                plus de listes, meilleur rappel mais requête plus lente)
+            exact: Recherche exacte même avec un index IVF ou une quantification
+
+        Returns:
+            Pour chaque requête : (ligne, similarité cosinus), par similarité décroissante
+        """
+        queries = _normalize(np.atleast_2d(query_vectors))
+        with self._lock:
+            self._refresh()
+            matrix, alive, ivf = self._matrix, self._alive, self.ivf
+            quantizer, codes = self._quantizer, self._codes
+            if where:
+                alive = np.zeros_like(alive)
+                alive[self._where_rows(where)] = True
+        if not len(matrix) or not alive.any():
+            return [[] for _ in queries]
+        if not exact and quantizer is not None and len(codes) == len(matrix):
+            return self._search_quantized(matrix, codes, quantizer, alive, queries, k)
+
+        nprobe = nprobe or IVF_NPROBE
+        if not exact and ivf is not None and ivf.trained and nprobe < ivf.nlist:
+            # Un filtre très sélectif laisse moins de lignes que les listes parcourues :
+            # la recherche exacte est alors à la fois plus rapide et complète
+            if not where or alive.sum() > len(matrix) * nprobe / ivf.nlist:
+                return ivf.search(matrix, alive, queries, k, nprobe)
+
+        # Un seul produit matriciel pour tout le lot de requêtes
+        scores = queries @ matrix.T
+        scores[:, ~alive] = -np.inf
+        k = min(k, int(alive.sum()))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            order = candidates[np.argsort(-query_scores[candidates])]
+            results.append([(int(row), float(query_scores[row])) for row in order])
+        return results
+
+    @staticmethod
+    def _search_quantized(
+        matrix: np.ndarray,
+        codes: np.ndarray,
+        quantizer: Quantizer,
+        alive: np.ndarray,
+        queries: np.ndarray,
+        k: int
+    ) -> List[List[Tuple[int, float]]]:
+        """Parcours des codes, puis similarité exacte des meilleurs candidats"""
+        alive_count = int(alive.sum())
+        candidates_count = min(quantizer.candidates(k), alive_count)
+        results = []
+        for query in queries:
+            approximate = quantizer.scores(codes, query)
+            approximate[~alive] = -np.inf
+            candidates = np.sort(np.argpartition(-approximate, candidates_count - 1)[:candidates_count])
+            # Seuls les vecteurs exacts des candidats sont lus
+            scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+            top = min(k, alive_count)
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results.append([(int(candidates[i]), float(scores[i])) for i in best])
+        return results
+
+    def _rows_to_documents(self, hits: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        rows = dict((row, (document, metadata)) for row, document, metadata in self._conn.execute(
+            f"SELECT row, document, metadata FROM rows WHERE row IN ({','.join(str(row) for row, _ in hits) or 'NULL'})"
+        ))
+        return [
+            (Document(page_content=rows[row][0] or "", metadata=json.loads(rows[row][1])), score)
+            for row, score in hits if row in rows
+        ]
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        nprobe: Optional[int] = None
+    ) -> Dict[str, List[List[Any]]]:
+        """
+        Recherche par lot (même format de réponse que `Collection.query` de ChromaDB ;
+        les distances sont des distances cosinus)
+        """
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for hits in self.search(np.asarray(query_embeddings, dtype=np.float32), n_results, where, nprobe):
+            with self._lock:
+                rows = dict((row, values) for row, *values in self._conn.execute(
+                    f"SELECT row, chunk_id, document, metadata FROM rows WHERE row IN ({','.join(str(row) for row, _ in hits) or 'NULL'})"
+                ))
+            hits = [(row, score) for row, score in hits if row in rows]
+            result["ids"].append([rows[row][0] for row, _ in hits])
+            if "documents" in include:
+                result["documents"].append([rows[row][1] for row, _ in hits])
+            if "metadatas" in include:
+                result["metadatas"].append([json.loads(rows[row][2]) for row, _ in hits])
+            # Les distances sont toujours renvoyées : la recherche hybride en a besoin
+            result["distances"].append([1.0 - score for _, score in hits])
+        return {key: value for key, value in result.items() if key in ("ids", "distances") or key in include}
+
+    def similarity_search_with_score_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Recherche sémantique de plusieurs requêtes textuelles en un seul produit matriciel
+
+        Returns:
+            Pour chaque requête : (chunk, similarité cosinus), par similarité décroissante
+        """
+        vectors = np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+        hits = self.search(vectors, k, filter, nprobe)
+        with self._lock:
+            return [self._rows_to_documents(query_hits) for query_hits in hits]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        hits = self.search(vector, k, filter, nprobe)[0]
+        with self._lock:
+            return self._rows_to_documents(hits)
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter, nprobe)]
+
+    def recall_report(
+        self,
+        queries: int = 100,
+        k: int = 10,
+        nprobes: Tuple[int, ...] = (1, 2, 4, 8, 16, 32, 64)
+    ) -> Dict[str, Any]:
+        """
+        Mesure le rappel et la latence de la recherche approchée (IVF ou
+        quantifiée) face à la recherche exacte sur les mêmes vecteurs
+
+        Les requêtes sont des vecteurs de la collection tirés au hasard ;
+        chacun est retiré de ses propres résultats (exacts comme approchés).
+
+        Args:
+            queries: Nombre de requêtes
+            k: Nombre de voisins par requête
+            nprobes: Valeurs de `nprobe` évaluées (index IVF)
+
+        Returns:
+            Taille de la collection et de l'index, latence de la recherche
+            exacte, puis rappel@k et latence moyenne pour chaque `nprobe`
+            (IVF) ou pour la quantification, avec la mémoire économisée
+        """
+        with self._lock:
+            self._refresh()
+            matrix, alive, ivf, quantizer = self._matrix, self._alive, self.ivf, self._quantizer
+        rows = np.flatnonzero(alive)
+        report: Dict[str, Any] = {"vectors": int(len(rows)), "k": k}
+        if quantizer is None and (ivf is None or not ivf.trained):
+            report["error"] = (
+                f"Ni quantification ni index IVF entraîné (au moins {IVF_MIN_ROWS} vecteurs sur un stockage ivf)"
+            )
+            return report
+
+        sample = np.random.default_rng(0).choice(rows, min(queries, len(rows)), replace=False)
+        query_vectors = np.asarray(matrix[sample], dtype=np.float32)
+
+        def run(**options) -> Tuple[List[set], float]:
+            # Une requête à la fois, comme en production
+            start_time = time.perf_counter()
+            found = [self.search(query[None, :], k + 1, **options)[0] for query in query_vectors]
+            elapsed = (time.perf_counter() - start_time) / len(sample)
+            return [set([hit for hit, _ in hits if hit != row][:k]) for hits, row in zip(found, sample)], elapsed
+
+        def measure(**options) -> Dict[str, Any]:
+            found, elapsed = run(**options)
+            recall = np.mean([len(hits & truth) / max(len(truth), 1) for hits, truth in zip(found, expected)])
+            return {
+                "recall": round(float(recall), 4),
+                "query_ms": round(elapsed * 1000, 3),
+                "speedup": round(exact_time / elapsed, 2) if elapsed else None
+            }
+
+        expected, exact_time = run(exact=True)
+        report["exact_ms"] = round(exact_time * 1000, 3)
+
+        if quantizer is not None:
+            float_bytes = matrix.shape[1] * 4
+            report["quantization"] = {
+                "method": quantizer.name,
+                "bytes_per_vector": quantizer.dtype.itemsize,
+                "float_bytes_per_vector": float_bytes,
+                "memory_reduction": round(float_bytes / quantizer.dtype.itemsize, 2),
+                "candidates": quantizer.candidates(k),
+                **measure()
+            }
+            return report
+
+        nlist, avg_list = ivf.stats()
+        report.update(nlist=nlist, avg_list_size=round(avg_list, 1), nprobe=[])
+        for nprobe in nprobes:
+            report["nprobe"].append({"nprobe": nprobe, **measure(nprobe=nprobe)})
+            if nprobe >= nlist:
+                break
+        return report
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+
+def benchmark_vector_backends(
+    chunks: int = 100000,
+    dimension: int = 384,
+    queries: int = 64,
+    k: int = 5,
+    directory: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare le stockage plat à ChromaDB sur des vecteurs aléatoires groupés
+    autour de centres (comme des embeddings de textes sur quelques thèmes ;
+    des vecteurs uniformes sont le pire cas de toute recherche approchée)
+
+    Args:
+        chunks: Nombre de vecteurs indexés
+        dimension: Dimension des vecteurs
+        queries: Nombre de requêtes
+        k: Nombre de voisins par requête
+        directory: Répertoire de travail (temporaire par défaut)
+
+    Returns:
+        Pour chaque stockage (plat exact, plat avec index IVF ou quantifié,
+        ChromaDB) : durée d'écriture, latence moyenne d'une requête (une par
+        une et par lot pour le stockage plat), rappel@k par rapport à la
+        recherche exacte et, pour la quantification, mémoire économisée
+    """
+    import shutil
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix="turbochat-bench-")
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(chunks // 500, 1), dimension)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        noise = rng.standard_normal((count, dimension)).astype(np.float32)
+        return _normalize(centers[rng.integers(0, len(centers), count)] + 0.5 * noise)
+
+    vectors = sample(chunks)
+    query_vectors = sample(queries)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    metadatas = [{"document_id": str(i // 20)} for i in range(chunks)]
+    report = {}
+
+    try:
+        store = FlatVectorStore(os.path.join(directory, "flat"), None)
+        start_time = time.perf_counter()
+        for start in range(0, chunks, 5000):
+            store.upsert(ids[start:start + 5000], vectors[start:start + 5000], metadatas[start:start + 5000])
+        write_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for query in query_vectors:
+            store.search(query[None, :], k)
+        single_time = (time.perf_counter() - start_time) / queries
+        start_time = time.perf_counter()
+        exact = [[row for row, _ in hits] for hits in store.search(query_vectors, k)]
+        batch_time = (time.perf_counter() - start_time) / queries
+        store.close()
+        report["flat"] = {
+            "write_seconds": round(write_time, 3),
+            "query_ms": round(single_time * 1000, 3),
+            "batch_query_ms": round(batch_time * 1000, 3),
+            "recall": 1.0
+        }
+
+        for name, options in (("ivf", {"index": "ivf"}), ("int8", {"quantization": "int8"}), ("binary", {"quantization": "binary"})):
+            store = FlatVectorStore(os.path.join(directory, name), None, **options)
+            start_time = time.perf_counter()
+            for start in range(0, chunks, 5000):
+                store.upsert(ids[start:start + 5000], vectors[start:start + 5000], metadatas[start:start + 5000])
+            write_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            found = [store.search(query[None, :], k)[0] for query in query_vectors]
+            single_time = (time.perf_counter() - start_time) / queries
+            store.close()
+            report[name] = {
+                "write_seconds": round(write_time, 3),
+                "query_ms": round(single_time * 1000, 3),
+                "recall": round(float(np.mean([
+                    len({row for row, _ in hits} & set(expected)) / k for hits, expected in zip(found, exact)
+                ])), 4)
+            }
+            if "quantization" in options:
+                code_bytes = os.path.getsize(os.path.join(directory, name, f"codes.{name}"))
+                report[name]["memory_reduction"] = round(chunks * dimension * 4 / code_bytes, 2)
+
+        try:
+            import chromadb
+        except ImportError:
+            report["chroma"] = {"error": "chromadb non installé"}
+            return report
+
+        client = chromadb.PersistentClient(path=os.path.join(directory, "chroma"))
+        collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+        batch = min(5000, getattr(client, "max_batch_size", 5000))
+        start_time = time.perf_counter()
+        for start in range(0, chunks, batch):
+            collection.add(ids=ids[start:start + batch], embeddings=vectors[start:start + batch].tolist(), metadatas=metadatas[start:start + batch])
+        write_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        found = [collection.query(query_embeddings=[query.tolist()], n_results=k)["ids"][0] for query in query_vectors]
+        single_time = (time.perf_counter() - start_time) / queries
+        recall = np.mean([
+            len({int(chunk_id.split("-")[1]) for chunk_id in hits} & set(expected)) / k
+            for hits, expected in zip(found, exact)
+        ])
+        report["chroma"] = {
+            "write_seconds": round(write_time, 3),
+            "query_ms": round(single_time * 1000, 3),
+            "recall": round(float(recall), 4)
+        }
+        return report
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # Banc d'essai : python flat_vectors.py [nombre de chunks] [dimension]
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    for name, stats in benchmark_vector_backends(chunks, dimension).items():
+        print(f"{name:>7}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de fusion des résultats de la recherche hybride pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Convertir les distances renvoyées par les stockages vectoriels en similarités cosinus
+- Fusionner les classements BM25 et vectoriel par Reciprocal Rank Fusion
+  ou par somme pondérée des scores normalisés
+- Conserver pour chaque chunk ses scores d'origine et son score fusionné
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Méthode de fusion par défaut : "rrf" (rangs) ou "weighted" (scores normalisés)
+HYBRID_FUSION = os.environ.get("HYBRID_FUSION", "rrf")
+FUSION_METHODS = ("rrf", "weighted")
+# Poids de la recherche vectorielle (la recherche BM25 reçoit le complément)
+HYBRID_VECTOR_WEIGHT = float(os.environ.get("HYBRID_VECTOR_WEIGHT", "0.5"))
+# Constante de lissage des rangs de la RRF
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+# Candidats demandés à chaque recherche, par chunk renvoyé
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "2"))
+
+
+class ScoredChunk(NamedTuple):
+    """Chunk retenu par la recherche, avec ses scores"""
+    chunk_id: str
+    # Score fusionné, entre 0 et 1
+    score: float
+    # Score BM25 brut et similarité cosinus (None si le chunk n'a pas été trouvé par cette recherche)
+    bm25_score: Optional[float] = None
+    vector_score: Optional[float] = None
+
+
+def distances_to_similarities(distances: List[float], space: Optional[str]) -> List[float]:
+    """
+    Convertit les distances d'une collection ChromaDB en similarités cosinus
+
+    Args:
+        distances: Distances renvoyées par `Collection.query`
+        space: Espace de la collection ("l2" par défaut, "cosine" ou "ip")
+
+    Returns:
+        Similarités cosinus (les embeddings sont normalisés)
+    """
+    if space in ("cosine", "ip"):
+        return [1.0 - distance for distance in distances]
+    # Distance euclidienne au carré entre vecteurs unitaires : 2 - 2 cos
+    return [1.0 - distance / 2 for distance in distances]
+
+
+def _min_max(hits: List[Tuple[str, float]]) -> Dict[str, float]:
+    """Scores ramenés entre 0 et 1 (le meilleur vaut 1)"""
+    if not hits:
+        return {}
+    scores = [score for _, score in hits]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return {chunk_id: 1.0 for chunk_id, _ in hits}
+    return {chunk_id: (score - low) / (high - low) for chunk_id, score in hits}
+
+
+def fuse(
+    bm25_hits: List[Tuple[str, float]],
+    vector_hits: List[Tuple[str, float]],
+    method: Optional[str] = None,
+    vector_weight: Optional[float] = None,
+    rrf_k: int = HYBRID_RRF_K
+) -> List[ScoredChunk]:
+    """
+    Fusionne les classements BM25 et vectoriel
+
+    Avec "rrf", un chunk reçoit poids / (rang + rrf_k) de chaque classement
+    où il figure ; le total est divisé par son maximum possible (premier des
+    deux classements), pour que le score fusionné soit entre 0 et 1 quelle
+    que soit la méthode. Avec "weighted", les scores de chaque classement
+    sont ramenés entre 0 et 1 puis sommés avec leurs poids.
+
+    Args:
+        bm25_hits: (chunk, score BM25), par score décroissant
+        vector_hits: (chunk, similarité cosinus), par similarité décroissante
+        method: "rrf" ou "weighted" (HYBRID_FUSION par défaut)
+        vector_weight: Poids de la recherche vectorielle, entre 0 et 1
+            (HYBRID_VECTOR_WEIGHT par défaut)
+        rrf_k: Constante de lissage des rangs
+
+    Returns:
+        Chunks distincts, par score fusionné décroissant
+    """
+    method = method or HYBRID_FUSION
+    vector_weight = HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Méthode de fusion inconnue: {method} (choix: {', '.join(FUSION_METHODS)})")
+    if not 0.0 <= vector_weight <= 1.0:
+        raise ValueError("vector_weight doit être compris entre 0 et 1")
+    weights = (1.0 - vector_weight, vector_weight)
+    bm25_scores, vector_scores = dict(bm25_hits), dict(vector_hits)
+
+    fused: Dict[str, float] = {}
+    if method == "rrf":
+        for hits, weight in zip((bm25_hits, vector_hits), weights):
+            for rank, (chunk_id, _) in enumerate(hits, start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (rank + rrf_k)
+        best = sum(weight for hits, weight in zip((bm25_hits, vector_hits), weights) if hits) / (1 + rrf_k)
+    else:
+        for hits, weight in zip((bm25_hits, vector_hits), weights):
+            for chunk_id, score in _min_max(hits).items():
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * score
+        best = sum(weight for hits, weight in zip((bm25_hits, vector_hits), weights) if hits)
+
+    return sorted(
+        (
+            ScoredChunk(chunk_id, score / best if best else 0.0, bm25_scores.get(chunk_id), vector_scores.get(chunk_id))
+            for chunk_id, score in fused.items()
+        ),
+        key=lambda chunk: chunk.score,
+        reverse=True
+    )
+
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de file d'indexation pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Indexer les documents téléversés en arrière-plan, dans un pool de workers
+- Suivre l'avancement de chaque tâche (pages lues, chunks encodés, chunks écrits)
+- Indexer en une seule tâche une archive zip ou un lot de fichiers
+- Synchroniser une collection avec un répertoire
+- Annuler une tâche en attente ou en cours
+- Relancer une tâche échouée ou annulée
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from rag import IngestionCancelled, get_rag_system
+from pipeline import BulkIngestionPipeline
+from directory_sync import DirectorySync
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-ingestion")
+
+# Nombre de documents indexés simultanément
+INGESTION_WORKERS = int(os.environ.get("INGESTION_WORKERS", "2"))
+# Nombre de tâches terminées conservées pour consultation
+MAX_FINISHED_JOBS = int(os.environ.get("INGESTION_MAX_FINISHED_JOBS", "200"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class IngestionJob:
+    """
+    Tâche d'indexation d'un fichier, ou d'un lot de fichiers, dans une collection
+
+    Statuts : "queued", "running", puis "completed", "failed" ou "cancelled".
+    """
+
+    def __init__(
+        self,
+        file_paths: List[str],
+        collection_name: str,
+        filename: Optional[str] = None,
+        kind: str = "file",
+        content_hashes: Optional[Dict[str, str]] = None
+    ):
+        self.id = str(uuid.uuid4())
+        self.file_paths = file_paths
+        # Empreintes calculées à la réception, par chemin
+        self.content_hashes = content_hashes or {}
+        self.kind = kind
+        self.filename = filename or ", ".join(os.path.basename(path) for path in file_paths)
+        self.collection_name = collection_name
+        self.created_at = datetime.now().isoformat()
+        self.attempts = 0
+        self.cancel_event = threading.Event()
+        self.future = None
+        # Incrémenté à chaque changement, pour ne notifier que les nouveautés
+        self.version = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.status = "queued"
+        self.files_total = len(self.file_paths)
+        self.files_parsed = 0
+        self.files_skipped = 0
+        self.failed_files = []
+        self.document_ids = []
+        self.sync_report = None
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_dropped = 0
+        self.chunks_embedded = 0
+        self.chunks_written = 0
+        self.document_id = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.duration = None
+        self.cancel_event.clear()
+        self.version += 1
+
+    def update(self, **fields) -> None:
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "collection_name": self.collection_name,
+            "status": self.status,
+            "cancel_requested": self.cancel_event.is_set(),
+            "files_total": self.files_total,
+            "files_parsed": self.files_parsed,
+            "files_skipped": self.files_skipped,
+            "failed_files": self.failed_files,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_dropped": self.chunks_dropped,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_written": self.chunks_written,
+            "document_id": self.document_id,
+            "document_ids": self.document_ids,
+            "sync_report": self.sync_report,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": self.duration,
+            "version": self.version
+        }
+
+
+class IngestionQueue:
+    """
+    File des tâches d'indexation traitée par un pool de threads
+
+    Les tâches s'exécutent hors de la boucle d'événements : l'endpoint
+    de téléversement rend la main dès que le fichier est enregistré.
+    """
+
+    def __init__(self, workers: int = INGESTION_WORKERS):
+        self.workers = workers
+        self.jobs: Dict[str, IngestionJob] = OrderedDict()
+        # Réentrant : cancel termine une tâche en attente (via _finish) sans relâcher le verrou
+        self._lock = threading.RLock()
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="turbochat-ingest")
+        return self._executor
+
+    def submit(
+        self,
+        file_path: str,
+        collection_name: str,
+        filename: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Met en file l'indexation d'un fichier
+
+        Args:
+            file_path: Chemin du fichier enregistré
+            collection_name: Collection cible
+            filename: Nom d'origine du fichier
+            content_hash: Empreinte du contenu, si déjà calculée
+
+        Returns:
+            La tâche créée
+        """
+        content_hashes = {file_path: content_hash} if content_hash else None
+        return self._submit(IngestionJob([file_path], collection_name, filename, content_hashes=content_hashes))
+
+    def submit_bulk(
+        self,
+        file_paths: List[str],
+        collection_name: str,
+        content_hashes: Optional[Dict[str, str]] = None
+    ) -> IngestionJob:
+        """
+        Met en file l'indexation d'un lot de fichiers et d'archives zip
+
+        Args:
+            file_paths: Chemins des fichiers enregistrés
+            collection_name: Collection cible
+            content_hashes: Empreintes déjà calculées, par chemin
+
+        Returns:
+            La tâche créée
+        """
+        return self._submit(IngestionJob(file_paths, collection_name, kind="bulk", content_hashes=content_hashes))
+
+    def submit_sync(self, collection_name: str, directory: str) -> IngestionJob:
+        """
+        Met en file la synchronisation d'une collection avec un répertoire
+
+        Une synchronisation déjà en attente ou en cours pour la collection
+        est renvoyée au lieu d'en créer une seconde.
+
+        Args:
+            collection_name: Collection à synchroniser
+            directory: Répertoire source
+
+        Returns:
+            La tâche de synchronisation
+        """
+        with self._lock:
+            for job in self.jobs.values():
+                if job.kind == "sync" and job.collection_name == collection_name and not job.finished:
+                    return job
+        return self._submit(IngestionJob([directory], collection_name, filename=directory, kind="sync"))
+
+    def _submit(self, job: IngestionJob) -> IngestionJob:
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self._enqueue(job)
+        logger.info(f"Tâche {job.id} en file: {job.filename} -> {job.collection_name}")
+        return job
+
+    def _enqueue(self, job: IngestionJob) -> None:
+        job.attempts += 1
+        job.future = self.executor.submit(self._run, job)
+
+    def _prune(self) -> None:
+        """Oublie les tâches terminées les plus anciennes (verrou déjà pris)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: IngestionJob) -> None:
+        # Sous le verrou : une annulation ou une relance voit la tâche en attente ou en cours
+        with self._lock:
+            if job.cancel_event.is_set():
+                self._finish(job, "cancelled")
+                return
+            job.update(status="running", started_at=datetime.now().isoformat())
+        start_time = time.perf_counter()
+        if job.kind == "bulk":
+            self._run_bulk(job, start_time)
+            return
+        if job.kind == "sync":
+            self._run_sync(job, start_time)
+            return
+
+        try:
+            result = get_rag_system().process_file(
+                job.file_paths[0],
+                job.collection_name,
+                progress=job.update,
+                should_cancel=job.cancel_event.is_set,
+                content_hash=job.content_hashes.get(job.file_paths[0]),
+                filename=job.filename
+            )
+        except Exception as e:
+            logger.error(f"Tâche {job.id} échouée: {e}")
+            self._finish(job, "failed", start_time, error=str(e))
+            return
+
+        if result.status == "indexed":
+            self._finish(job, "completed", start_time, files_parsed=1, document_id=result.id, document_ids=[result.id])
+        elif result.status == "duplicate":
+            self._finish(job, "completed", start_time, files_skipped=1, document_id=result.id)
+        else:
+            status = "cancelled" if result.status == "cancelled" else "failed"
+            self._finish(job, status, start_time, error=result.metadata.get("error"))
+
+    def _run_bulk(self, job: IngestionJob, start_time: float) -> None:
+        # Le nombre de fichiers n'est connu qu'au fil de l'extraction des archives
+        job.update(files_total=0)
+        pipeline = BulkIngestionPipeline(
+            get_rag_system(),
+            job.collection_name,
+            progress=job.update,
+            should_cancel=job.cancel_event.is_set
+        )
+        try:
+            result = pipeline.run(job.file_paths, job.content_hashes)
+        except IngestionCancelled as e:
+            self._finish(job, "cancelled", start_time, error=str(e))
+            return
+        except Exception as e:
+            logger.error(f"Tâche {job.id} échouée: {e}")
+            self._finish(job, "failed", start_time, error=str(e))
+            return
+
+        self._finish(
+            job, "completed", start_time,
+            failed_files=result["failed_files"],
+            document_ids=[document["id"] for document in result["documents"]]
+        )
+
+    def _run_sync(self, job: IngestionJob, start_time: float) -> None:
+        job.update(files_total=0)
+        try:
+            report = DirectorySync(get_rag_system(), job.collection_name, job.file_paths[0]).run(
+                progress=job.update,
+                should_cancel=job.cancel_event.is_set
+            )
+        except IngestionCancelled as e:
+            self._finish(job, "cancelled", start_time, error=str(e))
+            return
+        except Exception as e:
+            logger.error(f"Tâche {job.id} échouée: {e}")
+            self._finish(job, "failed", start_time, error=str(e))
+            return
+
+        self._finish(job, "completed", start_time, failed_files=report["failed_files"], sync_report=report)
+
+    def _finish(self, job: IngestionJob, status: str, start_time: Optional[float] = None, **fields) -> None:
+        duration = round(time.perf_counter() - start_time, 3) if start_time is not None else None
+        with self._lock:
+            job.update(status=status, finished_at=datetime.now().isoformat(), duration=duration, **fields)
+        logger.info(f"Tâche {job.id} terminée: {status}")
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, collection_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Renvoie les tâches, des plus récentes aux plus anciennes"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [
+            job.to_dict() for job in reversed(jobs)
+            if collection_name is None or job.collection_name == collection_name
+        ]
+
+    def cancel(self, job_id: str) -> IngestionJob:
+        """
+        Annule une tâche
+
+        Une tâche en attente est retirée de la file. Une tâche en cours
+        s'arrête au prochain lot et ses chunks déjà écrits sont retirés.
+
+        Raises:
+            KeyError: Si la tâche n'existe pas
+            ValueError: Si la tâche est déjà terminée
+        """
+        # Vérification et annulation sous le verrou : la tâche ne peut pas se
+        # terminer ou être relancée entre les deux
+        with self._lock:
+            job = self.jobs[job_id]
+            if job.finished:
+                raise ValueError(f"La tâche {job_id} est déjà terminée ({job.status})")
+
+            job.cancel_event.set()
+            job.update()
+            if job.future is not None and job.future.cancel():
+                self._finish(job, "cancelled")
+        logger.info(f"Annulation demandée pour la tâche {job_id}")
+        return job
+
+    def retry(self, job_id: str) -> IngestionJob:
+        """
+        Relance une tâche échouée ou annulée
+
+        Raises:
+            KeyError: Si la tâche n'existe pas
+            ValueError: Si la tâche n'est pas relançable
+        """
+        # Sous le verrou : deux relances simultanées ne mettent la tâche en file qu'une fois
+        with self._lock:
+            job = self.jobs[job_id]
+            if job.status not in ("failed", "cancelled"):
+                raise ValueError(f"Seule une tâche échouée ou annulée peut être relancée ({job.status})")
+            if not all(os.path.exists(path) for path in job.file_paths):
+                raise ValueError(f"Le fichier {job.filename} n'est plus disponible")
+
+            job._reset()
+            self._enqueue(job)
+        logger.info(f"Tâche {job_id} relancée (tentative {job.attempts})")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "by_status": {status: statuses.count(status) for status in set(statuses)}
+        }
+
+    def shutdown(self) -> None:
+        """Annule les tâches restantes et attend l'arrêt des workers"""
+        for job in list(self.jobs.values()):
+            if not job.finished:
+                job.cancel_event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# Instance globale de la file d'indexation
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module d'index IVF pour TurboChat
+
+Ce module fournit un index de recherche approchée pour le stockage vectoriel plat :
+- Partition des vecteurs en listes inversées autour de centroïdes (k-means sphérique)
+- Insertion incrémentale : chaque nouveau vecteur rejoint la liste de son centroïde
+- Recherche limitée aux `nprobe` listes les plus proches de la requête
+- Centroïdes et affectations persistés à côté des vecteurs
+"""
+
+import os
+import math
+import time
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-ivf")
+
+# Nombre de listes (0 : 4 * racine du nombre de vecteurs à l'entraînement)
+IVF_NLIST = int(os.environ.get("IVF_NLIST", "0"))
+# Listes parcourues par requête, par défaut
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+# En dessous de ce nombre de vecteurs, la recherche reste exacte
+IVF_MIN_ROWS = int(os.environ.get("IVF_MIN_ROWS", "2000"))
+# Réentraînement quand la collection a grossi de ce facteur depuis le dernier entraînement
+IVF_RETRAIN_FACTOR = float(os.environ.get("IVF_RETRAIN_FACTOR", "4"))
+
+# Itérations de k-means et vecteurs d'entraînement par liste
+KMEANS_ITERATIONS = 10
+TRAIN_ROWS_PER_LIST = 64
+# Taille des blocs de vecteurs affectés en une fois
+ASSIGN_BLOCK = 65536
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Indice du centroïde le plus proche (produit scalaire) de chaque vecteur"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK], dtype=np.float32)
+        labels[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """
+    Calcule des centroïdes par k-means sphérique sur un échantillon
+
+    Args:
+        vectors: Vecteurs normalisés
+        nlist: Nombre de centroïdes
+        seed: Graine de l'échantillonnage
+
+    Returns:
+        Matrice (nlist, dimension) de centroïdes normalisés
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * TRAIN_ROWS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        labels = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        # Une liste vide reprend un vecteur de l'échantillon au hasard
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Listes inversées d'un stockage vectoriel plat
+
+    `ivf_centroids.npy` contient les centroïdes et `ivf_assignments.i32`
+    la liste de chaque ligne du fichier de vecteurs (même ordre, ajout en
+    fin de fichier). Les listes elles-mêmes sont reconstruites en mémoire
+    à la lecture, par un tri des affectations.
+    """
+
+    def __init__(self, directory: str):
+        self.centroids_path = os.path.join(directory, "ivf_centroids.npy")
+        self.assignments_path = os.path.join(directory, "ivf_assignments.i32")
+        self.centroids: Optional[np.ndarray] = None
+        self.order = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids) if self.centroids is not None else 0
+
+    def load(self, rows: int) -> None:
+        """Charge les centroïdes et reconstruit les listes des `rows` premières lignes"""
+        try:
+            self.centroids = np.load(self.centroids_path)
+        except FileNotFoundError:
+            self.centroids = None
+            return
+        assignments = np.fromfile(self.assignments_path, dtype=np.int32, count=rows) if rows else np.zeros(0, dtype=np.int32)
+        # Listes : lignes triées par centroïde, et début de chaque liste
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.nlist))])
+
+    def train(self, vectors: np.ndarray, nlist: int = IVF_NLIST) -> None:
+        """
+        Entraîne les centroïdes et réaffecte toutes les lignes
+
+        Args:
+            vectors: Tous les vecteurs du stockage (lignes supprimées comprises)
+            nlist: Nombre de listes (0 : choisi d'après le nombre de vecteurs)
+        """
+        start_time = time.time()
+        nlist = nlist or max(1, int(4 * math.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        centroids = train_centroids(vectors, nlist)
+        assignments = assign(vectors, centroids)
+
+        tmp_path = self.assignments_path + ".tmp"
+        assignments.tofile(tmp_path)
+        os.replace(tmp_path, self.assignments_path)
+        with open(self.centroids_path + ".tmp", "wb") as f:
+            np.save(f, centroids)
+        os.replace(self.centroids_path + ".tmp", self.centroids_path)
+        logger.info(
+            f"Index IVF {self.centroids_path} entraîné: {nlist} listes pour {len(vectors)} vecteurs "
+            f"en {time.time() - start_time:.2f} secondes"
+        )
+
+    def append(self, rows: int, vectors: np.ndarray) -> None:
+        """
+        Affecte de nouvelles lignes à leur liste (insertion incrémentale)
+
+        Args:
+            rows: Nombre de lignes déjà affectées (un ajout interrompu au-delà est écrasé)
+            vectors: Vecteurs ajoutés en fin de stockage
+        """
+        # Centroïdes relus : un autre processus a pu réentraîner l'index
+        centroids = np.load(self.centroids_path)
+        with open(self.assignments_path, "ab") as f:
+            f.truncate(rows * 4)
+            f.write(assign(vectors, centroids).tobytes())
+
+    def compact(self, alive: np.ndarray) -> None:
+        """Ne garde que les affectations des lignes conservées par un compactage"""
+        assignments = np.fromfile(self.assignments_path, dtype=np.int32, count=len(alive))
+        tmp_path = self.assignments_path + ".tmp"
+        assignments[alive].tofile(tmp_path)
+        os.replace(tmp_path, self.assignments_path)
+
+    def remove(self) -> None:
+        """Supprime l'index (retour à la recherche exacte)"""
+        for path in (self.centroids_path, self.assignments_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.centroids = None
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Lignes des `nprobe` listes les plus proches d'une requête"""
+        nprobe = min(nprobe, self.nlist)
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        alive: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        nprobe: int = IVF_NPROBE
+    ) -> list:
+        """
+        Recherche approchée des k plus proches voisins
+
+        Args:
+            matrix: Vecteurs du stockage
+            alive: Masque des lignes utilisables (non supprimées, conformes au filtre)
+            queries: Vecteurs de requête normalisés
+            k: Nombre de voisins
+            nprobe: Nombre de listes parcourues par requête
+
+        Returns:
+            Pour chaque requête : (ligne, similarité cosinus), par similarité décroissante
+        """
+        results = []
+        for query in queries:
+            rows = self.candidates(query, nprobe)
+            rows = np.sort(rows[alive[rows]])
+            if not len(rows):
+                results.append([])
+                continue
+            scores = np.asarray(matrix[rows], dtype=np.float32) @ query
+            top = min(k, len(rows))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            results.append([(int(rows[i]), float(scores[i])) for i in best])
+        return results
+
+    def stats(self) -> Tuple[int, float]:
+        """Nombre de listes et taille moyenne d'une liste"""
+        sizes = np.diff(self.offsets)
+        return self.nlist, float(sizes.mean()) if len(sizes) else 0.0
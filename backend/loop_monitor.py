@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de détection des blocages de la boucle d'événements pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Mesurer en continu la latence de la boucle d'événements asyncio
+- Détecter les callbacks qui bloquent la boucle au-delà d'un seuil
+- Capturer la pile fautive et l'attribuer à l'endpoint qui l'a provoquée
+- Agréger des compteurs par endpoint pour prioriser les appels bloquants
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-loop-monitor")
+
+# Paramètres du chien de garde (en millisecondes)
+LOOP_WATCHDOG_ENABLED = os.environ.get("LOOP_WATCHDOG_ENABLED", "1") == "1"
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_WATCHDOG_INTERVAL_MS = float(os.environ.get("LOOP_WATCHDOG_INTERVAL_MS", "20"))
+
+# Nombre d'épisodes de blocage conservés avec leur pile
+MAX_RECENT_BLOCKS = 50
+# Nombre de piles distinctes conservées par endpoint
+MAX_STACKS_PER_ENDPOINT = 10
+
+# Libellé utilisé quand aucun endpoint n'apparaît dans la pile bloquante
+UNKNOWN_ENDPOINT = "<hors requête>"
+
+
+class LoopWatchdog:
+    """
+    Chien de garde de la boucle d'événements
+
+    Une tâche asyncio émet un battement à intervalle régulier. Un thread
+    séparé vérifie ce battement : s'il n'a pas été mis à jour depuis plus
+    que le seuil, la boucle est bloquée et la pile du thread de la boucle
+    est capturée. L'endpoint responsable est retrouvé en cherchant dans la
+    pile la fonction d'un endpoint FastAPI enregistré.
+    """
+
+    def __init__(self, threshold: float = LOOP_BLOCK_THRESHOLD_MS / 1000,
+                 interval: float = LOOP_WATCHDOG_INTERVAL_MS / 1000):
+        self.threshold = threshold
+        self.interval = interval
+        self.endpoints = {}
+        self.recent_blocks = deque(maxlen=MAX_RECENT_BLOCKS)
+        self.by_endpoint: Dict[str, Dict[str, Any]] = {}
+        self.lag_max = 0.0
+        self.lag_total = 0.0
+        self.beats = 0
+        self._lock = threading.Lock()
+        self._loop_thread_id = None
+        self._last_beat = None
+        self._pending = None
+        self._task = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def register_endpoints(self, routes) -> None:
+        """
+        Indexe les fonctions des endpoints pour attribuer les blocages
+
+        Args:
+            routes: Routes de l'application FastAPI (`app.routes`)
+        """
+        for route in routes:
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is None:
+                continue
+            methods = ",".join(sorted(getattr(route, "methods", None) or []))
+            self.endpoints[code] = f"{methods} {route.path}".strip()
+
+    def start(self, routes=None) -> None:
+        """Démarre le battement et le thread de surveillance (à appeler depuis la boucle)"""
+        if self._task is not None:
+            return
+        if routes is not None:
+            self.register_endpoints(routes)
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="turbochat-loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Surveillance de la boucle démarrée (seuil {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Arrête la surveillance"""
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+
+            with self._lock:
+                self._last_beat = now
+                self.beats += 1
+                self.lag_total += lag
+                self.lag_max = max(self.lag_max, lag)
+                pending, self._pending = self._pending, None
+
+            if pending is not None:
+                # Le blocage est terminé : la latence mesurée donne sa durée réelle
+                pending["duration"] = round(lag + self.interval, 4)
+                self._record(pending)
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                last_beat = self._last_beat
+                already_captured = self._pending is not None
+
+            blocked_for = time.monotonic() - last_beat
+            if blocked_for < self.threshold or already_captured:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            endpoint = None
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_filename}:{frame.f_lineno} {frame.f_code.co_name}")
+                if endpoint is None:
+                    endpoint = self.endpoints.get(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+
+            with self._lock:
+                # Le battement a pu reprendre pendant la capture
+                if self._last_beat == last_beat:
+                    self._pending = {
+                        "endpoint": endpoint or UNKNOWN_ENDPOINT,
+                        "detected_at": datetime.now().isoformat(),
+                        "stack": stack
+                    }
+
+    def _record(self, block: Dict[str, Any]) -> None:
+        endpoint = block["endpoint"]
+        # Pile réduite aux frames les plus proches du point bloquant
+        stack_key = " <- ".join(reversed(block["stack"][-8:]))
+
+        with self._lock:
+            stats = self.by_endpoint.setdefault(endpoint, {
+                "count": 0,
+                "total_blocked": 0.0,
+                "max_blocked": 0.0,
+                "stacks": Counter()
+            })
+            stats["count"] += 1
+            stats["total_blocked"] += block["duration"]
+            stats["max_blocked"] = max(stats["max_blocked"], block["duration"])
+            if stack_key in stats["stacks"] or len(stats["stacks"]) < MAX_STACKS_PER_ENDPOINT:
+                stats["stacks"][stack_key] += 1
+            self.recent_blocks.append(block)
+
+        logger.warning(f"Boucle bloquée {block['duration'] * 1000:.0f} ms par {endpoint}: {block['stack'][-1]}")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Compteurs de blocage par endpoint, triés par temps bloqué total
+
+        Returns:
+            Statistiques de latence et compteurs par endpoint
+        """
+        with self._lock:
+            endpoints = sorted(
+                ({
+                    "endpoint": endpoint,
+                    "count": stats["count"],
+                    "total_blocked": round(stats["total_blocked"], 4),
+                    "max_blocked": round(stats["max_blocked"], 4),
+                    "top_stack": stats["stacks"].most_common(1)[0][0] if stats["stacks"] else None
+                } for endpoint, stats in self.by_endpoint.items()),
+                key=lambda entry: entry["total_blocked"],
+                reverse=True
+            )
+            return {
+                "enabled": self._task is not None,
+                "threshold_ms": self.threshold * 1000,
+                "lag_avg": round(self.lag_total / self.beats, 4) if self.beats else 0.0,
+                "lag_max": round(self.lag_max, 4),
+                "blocks_total": sum(entry["count"] for entry in endpoints),
+                "blocks_by_endpoint": endpoints
+            }
+
+    def recent(self, limit: int = MAX_RECENT_BLOCKS) -> List[Dict[str, Any]]:
+        """Renvoie les derniers épisodes de blocage avec leur pile complète"""
+        with self._lock:
+            return list(self.recent_blocks)[-limit:]
+
+    def reset(self) -> None:
+        """Remet les compteurs à zéro"""
+        with self._lock:
+            self.by_endpoint.clear()
+            self.recent_blocks.clear()
+            self.lag_max = 0.0
+            self.lag_total = 0.0
+            self.beats = 0
+
+
+# Instance globale du chien de garde
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de diversification des résultats pour TurboChat
+
+Ce module fournit une sélection par pertinence marginale maximale (MMR) :
+les chunks sont choisis un à un en favorisant ceux qui sont pertinents
+mais peu similaires aux chunks déjà retenus (passages qui se recouvrent,
+copies d'un même paragraphe), par opérations matricielles NumPy.
+"""
+
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+# Candidats de la recherche parmi lesquels la sélection est faite
+MMR_CANDIDATES = int(os.environ.get("MMR_CANDIDATES", "20"))
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Sélectionne k candidats par pertinence marginale maximale
+
+    À chaque étape, le candidat retenu maximise
+    lambda * pertinence - (1 - lambda) * similarité maximale avec les candidats déjà retenus.
+
+    Args:
+        relevance: Pertinence de chaque candidat (ramenée entre 0 et 1 en interne)
+        embeddings: Vecteurs des candidats (une ligne par candidat)
+        k: Nombre de candidats à retenir
+        lambda_mult: 1 : pertinence seule ; 0 : diversité seule
+
+    Returns:
+        Indices des candidats retenus, dans l'ordre de sélection
+    """
+    if not 0.0 <= lambda_mult <= 1.0:
+        raise ValueError("mmr_lambda doit être compris entre 0 et 1")
+    count = len(relevance)
+    k = min(k, count)
+    if k == 0:
+        return []
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(count, dtype=np.float32)
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    # Similarités cosinus de tous les couples de candidats, en un seul produit
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    # Similarité maximale de chaque candidat avec les candidats retenus
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(count, dtype=bool)
+    available[selected[0]] = False
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+if __name__ == "__main__":
+    # Banc d'essai : python mmr.py [candidats] [dimension] [k]
+    candidates = int(sys.argv[1]) if len(sys.argv) > 1 else MMR_CANDIDATES
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((candidates, dimension)).astype(np.float32)
+    relevance = np.sort(rng.random(candidates))[::-1]
+    runs = 1000
+    start_time = time.perf_counter()
+    for _ in range(runs):
+        maximal_marginal_relevance(relevance, embeddings, k)
+    print(f"{candidates} candidats, dimension {dimension}, k={k}: {(time.perf_counter() - start_time) / runs * 1000:.3f} ms")
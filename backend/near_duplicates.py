@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de détection des chunks quasi identiques pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Calculer la signature MinHash d'un chunk (triplets de mots)
+- Retrouver en temps quasi constant les chunks proches grâce à un index LSH par collection
+- Écarter à l'indexation les chunks quasi identiques (en-têtes, pieds de page,
+  mentions légales, modèles d'exercices répétés à chaque page)
+- Garder les chunks écartés avec le chunk conservé, pour les restaurer si
+  le document de ce dernier est supprimé
+- Mesurer la place gagnée dans l'index
+"""
+
+import os
+import re
+import json
+import zlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-near-duplicates")
+
+# Détection activée par défaut
+NEAR_DUPLICATE_ENABLED = os.environ.get("NEAR_DUPLICATE_ENABLED", "1") == "1"
+# Similarité de Jaccard (estimée) à partir de laquelle deux chunks sont quasi identiques
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Nombre de permutations MinHash et de bandes LSH (NUM_PERM doit être un multiple de BANDS)
+NEAR_DUPLICATE_NUM_PERM = int(os.environ.get("NEAR_DUPLICATE_NUM_PERM", "64"))
+NEAR_DUPLICATE_BANDS = int(os.environ.get("NEAR_DUPLICATE_BANDS", "8"))
+# Requêtes chronométrées pour mesurer le temps de recherche BM25 gagné (0 : pas de mesure)
+NEAR_DUPLICATE_MEASURE_QUERIES = int(os.environ.get("NEAR_DUPLICATE_MEASURE_QUERIES", "20"))
+
+# Nombre de mots par shingle
+SHINGLE_SIZE = 3
+# Premier supérieur à 2^32 : les produits a * h restent sur 64 bits
+_MERSENNE_PRIME = np.uint64(4294967311)
+_WORD = re.compile(r"\w+")
+
+
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Graine fixe : les signatures enregistrées restent comparables d'un démarrage à l'autre
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """Empreintes 32 bits des triplets de mots consécutifs d'un texte"""
+    words = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) for word in _WORD.findall(text.lower())),
+        dtype=np.uint64
+    )
+    if len(words) < SHINGLE_SIZE:
+        return words if len(words) else np.zeros(1, dtype=np.uint64)
+    # Combinaison des empreintes de mots : un seul appel crc32 par mot
+    hashes = np.zeros(len(words) - SHINGLE_SIZE + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(0x01000193) + words[offset:len(words) - SHINGLE_SIZE + 1 + offset]
+    return hashes & np.uint64(0xFFFFFFFF)
+
+
+def minhash_signatures(texts: List[str], num_perm: int = NEAR_DUPLICATE_NUM_PERM) -> np.ndarray:
+    """
+    Calcule les signatures MinHash de plusieurs textes
+
+    Args:
+        texts: Textes des chunks
+        num_perm: Nombre de permutations
+
+    Returns:
+        Matrice (len(texts), num_perm) de signatures uint32
+    """
+    if not texts:
+        return np.zeros((0, num_perm), dtype=np.uint32)
+    a, b = _permutations(num_perm)
+    shingles = [_shingle_hashes(text) for text in texts]
+    offsets = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+    hashed = (a[:, None] * np.concatenate(shingles)[None, :] + b[:, None]) % _MERSENNE_PRIME
+    return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """
+    Index LSH des signatures MinHash des chunks d'une collection
+
+    Chaque signature est découpée en bandes ; deux chunks qui partagent
+    une bande sont candidats, et sont déclarés quasi identiques si la
+    part de leurs valeurs MinHash communes atteint le seuil. L'index est
+    conservé dans `indices/<collection>/near_duplicates.npz`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        num_perm: int = NEAR_DUPLICATE_NUM_PERM,
+        bands: int = NEAR_DUPLICATE_BANDS
+    ):
+        if num_perm % bands:
+            raise ValueError("NEAR_DUPLICATE_NUM_PERM doit être un multiple de NEAR_DUPLICATE_BANDS")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        self.signatures: List[np.ndarray] = []
+        self.document_ids: List[Optional[str]] = []
+        # Nombre de chunks écartés au profit de chaque chunk indexé
+        self.merged: List[int] = []
+        # Chunks écartés au profit de chaque chunk indexé (document, texte, métadonnées)
+        self.dropped: List[List[Dict[str, Any]]] = []
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.counters = {"chunks_seen": 0, "chunks_dropped": 0, "bytes_dropped": 0}
+
+        try:
+            data = np.load(path)
+        except FileNotFoundError:
+            return
+        if data["signatures"].shape[1] != num_perm:
+            logger.warning(f"Index {path} créé avec un autre nombre de permutations, reconstruit")
+            return
+        self.counters.update(zip(("chunks_seen", "chunks_dropped", "bytes_dropped"), data["counters"].tolist()))
+        # Index antérieurs à la conservation des chunks écartés : rien à restaurer
+        dropped = data["dropped"].tolist() if "dropped" in data.files else ["[]"] * len(data["signatures"])
+        for signature, document_id, merged, records in zip(
+            data["signatures"], data["document_ids"].tolist(), data["merged"].tolist(), dropped
+        ):
+            self._insert(signature, document_id, merged, json.loads(records))
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _insert(
+        self,
+        signature: np.ndarray,
+        document_id: str,
+        merged: int = 0,
+        dropped: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        entry = len(self.signatures)
+        self.signatures.append(signature)
+        self.document_ids.append(document_id)
+        self.merged.append(merged)
+        self.dropped.append(dropped or [])
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(entry)
+        return entry
+
+    def _find(self, signature: np.ndarray, exclude: Iterable[str]) -> Optional[int]:
+        """Renvoie un chunk indexé quasi identique à cette signature"""
+        checked = set()
+        for key in self._band_keys(signature):
+            for entry in self.buckets.get(key, ()):
+                if entry in checked:
+                    continue
+                checked.add(entry)
+                document_id = self.document_ids[entry]
+                if document_id is None or document_id in exclude:
+                    continue
+                if np.count_nonzero(self.signatures[entry] == signature) >= self.threshold * self.num_perm:
+                    return entry
+        return None
+
+    def filter_chunks(
+        self,
+        document_id: str,
+        chunks: List[Document],
+        exclude_document_ids: Iterable[str] = (),
+        restoring: bool = False
+    ) -> Tuple[List[Document], List[Document]]:
+        """
+        Écarte les chunks quasi identiques à un chunk déjà indexé
+
+        Les chunks conservés sont ajoutés à l'index : un chunk répété
+        plusieurs fois dans le même document n'est gardé qu'une fois.
+        Chaque chunk écarté est gardé avec le chunk conservé auquel il
+        ressemble, pour être restauré si ce dernier disparaît (voir
+        `remove_documents`). En cas d'échec de l'indexation, l'appelant
+        retire le document avec `remove_documents`.
+
+        Args:
+            document_id: Identifiant du document en cours d'indexation
+            chunks: Chunks du document
+            exclude_document_ids: Documents dont les chunks ne comptent pas
+                (ex: version précédente d'un document sur le point d'être remplacée)
+            restoring: Chunks écartés auparavant, à restaurer : déjà comptés,
+                seuls ceux qui sont conservés sont retirés des chunks écartés
+
+        Returns:
+            Chunks conservés et chunks écartés
+        """
+        exclude = set(exclude_document_ids)
+        signatures = minhash_signatures([chunk.page_content for chunk in chunks], self.num_perm)
+        kept, dropped = [], []
+        with self._lock:
+            for chunk, signature in zip(chunks, signatures):
+                match = self._find(signature, exclude)
+                if match is None:
+                    self._insert(signature, document_id)
+                    kept.append(chunk)
+                else:
+                    self.merged[match] += 1
+                    self.dropped[match].append({
+                        "document_id": document_id,
+                        "content": chunk.page_content,
+                        "metadata": chunk.metadata
+                    })
+                    dropped.append(chunk)
+            if restoring:
+                self.counters["chunks_dropped"] -= len(kept)
+                self.counters["bytes_dropped"] -= sum(len(chunk.page_content.encode("utf-8")) for chunk in kept)
+            else:
+                self.counters["chunks_seen"] += len(chunks)
+                self.counters["chunks_dropped"] += len(dropped)
+                self.counters["bytes_dropped"] += sum(len(chunk.page_content.encode("utf-8")) for chunk in dropped)
+            self._dirty = True
+        return kept, dropped
+
+    def remove_documents(self, document_ids: Iterable[str]) -> List[Document]:
+        """
+        Retire de l'index les chunks de documents supprimés
+
+        Les chunks des autres documents qui avaient été écartés au profit
+        d'un chunk retiré n'ont plus de copie dans la collection : ils
+        sont renvoyés pour être indexés à nouveau (ils repassent alors
+        par `filter_chunks`).
+
+        Returns:
+            Chunks écartés à restaurer, avec leur `document_id` en métadonnée
+        """
+        document_ids = set(document_ids)
+        orphans = []
+        with self._lock:
+            for entry, document_id in enumerate(self.document_ids):
+                if document_id is None:
+                    continue
+                records = [record for record in self.dropped[entry] if record["document_id"] not in document_ids]
+                if document_id in document_ids:
+                    # L'entrée reste dans les seaux mais n'est plus jamais renvoyée
+                    self.document_ids[entry] = None
+                    self.merged[entry] = 0
+                    self.dropped[entry] = []
+                    orphans.extend(records)
+                    self._dirty = True
+                elif len(records) != len(self.dropped[entry]):
+                    self.merged[entry] -= len(self.dropped[entry]) - len(records)
+                    self.dropped[entry] = records
+                    self._dirty = True
+        return [
+            Document(page_content=record["content"], metadata={**record["metadata"], "document_id": record["document_id"]})
+            for record in orphans
+        ]
+
+    def dropped_texts(self) -> List[str]:
+        """Textes des chunks écartés dont le chunk conservé est toujours indexé"""
+        with self._lock:
+            return [
+                record["content"]
+                for document_id, records in zip(self.document_ids, self.dropped)
+                if document_id is not None
+                for record in records
+            ]
+
+    def flush(self) -> None:
+        """Écrit l'index sur disque s'il a changé (les entrées retirées ne sont pas conservées)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            alive = [entry for entry, document_id in enumerate(self.document_ids) if document_id is not None]
+            signatures = (
+                np.stack([self.signatures[entry] for entry in alive])
+                if alive else np.zeros((0, self.num_perm), dtype=np.uint32)
+            )
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    signatures=signatures,
+                    document_ids=np.array([self.document_ids[entry] for entry in alive], dtype=str),
+                    merged=np.array([self.merged[entry] for entry in alive], dtype=np.int64),
+                    dropped=np.array(
+                        [json.dumps(self.dropped[entry], ensure_ascii=False, default=str) for entry in alive], dtype=str
+                    ),
+                    counters=np.array([self.counters[name] for name in ("chunks_seen", "chunks_dropped", "bytes_dropped")], dtype=np.int64)
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Place gagnée par l'élimination des chunks quasi identiques
+
+        Returns:
+            Chunks examinés, écartés et indexés, octets de texte non
+            indexés et part de l'index économisée
+        """
+        with self._lock:
+            seen = self.counters["chunks_seen"]
+            return {
+                "threshold": self.threshold,
+                "chunks_seen": seen,
+                "chunks_dropped": self.counters["chunks_dropped"],
+                "chunks_indexed": sum(document_id is not None for document_id in self.document_ids),
+                "bytes_dropped": self.counters["bytes_dropped"],
+                "index_reduction": round(self.counters["chunks_dropped"] / seen, 4) if seen else 0.0
+            }
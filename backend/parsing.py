@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module d'analyse des documents pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Choisir le chargeur adapté au format d'un fichier
+- Répartir l'analyse des PDF par plages de pages dans un pool de processus
+- Analyser plusieurs fichiers en parallèle
+- Restituer les pages dans l'ordre du document
+"""
+
+import os
+import math
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-parsing")
+
+# Nombre de processus d'analyse (0 : analyse dans le thread appelant)
+PARSING_WORKERS = int(os.environ.get("PARSING_WORKERS", str(os.cpu_count() or 1)))
+# Taille minimale d'une plage de pages confiée à un processus
+PARSING_MIN_PAGES_PER_TASK = int(os.environ.get("PARSING_MIN_PAGES_PER_TASK", "4"))
+
+# Une tâche d'analyse : (chemin, première page, page de fin exclue) ;
+# les bornes sont None pour un fichier analysé d'un seul tenant
+ParseTask = Tuple[str, Optional[int], Optional[int]]
+
+
+def get_loader_for_file(file_path: str) -> Any:
+    """
+    Renvoie le chargeur approprié en fonction de l'extension du fichier
+
+    Args:
+        file_path: Chemin vers le fichier à charger
+
+    Returns:
+        Un chargeur Langchain pour le type de fichier spécifié
+    """
+    from langchain.document_loaders import (
+        PyPDFLoader,
+        TextLoader,
+        UnstructuredMarkdownLoader,
+        UnstructuredHTMLLoader,
+        CSVLoader,
+        Docx2txtLoader
+    )
+
+    ext = file_path.split('.')[-1].lower()
+
+    if ext == 'pdf':
+        return PyPDFLoader(file_path)
+    elif ext == 'txt':
+        return TextLoader(file_path)
+    elif ext in ['md', 'markdown']:
+        return UnstructuredMarkdownLoader(file_path)
+    elif ext in ['html', 'htm']:
+        return UnstructuredHTMLLoader(file_path)
+    elif ext == 'csv':
+        return CSVLoader(file_path)
+    elif ext in ['doc', 'docx']:
+        return Docx2txtLoader(file_path)
+    else:
+        # Format non supporté, on tente avec TextLoader
+        logger.warning(f"Format de fichier non reconnu: {ext}. Tentative avec TextLoader.")
+        return TextLoader(file_path)
+
+
+def _parse_task(file_path: str, start: Optional[int], end: Optional[int]) -> List[Document]:
+    """
+    Analyse une plage de pages d'un PDF, ou un fichier entier (exécuté dans un processus du pool)
+    """
+    if start is None:
+        return get_loader_for_file(file_path).load()
+
+    # Même extraction et mêmes métadonnées que PyPDFLoader
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [
+        Document(page_content=reader.pages[page].extract_text(), metadata={"source": file_path, "page": page})
+        for page in range(start, end)
+    ]
+
+
+def plan_tasks(file_path: str, workers: int = PARSING_WORKERS) -> List[ParseTask]:
+    """
+    Découpe l'analyse d'un fichier en tâches indépendantes
+
+    Un PDF est découpé en plages de pages contiguës, assez nombreuses
+    pour équilibrer la charge entre les processus ; les autres formats
+    forment une seule tâche.
+
+    Args:
+        file_path: Chemin du fichier
+        workers: Nombre de processus disponibles
+
+    Returns:
+        Tâches d'analyse, dans l'ordre du document
+    """
+    if workers < 2 or file_path.split('.')[-1].lower() != 'pdf':
+        return [(file_path, None, None)]
+
+    from pypdf import PdfReader
+    page_count = len(PdfReader(file_path).pages)
+    pages_per_task = max(PARSING_MIN_PAGES_PER_TASK, math.ceil(page_count / (workers * 4)))
+    return [
+        (file_path, start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ] or [(file_path, None, None)]
+
+
+class DocumentParser:
+    """
+    Analyse des documents dans un pool de processus
+
+    Les processus sont démarrés par "spawn" : les threads des workers
+    d'indexation et des moteurs d'embedding ne sont pas dupliqués.
+    """
+
+    def __init__(self, workers: int = PARSING_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                    logger.info(f"Pool d'analyse démarré avec {self.workers} processus")
+        return self._pool
+
+    def parse_files(
+        self,
+        file_paths: List[str],
+        progress: Optional[Callable[..., None]] = None
+    ) -> List[List[Document]]:
+        """
+        Analyse plusieurs fichiers en répartissant toutes leurs pages sur le pool
+
+        Args:
+            file_paths: Chemins des fichiers
+            progress: Fonction appelée avec le compteur `pages_parsed`
+                à chaque plage terminée
+
+        Returns:
+            Pages de chaque fichier, dans l'ordre des fichiers et des pages
+        """
+        owners = []
+        tasks = []
+        for index, file_path in enumerate(file_paths):
+            file_tasks = plan_tasks(file_path, self.workers)
+            owners.extend([index] * len(file_tasks))
+            tasks.extend(file_tasks)
+        results: List[Optional[List[Document]]] = [None] * len(tasks)
+        pages_parsed = 0
+
+        if self.workers < 1 or len(tasks) == 1:
+            # Pas de parallélisme possible : on évite le coût d'un aller-retour vers le pool
+            for i, task in enumerate(tasks):
+                results[i] = _parse_task(*task)
+                pages_parsed += len(results[i])
+                if progress is not None:
+                    progress(pages_parsed=pages_parsed)
+        else:
+            futures = {self.pool.submit(_parse_task, *task): i for i, task in enumerate(tasks)}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    pages_parsed += len(results[futures[future]])
+                    if progress is not None:
+                        progress(pages_parsed=pages_parsed)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        # Regroupement des plages par fichier, dans l'ordre des pages
+        documents = [[] for _ in file_paths]
+        for index, pages in zip(owners, results):
+            documents[index].extend(pages)
+        return documents
+
+    def parse_file(self, file_path: str, progress: Optional[Callable[..., None]] = None) -> List[Document]:
+        """
+        Analyse un fichier, en parallèle par plages de pages pour un PDF
+
+        Args:
+            file_path: Chemin du fichier
+            progress: Fonction appelée avec le compteur `pages_parsed`
+
+        Returns:
+            Pages ou sections du document, dans l'ordre
+        """
+        return self.parse_files([file_path], progress)[0]
+
+    def shutdown(self) -> None:
+        """Arrête les processus d'analyse"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+# Instance globale de l'analyseur
+document_parser = DocumentParser()
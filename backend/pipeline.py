@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module d'indexation en masse pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Indexer une archive zip ou un lot de fichiers en une seule tâche
+- Extraire les membres d'une archive un par un, au rythme de l'indexation
+- Ignorer les documents dont le contenu est déjà indexé dans la collection
+- Enchaîner les étapes extraction → analyse → découpage → encodage → écriture,
+  reliées par des files bornées et exécutées simultanément
+- Écrire les chunks dans ChromaDB par gros lots
+"""
+
+import os
+import uuid
+import queue
+import logging
+import zipfile
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from rag import INGEST_BATCH_SIZE, IngestionCancelled, RAGSystem
+from parsing import document_parser
+from document_registry import copy_and_hash, hash_file
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-pipeline")
+
+# Nombre d'éléments en attente entre deux étapes : borne la mémoire et
+# le nombre de fichiers extraits mais pas encore analysés
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "4"))
+# Nombre de fichiers analysés simultanément (chacun réparti sur le pool de processus)
+PIPELINE_PARSE_THREADS = int(os.environ.get("PIPELINE_PARSE_THREADS", "2"))
+# Nombre de chunks par écriture dans ChromaDB
+BULK_WRITE_BATCH = int(os.environ.get("BULK_WRITE_BATCH", "2000"))
+
+# Extensions indexées lors de l'extraction d'une archive
+SUPPORTED_EXTENSIONS = {"pdf", "txt", "md", "markdown", "html", "htm", "csv", "doc", "docx"}
+
+# Marque de fin de flux entre deux étapes
+_END = object()
+
+
+def iter_archive(archive_path: str, target_dir: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Extrait les documents d'une archive zip un par un
+
+    Chaque membre n'est extrait qu'au moment où l'étape suivante le
+    réclame, et son empreinte est calculée pendant l'extraction. Les
+    membres non supportés et les chemins sortant du répertoire cible
+    sont ignorés.
+
+    Args:
+        archive_path: Chemin de l'archive
+        target_dir: Répertoire d'extraction
+
+    Yields:
+        (chemin extrait, nom du document, empreinte du contenu) pour chaque document
+    """
+    target_dir = os.path.abspath(target_dir)
+    stem = os.path.splitext(os.path.basename(archive_path))[0]
+    with zipfile.ZipFile(archive_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or os.path.basename(member.filename).startswith("."):
+                continue
+            if "__MACOSX" in member.filename.split("/"):
+                continue
+            if member.filename.rsplit(".", 1)[-1].lower() not in SUPPORTED_EXTENSIONS:
+                logger.info(f"Membre ignoré (format non supporté): {member.filename}")
+                continue
+
+            path = os.path.abspath(os.path.join(target_dir, member.filename))
+            if not path.startswith(target_dir + os.sep):
+                logger.warning(f"Membre ignoré (chemin hors de l'archive): {member.filename}")
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with archive.open(member) as src, open(path, "wb") as dst:
+                content_hash = copy_and_hash(src, dst)
+            # Le nom inclut l'archive : une nouvelle version de l'archive remplace ses documents
+            yield path, f"{stem}/{member.filename}", content_hash
+
+
+def iter_sources(
+    paths: List[str],
+    content_hashes: Optional[Dict[str, str]] = None,
+    filenames: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, str, str]]:
+    """
+    Énumère les documents d'un lot, en développant les archives zip
+
+    Args:
+        paths: Fichiers téléversés (documents ou archives)
+        content_hashes: Empreintes déjà calculées, par chemin
+        filenames: Noms des documents, par chemin (par défaut, le nom du fichier)
+
+    Yields:
+        (chemin, nom du document, empreinte du contenu) pour chaque document
+    """
+    content_hashes = content_hashes or {}
+    filenames = filenames or {}
+    for path in paths:
+        if zipfile.is_zipfile(path) and not path.lower().endswith(".docx"):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            yield from iter_archive(path, os.path.join(os.path.dirname(path), stem))
+        else:
+            yield path, filenames.get(path) or os.path.basename(path), content_hashes.get(path) or hash_file(path)
+
+
+class BulkIngestionPipeline:
+    """
+    Graphe d'étapes d'indexation reliées par des files bornées
+
+    Chaque étape tourne dans son propre thread (plusieurs pour l'analyse) :
+    pendant qu'un fichier est encodé, le suivant est analysé et l'archive
+    continue d'être extraite. Une file pleine ralentit l'étape amont, ce
+    qui garde la mémoire constante quelle que soit la taille du lot.
+
+    En cas d'annulation ou d'erreur d'écriture, les chunks déjà écrits
+    sont retirés. Un fichier illisible est ignoré et signalé sans
+    interrompre le lot, de même qu'un contenu déjà indexé. Les chunks
+    quasi identiques à des chunks déjà indexés sont écartés au découpage.
+    Les documents
+    ne sont enregistrés dans le registre de la collection (et leurs
+    versions précédentes retirées) qu'une fois tout le lot écrit.
+    """
+
+    def __init__(
+        self,
+        rag: RAGSystem,
+        collection_name: str,
+        progress: Optional[Callable[..., None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        parse_threads: int = PIPELINE_PARSE_THREADS,
+        write_batch: int = BULK_WRITE_BATCH,
+        replace_previous: bool = True,
+        exclude_document_ids: Optional[List[str]] = None
+    ):
+        self.rag = rag
+        self.collection_name = collection_name
+        self.progress = progress
+        self.should_cancel = should_cancel
+        self.parse_threads = max(1, parse_threads)
+        # Retirer la version précédente d'un document de même nom une fois le lot écrit
+        self.replace_previous = replace_previous
+        # Documents ignorés pour la détection des quasi-doublons (sur le point d'être retirés)
+        self.exclude_document_ids = list(exclude_document_ids or [])
+        # ChromaDB limite le nombre d'éléments par écriture
+        self.write_batch = min(write_batch, getattr(rag.chroma_client, "max_batch_size", write_batch))
+
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.split_queue = queue.Queue(maxsize=queue_size)
+        self.embed_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+
+        self.counters = {
+            "files_total": 0,
+            "files_parsed": 0,
+            "files_skipped": 0,
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_dropped": 0,
+            "chunks_embedded": 0,
+            "chunks_written": 0
+        }
+        self.documents: List[Dict[str, Any]] = []
+        self.failed_files: List[Dict[str, str]] = []
+        self.written_ids: List[str] = []
+        self.registry = rag.document_registry(collection_name)
+        self.claimed_hashes: List[str] = []
+        self._parse_threads_left = self.parse_threads
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+            snapshot = {name: self.counters[name] for name in deltas}
+        if self.progress is not None:
+            self.progress(**snapshot)
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise IngestionCancelled("Pipeline interrompu")
+
+    def _get(self, q: queue.Queue) -> Any:
+        while True:
+            if self.should_cancel is not None and self.should_cancel():
+                self._stop.set()
+            if self._stop.is_set():
+                raise IngestionCancelled("Pipeline interrompu")
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _run_stage(self, name: str, fn: Callable[[], None]) -> None:
+        try:
+            fn()
+        except IngestionCancelled:
+            self._stop.set()
+        except BaseException as e:
+            logger.error(f"Étape {name} en échec: {e}")
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop.set()
+
+    # Étapes
+
+    def _extract(
+        self,
+        paths: List[str],
+        content_hashes: Optional[Dict[str, str]],
+        filenames: Optional[Dict[str, str]]
+    ) -> None:
+        for source in iter_sources(paths, content_hashes, filenames):
+            self._count(files_total=1)
+            self._put(self.parse_queue, source)
+        self._put(self.parse_queue, _END)
+
+    def _parse(self) -> None:
+        while True:
+            source = self._get(self.parse_queue)
+            if source is _END:
+                # Les autres threads d'analyse doivent aussi voir la fin du flux
+                self._put(self.parse_queue, _END)
+                with self._lock:
+                    self._parse_threads_left -= 1
+                    last = self._parse_threads_left == 0
+                if last:
+                    self._put(self.split_queue, _END)
+                return
+
+            path, filename, content_hash = source
+            if not self.registry.claim(content_hash):
+                logger.info(f"Document {filename} déjà indexé, ignoré")
+                self._count(files_skipped=1)
+                continue
+            with self._lock:
+                self.claimed_hashes.append(content_hash)
+
+            try:
+                pages = document_parser.parse_file(path)
+            except Exception as e:
+                logger.error(f"Analyse impossible de {filename}: {e}")
+                with self._lock:
+                    self.failed_files.append({"file": filename, "error": str(e)})
+                continue
+            self._count(files_parsed=1, pages_parsed=len(pages))
+            self._put(self.split_queue, (source, pages))
+
+    def _split(self) -> None:
+        while True:
+            item = self._get(self.split_queue)
+            if item is _END:
+                self._put(self.embed_queue, _END)
+                return
+
+            (path, filename, content_hash), pages = item
+            document_id = str(uuid.uuid4())
+            chunks = self.rag.get_chunker(self.collection_name).split_documents(pages)
+            for chunk in chunks:
+                chunk.metadata["document_id"] = document_id
+                chunk.metadata["content_hash"] = content_hash
+
+            exclude = list(self.exclude_document_ids)
+            previous = self.registry.get_by_filename(filename) if self.replace_previous else None
+            if previous is not None and previous["content_hash"] != content_hash:
+                exclude.append(previous["document_id"])
+            chunks, dropped = self.rag.drop_near_duplicates(self.collection_name, document_id, chunks, exclude)
+
+            self.documents.append({
+                "id": document_id,
+                "filename": filename,
+                "source": path,
+                "content_hash": content_hash,
+                "chunks": len(chunks)
+            })
+            self._count(chunks_total=len(chunks), chunks_dropped=len(dropped))
+
+            for start in range(0, len(chunks), INGEST_BATCH_SIZE):
+                self._put(self.embed_queue, chunks[start:start + INGEST_BATCH_SIZE])
+
+    def _embed(self) -> None:
+        engine = self.rag._get_vectorstore(self.collection_name).embeddings
+        while True:
+            chunks = self._get(self.embed_queue)
+            if chunks is _END:
+                self._put(self.write_queue, _END)
+                return
+
+            embeddings = engine.embed_documents([chunk.page_content for chunk in chunks])
+            self._count(chunks_embedded=len(chunks))
+            self._put(self.write_queue, (chunks, embeddings))
+
+    def _write(self) -> None:
+        pending_chunks, pending_embeddings = [], []
+
+        def flush(count: int) -> None:
+            ids = [str(uuid.uuid4()) for _ in range(count)]
+            self.rag.write_chunks(self.collection_name, ids, pending_embeddings[:count], pending_chunks[:count])
+            self.written_ids.extend(ids)
+            self._count(chunks_written=count)
+            del pending_chunks[:count]
+            del pending_embeddings[:count]
+
+        while True:
+            item = self._get(self.write_queue)
+            if item is _END:
+                if pending_chunks:
+                    flush(len(pending_chunks))
+                return
+
+            chunks, embeddings = item
+            pending_chunks.extend(chunks)
+            pending_embeddings.extend(embeddings)
+            while len(pending_chunks) >= self.write_batch:
+                flush(self.write_batch)
+
+    def _register_documents(self) -> List[str]:
+        """Enregistre les documents indexés et retire leurs versions précédentes"""
+        replaced_ids = []
+        replaced_documents = self.registry.register_many(
+            [
+                {
+                    "content_hash": document["content_hash"],
+                    "document_id": document["id"],
+                    "filename": document["filename"],
+                    "source": document["source"],
+                    "chunks": document["chunks"]
+                }
+                for document in self.documents
+            ],
+            replace=self.replace_previous
+        )
+        for replaced in replaced_documents:
+            if replaced is not None:
+                self.rag.remove_replaced_document(self.collection_name, replaced)
+                replaced_ids.append(replaced["document_id"])
+        self.rag.flush_near_duplicates(self.collection_name)
+        self.rag.update_collection_stats(self.collection_name)
+        # Les fichiers illisibles ne sont pas indexés : leur empreinte est libérée
+        for content_hash in self.claimed_hashes:
+            self.registry.release(content_hash)
+        return replaced_ids
+
+    def run(
+        self,
+        paths: List[str],
+        content_hashes: Optional[Dict[str, str]] = None,
+        filenames: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Indexe un lot de fichiers et d'archives
+
+        Args:
+            paths: Fichiers téléversés
+            content_hashes: Empreintes déjà calculées à la réception, par chemin
+            filenames: Noms des documents dans le registre, par chemin
+
+        Returns:
+            Compteurs, documents indexés et fichiers en échec
+
+        Raises:
+            IngestionCancelled: Si l'indexation a été annulée
+        """
+        stages = [("extract", lambda: self._extract(paths, content_hashes, filenames))]
+        stages += [("parse", self._parse)] * self.parse_threads
+        stages += [("split", self._split), ("embed", self._embed), ("write", self._write)]
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, fn), name=f"turbochat-pipeline-{name}", daemon=True)
+            for name, fn in stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._stop.is_set():
+            # Annulation ou erreur : le lot est retiré en entier
+            restored = self.rag.forget_near_duplicates(self.collection_name, [document["id"] for document in self.documents])
+            self.rag.delete_chunks(self.collection_name, self.written_ids)
+            if restored and not self.written_ids:
+                self.rag.update_collection_stats(self.collection_name)
+            for content_hash in self.claimed_hashes:
+                self.registry.release(content_hash)
+            if self._error is not None:
+                raise self._error
+            raise IngestionCancelled(f"Indexation annulée après {len(self.written_ids)} chunks")
+
+        replaced_ids = self._register_documents()
+        logger.info(
+            f"Lot indexé dans {self.collection_name}: {len(self.documents)} documents, "
+            f"{self.counters['chunks_written']} chunks, {len(self.failed_files)} fichiers en échec"
+        )
+        return {
+            **self.counters,
+            "documents": self.documents,
+            "replaced_document_ids": replaced_ids,
+            "failed_files": self.failed_files
+        }
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de profilage à la demande pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Profiler par échantillonnage les N prochaines requêtes d'une route
+  (seules les piles de la requête profilée sont relevées : ses tâches
+  asyncio, réponse en streaming comprise, et les threads qui travaillent pour elle)
+- Exporter les piles au format "folded stacks" (compatible flamegraph.pl, speedscope)
+- Prendre des instantanés tracemalloc et comparer leur évolution
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import fnmatch
+import logging
+import functools
+import threading
+import tracemalloc
+import weakref
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-profiling")
+
+# Intervalle d'échantillonnage par défaut (en secondes)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# Profondeur maximale des piles enregistrées
+MAX_STACK_DEPTH = 128
+# Nombre maximal d'instantanés mémoire conservés
+MAX_SNAPSHOTS = 10
+# Nombre maximal de sessions de profilage conservées
+MAX_SESSIONS = 20
+# Durée de conservation d'une session terminée (en secondes)
+SESSION_TTL = 3600
+
+
+def _frame_label(frame) -> str:
+    """Construit l'étiquette d'une frame pour le format folded"""
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+class ProfiledRequest:
+    """
+    Requête en cours de profilage : ses tâches asyncio et les threads qui travaillent pour elle
+    """
+
+    def __init__(self):
+        # Tâches créées dans le contexte de la requête (réponse en streaming comprise)
+        self.tasks = weakref.WeakSet()
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    def add_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads.add(thread_id)
+
+    def remove_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads.discard(thread_id)
+
+    @property
+    def threads(self) -> List[int]:
+        with self._lock:
+            return list(self._threads)
+
+
+# Requête profilée du contexte courant (None hors profilage)
+_current_request: ContextVar[Optional[ProfiledRequest]] = ContextVar("turbochat_profiled_request", default=None)
+
+
+class StackSampler:
+    """
+    Échantillonneur des piles d'une requête
+
+    Un thread démon relève périodiquement les piles via `sys._current_frames()`
+    et compte les piles identiques. La pile de la boucle d'événements n'est
+    relevée que lorsqu'elle exécute une tâche de la requête : les requêtes
+    concurrentes servies par la même boucle sont ignorées.
+    """
+
+    def __init__(
+        self,
+        request: ProfiledRequest,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread_id: int,
+        interval: float = DEFAULT_SAMPLE_INTERVAL
+    ):
+        self.request = request
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Démarre l'échantillonnage"""
+        self._thread = threading.Thread(target=self._run, name="turbochat-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Arrête l'échantillonnage et attend la fin du thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            thread_ids = self.request.threads
+            if asyncio.current_task(self.loop) in self.request.tasks:
+                thread_ids.append(self.loop_thread_id)
+
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+
+                # Le format folded liste les frames de la racine vers la feuille
+                self.samples[";".join(reversed(stack))] += 1
+                self.sample_count += 1
+
+
+class ProfilingSession:
+    """
+    Session de profilage armée pour une route
+
+    La session profile les `max_requests` prochaines requêtes dont le chemin
+    correspond au motif `route` (syntaxe fnmatch, ex: "/rag/*").
+    """
+
+    def __init__(self, route: str, max_requests: int, interval: float):
+        self.id = str(uuid.uuid4())
+        self.route = route
+        self.max_requests = max_requests
+        self.interval = interval
+        self.remaining = max_requests
+        self.in_flight = 0
+        self.requests_profiled = 0
+        self.total_time = 0.0
+        self.samples = Counter()
+        self.sample_count = 0
+        self.created_at = datetime.now().isoformat()
+        self.completed_at = None
+        # Fin de la session (time.time()), pour l'expiration
+        self.completed_time = None
+
+    @property
+    def status(self) -> str:
+        if self.remaining > 0:
+            return "armed"
+        if self.in_flight > 0:
+            return "running"
+        return "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "route": self.route,
+            "status": self.status,
+            "max_requests": self.max_requests,
+            "requests_profiled": self.requests_profiled,
+            "remaining": self.remaining,
+            "interval_ms": self.interval * 1000,
+            "sample_count": self.sample_count,
+            "distinct_stacks": len(self.samples),
+            "total_time": self.total_time,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at
+        }
+
+
+class RequestProfiler:
+    """
+    Gestionnaire des sessions de profilage par requête
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, session_ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.sessions: Dict[str, ProfilingSession] = OrderedDict()
+        self._lock = threading.Lock()
+        # Boucles d'événements dont la fabrique de tâches suit les requêtes profilées
+        self._tracked_loops = weakref.WeakSet()
+
+    def _prune(self) -> None:
+        """Retire les sessions terminées expirées, puis les plus anciennes au-delà du plafond (verrou déjà pris)"""
+        now = time.time()
+        completed = [
+            session_id for session_id, session in self.sessions.items()
+            if session.status == "completed"
+        ]
+        for session_id in completed:
+            if now - self.sessions[session_id].completed_time > self.session_ttl:
+                del self.sessions[session_id]
+        for session_id in completed:
+            if len(self.sessions) < self.max_sessions:
+                break
+            self.sessions.pop(session_id, None)
+
+    def arm(self, route: str, max_requests: int = 10, interval: float = DEFAULT_SAMPLE_INTERVAL) -> ProfilingSession:
+        """
+        Arme une session de profilage pour les prochaines requêtes d'une route
+
+        Args:
+            route: Chemin ou motif fnmatch de la route à profiler
+            max_requests: Nombre de requêtes à profiler
+            interval: Intervalle d'échantillonnage en secondes
+
+        Returns:
+            La session créée
+        """
+        if max_requests < 1:
+            raise ValueError("Le nombre de requêtes à profiler doit être positif")
+        if interval <= 0:
+            raise ValueError("L'intervalle d'échantillonnage doit être positif")
+
+        session = ProfilingSession(route, max_requests, interval)
+        with self._lock:
+            self._prune()
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError(f"Trop de sessions de profilage en cours (au plus {self.max_sessions})")
+            self.sessions[session.id] = session
+        logger.info(f"Profilage armé pour {max_requests} requête(s) sur {route} (session {session.id})")
+        return session
+
+    def claim(self, path: str) -> Optional[ProfilingSession]:
+        """
+        Réserve une session armée correspondant au chemin, s'il en existe une
+
+        Args:
+            path: Chemin de la requête entrante
+
+        Returns:
+            La session réservée, ou None si aucune ne correspond
+        """
+        if not self.sessions:
+            return None
+
+        with self._lock:
+            for session in self.sessions.values():
+                if session.remaining > 0 and fnmatch.fnmatchcase(path, session.route):
+                    session.remaining -= 1
+                    session.in_flight += 1
+                    return session
+        return None
+
+    def _track_tasks(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Installe sur la boucle une fabrique de tâches qui rattache chaque
+        nouvelle tâche à la requête profilée du contexte qui la crée
+        """
+        if loop in self._tracked_loops:
+            return
+        previous = loop.get_task_factory()
+
+        def task_factory(loop, coro, **kwargs):
+            context = kwargs.get("context")
+            request = context.get(_current_request) if context is not None else _current_request.get()
+            if previous is not None:
+                task = previous(loop, coro, **kwargs)
+            else:
+                task = asyncio.Task(coro, loop=loop, **kwargs)
+            if request is not None:
+                request.tasks.add(task)
+            return task
+
+        loop.set_task_factory(task_factory)
+        self._tracked_loops.add(loop)
+
+    @contextmanager
+    def profile(self, session: ProfilingSession):
+        """
+        Profile la requête en cours (appelé dans sa tâche asyncio) pour le compte d'une session réservée
+
+        Les tâches créées pendant le bloc et les appels enveloppés par
+        `traced` sont rattachés à la requête.
+
+        Args:
+            session: Session obtenue via `claim`
+        """
+        loop = asyncio.get_running_loop()
+        self._track_tasks(loop)
+        request = ProfiledRequest()
+        request.tasks.add(asyncio.current_task())
+        token = _current_request.set(request)
+
+        sampler = StackSampler(request, loop, threading.get_ident(), session.interval)
+        start_time = time.perf_counter()
+        sampler.start()
+        try:
+            yield session
+        finally:
+            sampler.stop()
+            _current_request.reset(token)
+            with self._lock:
+                session.samples.update(sampler.samples)
+                session.sample_count += sampler.sample_count
+                session.total_time += time.perf_counter() - start_time
+                session.requests_profiled += 1
+                session.in_flight -= 1
+                if session.status == "completed":
+                    session.completed_at = datetime.now().isoformat()
+                    session.completed_time = time.time()
+
+    @staticmethod
+    def traced(func: Callable) -> Callable:
+        """
+        Enveloppe un appel bloquant exécuté dans un autre thread pour qu'il
+        soit échantillonné avec la requête qui le lance
+
+        La requête est celle du contexte au moment de l'enveloppement
+        (`run_in_executor` ne transmet pas le contexte au thread) ou, à
+        défaut, celle du contexte du thread (pool de threads d'anyio).
+        """
+        captured = _current_request.get()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request = captured or _current_request.get()
+            if request is None:
+                return func(*args, **kwargs)
+            thread_id = threading.get_ident()
+            request.add_thread(thread_id)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                request.remove_thread(thread_id)
+
+        return wrapper
+
+    def get_session(self, session_id: str) -> Optional[ProfilingSession]:
+        return self.sessions.get(session_id)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [session.to_dict() for session in self.sessions.values()]
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def export_folded(self, session_id: str) -> str:
+        """
+        Exporte les échantillons d'une session au format "folded stacks"
+
+        Chaque ligne contient une pile (frames séparées par ";") suivie du
+        nombre d'échantillons, ce qui est directement exploitable par
+        flamegraph.pl ou speedscope.
+
+        Args:
+            session_id: Identifiant de la session
+
+        Returns:
+            Le contenu texte au format folded
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in session.samples.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI qui profile les requêtes correspondant à une session armée
+
+    L'application est appelée dans la tâche de la requête et le profilage
+    dure jusqu'au dernier message envoyé : le corps d'une réponse en
+    streaming est échantillonné jusqu'au bout.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.claim(scope["path"]) if scope["type"] == "http" else None
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+
+        with self.profiler.profile(session):
+            await self.app(scope, receive, send)
+
+
+class MemoryProfiler:
+    """
+    Instantanés tracemalloc et suivi de la taille des conteneurs surveillés
+    """
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self.snapshots: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.watched: Dict[str, Callable[[], int]] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, name: str, size_fn: Callable[[], int]) -> None:
+        """
+        Enregistre un conteneur dont la taille est relevée à chaque instantané
+
+        Args:
+            name: Nom affiché dans les rapports (ex: "stream_sessions")
+            size_fn: Fonction renvoyant le nombre d'éléments du conteneur
+        """
+        self.watched[name] = size_fn
+
+    def _watched_sizes(self) -> Dict[str, Optional[int]]:
+        sizes = {}
+        for name, size_fn in self.watched.items():
+            try:
+                sizes[name] = size_fn()
+            except Exception as e:
+                logger.warning(f"Impossible de mesurer {name}: {e}")
+                sizes[name] = None
+        return sizes
+
+    def start(self, nframes: int = 25) -> Dict[str, Any]:
+        """Démarre le traçage des allocations"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+            logger.info(f"tracemalloc démarré ({nframes} frames)")
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Arrête le traçage des allocations et libère les instantanés"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc arrêté")
+        with self._lock:
+            self.snapshots.clear()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "traceback_limit": tracemalloc.get_traceback_limit(),
+            "traced_current": current,
+            "traced_peak": peak,
+            "watched": self._watched_sizes(),
+            "snapshots": [self._summary(snapshot_id) for snapshot_id in self.snapshots]
+        }
+
+    def take_snapshot(self, label: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Prend un instantané des allocations en cours
+
+        Args:
+            label: Libellé optionnel de l'instantané
+
+        Returns:
+            Résumé de l'instantané
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc n'est pas démarré")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        snapshot_id = str(uuid.uuid4())
+
+        with self._lock:
+            self.snapshots[snapshot_id] = {
+                "id": snapshot_id,
+                "label": label,
+                "taken_at": datetime.now().isoformat(),
+                "snapshot": snapshot,
+                "total_size": sum(stat.size for stat in snapshot.statistics("filename")),
+                "watched": self._watched_sizes()
+            }
+            # Les instantanés sont volumineux : on ne garde que les plus récents
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+
+        return self._summary(snapshot_id)
+
+    def _summary(self, snapshot_id: str) -> Dict[str, Any]:
+        entry = self.snapshots[snapshot_id]
+        return {key: value for key, value in entry.items() if key != "snapshot"}
+
+    def _get(self, snapshot_id: str) -> Dict[str, Any]:
+        entry = self.snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(snapshot_id)
+        return entry
+
+    def top(self, snapshot_id: str, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+        """
+        Renvoie les plus gros postes d'allocation d'un instantané
+
+        Args:
+            snapshot_id: Identifiant de l'instantané
+            limit: Nombre d'entrées à renvoyer
+            key_type: Regroupement ("lineno", "filename" ou "traceback")
+        """
+        entry = self._get(snapshot_id)
+        stats = entry["snapshot"].statistics(key_type)[:limit]
+        return {
+            **self._summary(snapshot_id),
+            "stats": [{
+                "location": self._format_traceback(stat.traceback),
+                "size": stat.size,
+                "count": stat.count
+            } for stat in stats]
+        }
+
+    def diff(self, base_id: str, current_id: str, limit: int = 25, key_type: str = "lineno") -> Dict[str, Any]:
+        """
+        Compare deux instantanés pour identifier ce qui grossit
+
+        Args:
+            base_id: Instantané de référence
+            current_id: Instantané le plus récent
+            limit: Nombre d'entrées à renvoyer
+            key_type: Regroupement ("lineno", "filename" ou "traceback")
+        """
+        base = self._get(base_id)
+        current = self._get(current_id)
+        stats = current["snapshot"].compare_to(base["snapshot"], key_type)[:limit]
+
+        watched_diff = {}
+        for name, size in current["watched"].items():
+            previous = base["watched"].get(name)
+            watched_diff[name] = {
+                "before": previous,
+                "after": size,
+                "diff": size - previous if size is not None and previous is not None else None
+            }
+
+        return {
+            "base": self._summary(base_id),
+            "current": self._summary(current_id),
+            "total_size_diff": current["total_size"] - base["total_size"],
+            "watched": watched_diff,
+            "stats": [{
+                "location": self._format_traceback(stat.traceback),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff
+            } for stat in stats]
+        }
+
+    @staticmethod
+    def _format_traceback(traceback: tracemalloc.Traceback) -> List[str]:
+        return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+# Instances globales
+request_profiler = RequestProfiler()
+memory_profiler = MemoryProfiler()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de quantification des vecteurs pour TurboChat
+
+Ce module fournit des codes compacts pour le stockage vectoriel plat :
+- int8 : chaque composante sur un octet, avec une échelle par vecteur (≈ 4x moins de mémoire)
+- binary : le signe de chaque composante sur un bit (32x moins de mémoire)
+- Similarité approchée d'une requête avec tous les codes, par blocs
+
+La recherche parcourt les codes pour retenir quelques candidats, puis
+les réordonne avec les vecteurs exacts (voir `FlatVectorStore.search`).
+"""
+
+import os
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+# Candidats réordonnés par voisin demandé, au moins QUANTIZATION_MIN_CANDIDATES
+QUANTIZATION_RERANK = int(os.environ.get("QUANTIZATION_RERANK", "10"))
+QUANTIZATION_MIN_CANDIDATES = int(os.environ.get("QUANTIZATION_MIN_CANDIDATES", "100"))
+
+# Codes int8 décodés en une fois : le bloc décodé en float32 reste dans le cache du processeur
+INT8_BLOCK = 1024
+# Codes binaires comparés en une fois
+BINARY_BLOCK = 65536
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _popcount64(x: np.ndarray) -> np.ndarray:
+    """Nombre de bits à 1 de chaque mot de 64 bits (méthode SWAR)"""
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+class Quantizer:
+    """Interface commune des quantificateurs"""
+
+    name = ""
+    # Multiplicateur du nombre de candidats réordonnés (codes plus grossiers : plus de candidats)
+    rerank_factor = 1
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.dtype = self.code_dtype(dimension)
+
+    @staticmethod
+    def code_dtype(dimension: int) -> np.dtype:
+        raise NotImplementedError
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Codes de vecteurs normalisés (un élément de `dtype` par vecteur)"""
+        raise NotImplementedError
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Similarité approchée (croissante avec la similarité cosinus) d'une requête avec chaque code"""
+        raise NotImplementedError
+
+    def candidates(self, k: int) -> int:
+        """Nombre de candidats à réordonner pour renvoyer k voisins"""
+        return max(k * QUANTIZATION_RERANK, QUANTIZATION_MIN_CANDIDATES) * self.rerank_factor
+
+
+class Int8Quantizer(Quantizer):
+    """
+    Quantification scalaire sur 8 bits
+
+    Chaque vecteur est divisé par sa plus grande composante (en valeur
+    absolue) puis arrondi sur [-127, 127] ; l'échelle est conservée avec
+    le code. Aucun entraînement : un vecteur ajouté est codé seul.
+    """
+
+    name = "int8"
+
+    @staticmethod
+    def code_dtype(dimension: int) -> np.dtype:
+        return np.dtype([("codes", np.int8, (dimension,)), ("scale", np.float32)])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        scale = np.abs(vectors).max(axis=1) / 127
+        scale[scale == 0] = 1.0
+        encoded = np.empty(len(vectors), dtype=self.dtype)
+        encoded["codes"] = np.rint(vectors / scale[:, None])
+        encoded["scale"] = scale
+        return encoded
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), INT8_BLOCK):
+            block = codes[start:start + INT8_BLOCK]
+            scores[start:start + INT8_BLOCK] = (block["codes"].astype(np.float32) @ query) * block["scale"]
+        return scores
+
+
+class BinaryQuantizer(Quantizer):
+    """
+    Quantification binaire : un bit de signe par composante
+
+    La similarité approchée est l'opposé de la distance de Hamming entre
+    les signes de la requête et ceux du vecteur. Plus grossière que
+    l'int8, elle demande davantage de candidats réordonnés. Les codes
+    sont complétés par des zéros jusqu'à un multiple de 64 bits, pour
+    être comparés mot par mot.
+    """
+
+    name = "binary"
+    rerank_factor = 4
+
+    @staticmethod
+    def code_dtype(dimension: int) -> np.dtype:
+        return np.dtype((np.uint8, ((dimension + 63) // 64 * 8,)))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        encoded = np.zeros((len(vectors), self.dtype.shape[0]), dtype=np.uint8)
+        packed = np.packbits(vectors > 0, axis=1)
+        encoded[:, :packed.shape[1]] = packed
+        return encoded
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        query_code = self.encode(query[None, :]).view(np.uint64)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BINARY_BLOCK):
+            block = np.ascontiguousarray(codes[start:start + BINARY_BLOCK]).view(np.uint64)
+            # Somme non signée : convertie avant d'en prendre l'opposé
+            scores[start:start + BINARY_BLOCK] = -_popcount64(block ^ query_code).sum(axis=1).astype(np.float32)
+        return scores
+
+
+QUANTIZERS: Dict[str, Type[Quantizer]] = {
+    Int8Quantizer.name: Int8Quantizer,
+    BinaryQuantizer.name: BinaryQuantizer
+}
+
+
+def get_quantizer(name: Optional[str], dimension: int) -> Optional[Quantizer]:
+    """
+    Renvoie le quantificateur d'un stockage
+
+    Args:
+        name: "int8", "binary" ou None (pas de quantification)
+        dimension: Dimension des vecteurs
+
+    Returns:
+        Le quantificateur, ou None
+    """
+    if name is None:
+        return None
+    if name not in QUANTIZERS:
+        raise ValueError(f"Quantification inconnue: {name} (choix: {', '.join(QUANTIZERS)})")
+    return QUANTIZERS[name](dimension)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de cache des résultats de recherche RAG pour TurboChat
+
+Ce module fournit un cache en mémoire des réponses aux requêtes RAG :
+- Clé = collection, génération et version de la collection, requête
+  normalisée (casse, accents composés, espaces) et réglages de la
+  recherche (top_k, filtres, fusion, etc.)
+- La version d'une collection change à chaque indexation ou suppression,
+  la génération à chaque recréation : une réponse calculée sur un état
+  antérieur n'est jamais renvoyée, même par un processus qui n'a pas vu
+  la suppression
+- Borné en nombre d'entrées avec éviction des moins récemment utilisées
+- Avec suivi du taux de succès, global et par collection
+"""
+
+import os
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Nombre de réponses gardées en cache (0 : pas de cache)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1000"))
+
+
+def normalize_query(query: str) -> str:
+    """Forme canonique d'une requête : Unicode NFC, minuscules, espaces réduits"""
+    return " ".join(unicodedata.normalize("NFC", query).casefold().split())
+
+
+def cache_key(
+    collection_name: str,
+    generation: Optional[str],
+    version: int,
+    query: str,
+    settings: Dict[str, Any]
+) -> Tuple[Hashable, ...]:
+    """
+    Clé de cache d'une requête
+
+    Args:
+        collection_name: Nom de la collection
+        generation: Génération de la collection (tirée à sa création)
+        version: Version de la collection au moment de la requête
+        query: Texte de la requête
+        settings: Réglages de la recherche (top_k, filtre, fusion...)
+
+    Returns:
+        Clé de cache
+    """
+    return (
+        collection_name,
+        generation,
+        version,
+        normalize_query(query),
+        json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+    )
+
+
+class QueryCache:
+    """
+    Cache LRU des réponses aux requêtes RAG
+
+    Les entrées d'une version ou d'une génération dépassée ne sont plus
+    jamais demandées et sortent du cache par éviction ; la suppression
+    d'une collection retire les siennes aussitôt dans ce processus.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Succès et échecs par collection
+        self._collections: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        """Réponse en cache pour une clé, ou None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            counters = self._collections.setdefault(key[0], {"hits": 0, "misses": 0})
+            if value is None:
+                self.misses += 1
+                counters["misses"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                counters["hits"] += 1
+        return value
+
+    def put(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        """Met une réponse en cache"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str) -> int:
+        """
+        Retire les réponses d'une collection
+
+        Returns:
+            Nombre d'entrées retirées
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == collection_name]
+            for key in keys:
+                del self._entries[key]
+            self._collections.pop(collection_name, None)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Taux de succès et occupation du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "collections": {
+                    name: {
+                        **counters,
+                        "hit_ratio": round(counters["hits"] / (counters["hits"] + counters["misses"]), 4)
+                        if counters["hits"] + counters["misses"] else None
+                    }
+                    for name, counters in self._collections.items()
+                }
+            }
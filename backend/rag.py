@@ -11,34 +11,39 @@ Ce module fournit les fonctionnalités pour :
 """
 
 import os
+import re
+import json
 import time
+import copy
+import shutil
 import logging
+import tempfile
+import threading
 import uuid
-from typing import List, Dict, Any, Optional, Union, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Dict, Any, NamedTuple, Optional, Tuple
 
-import chromadb
 import numpy as np
-import tiktoken
 from pydantic import BaseModel
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.embeddings.base import Embeddings
-from langchain.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredMarkdownLoader,
-    UnstructuredHTMLLoader,
-    CSVLoader,
-    Docx2txtLoader
-)
-from langchain_core.documents import Document
-from langchain.retrievers import BM25Retriever, EnsembleRetriever
-from tqdm import tqdm
 
-# Importer explicitement ces classes pour les rendre accessibles à l'importation
-# depuis d'autres modules comme app.py
+from embeddings import SimpleEmbeddings, get_embedding_engine, default_embedding_model_id
+from parsing import document_parser
+from document_registry import DocumentRegistry, hash_file
+from chunking import ChunkingSettings, TokenChunker, get_tokenizer
+from near_duplicates import NEAR_DUPLICATE_ENABLED, NEAR_DUPLICATE_MEASURE_QUERIES, NearDuplicateIndex
+from bm25_index import BM25Index
+from flat_vectors import FlatVectorStore
+from quantization import QUANTIZERS
+from hybrid_search import HYBRID_CANDIDATES, ScoredChunk, distances_to_similarities, fuse
+from reranker import RERANK_CANDIDATES, CrossEncoderReranker, get_reranker
+from mmr import MMR_CANDIDATES, maximal_marginal_relevance
+from query_cache import QueryCache, cache_key
+
+# Document est exporté pour les autres modules comme app.py. Les dépendances
+# lourdes (chromadb, loaders et retrievers langchain, tiktoken) sont importées
+# à la première utilisation pour accélérer le démarrage.
 from langchain_core.documents import Document
-from langchain.vectorstores import Chroma
 
 # Configuration du logger
 logging.basicConfig(
@@ -54,7 +59,24 @@ INDICES_DIR = os.path.join(DATA_DIR, "indices")
 VECTORS_DIR = os.path.join(DATA_DIR, "vectors")
 
 # Exportation des variables pour les import externes
-__all__ = ["RagSystem", "get_rag_system", "RagQuery", "RagResponse", "RagCollection", "RagDocument", "VECTORS_DIR"]
+__all__ = ["RagSystem", "get_rag_system", "validate_collection_name", "RagQuery", "RagResponse", "RagCollection", "RagDocument", "IngestionCancelled", "VECTORS_DIR"]
+
+# Nombre de chunks encodés puis écrits ensemble lors de l'indexation
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "128"))
+# Stockage vectoriel des nouvelles collections : "chroma", "flat" (fichier projeté en mémoire,
+# recherche exacte) ou "ivf" (même stockage, recherche approchée par listes inversées)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_BACKENDS = ("chroma", "flat", "ivf")
+# Quantification des vecteurs des nouvelles collections "flat" : "int8", "binary" ou vide (aucune)
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION") or None
+
+# Nombre de chunks lus à la fois lors de la reconstruction d'un index BM25
+BM25_REBUILD_BATCH = 5000
+# Threads des recherches vectorielles menées en parallèle de la recherche BM25
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "4"))
+
+# Noms de collection acceptés : ils servent de noms de répertoires sous DATA_DIR
+COLLECTION_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
 
 # Création des répertoires s'ils n'existent pas
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
@@ -62,6 +84,23 @@ os.makedirs(INDICES_DIR, exist_ok=True)
 os.makedirs(VECTORS_DIR, exist_ok=True)
 
 # Modèle de données pour les documents
+def validate_collection_name(collection_name: str) -> str:
+    """
+    Vérifie qu'un nom de collection ne peut désigner aucun chemin hors des répertoires de données
+    
+    Args:
+        collection_name: Nom de la collection
+        
+    Returns:
+        Le nom, inchangé
+    """
+    if not isinstance(collection_name, str) or not COLLECTION_NAME_PATTERN.fullmatch(collection_name):
+        raise ValueError(
+            f"Nom de collection invalide: {collection_name!r} "
+            "(lettres, chiffres, '_' et '-' uniquement, 64 caractères au plus)"
+        )
+    return collection_name
+
 class RagDocument(BaseModel):
     """
     Modèle pour un document RAG à indexer
@@ -71,7 +110,7 @@ class RagDocument(BaseModel):
     content: Optional[str] = None
     metadata: dict = {}
     chunks: List[Dict] = []
-    status: str = "pending"  # pending, processing, indexed, failed
+    status: str = "pending"  # pending, processing, indexed, duplicate, failed, cancelled
 
 class RagQuery(BaseModel):
     """
@@ -82,6 +121,20 @@ class RagQuery(BaseModel):
     top_k: int = 5
     hybrid_search: bool = True
     filter: Optional[Dict] = None
+    # Listes IVF parcourues (collections "ivf" uniquement ; IVF_NPROBE par défaut)
+    nprobe: Optional[int] = None
+    # Fusion des recherches BM25 et vectorielle : "rrf" ou "weighted" (HYBRID_FUSION par défaut)
+    fusion: Optional[str] = None
+    # Poids de la recherche vectorielle dans la fusion, entre 0 et 1 (HYBRID_VECTOR_WEIGHT par défaut)
+    vector_weight: Optional[float] = None
+    # Score minimal (fusionné, ou similarité cosinus sans recherche hybride) des chunks renvoyés
+    min_score: Optional[float] = None
+    # Reclassement des RERANK_CANDIDATES meilleurs chunks par le cross-encoder
+    # (par défaut : activé si RERANK_MODEL est configuré)
+    rerank: Optional[bool] = None
+    # Diversification MMR des chunks renvoyés, entre 0 (diversité seule) et 1
+    # (pertinence seule) ; None : pas de diversification
+    mmr_lambda: Optional[float] = None
 
 class RagResponse(BaseModel):
     """
@@ -101,65 +154,30 @@ class RagCollection(BaseModel):
     document_count: int = 0
     chunk_count: int = 0
     last_updated: Optional[str] = None
+    embedding_model: Optional[str] = None
+    vector_backend: Optional[str] = None
+    quantization: Optional[str] = None
+    size_bytes: int = 0
 
-def get_loader_for_file(file_path: str) -> Any:
+class QueryPlan(NamedTuple):
     """
-    Renvoie le chargeur approprié en fonction de l'extension du fichier
-    
-    Args:
-        file_path: Chemin vers le fichier à charger
-        
-    Returns:
-        Un chargeur Langchain pour le type de fichier spécifié
+    Réglages résolus d'une requête RAG, avant la recherche
     """
-    ext = file_path.split('.')[-1].lower()
-    
-    if ext == 'pdf':
-        return PyPDFLoader(file_path)
-    elif ext == 'txt':
-        return TextLoader(file_path)
-    elif ext in ['md', 'markdown']:
-        return UnstructuredMarkdownLoader(file_path)
-    elif ext in ['html', 'htm']:
-        return UnstructuredHTMLLoader(file_path)
-    elif ext == 'csv':
-        return CSVLoader(file_path)
-    elif ext in ['doc', 'docx']:
-        return Docx2txtLoader(file_path)
-    else:
-        # Format non supporté, on tente avec TextLoader
-        logger.warning(f"Format de fichier non reconnu: {ext}. Tentative avec TextLoader.")
-        return TextLoader(file_path)
-
-class SimpleEmbeddings(Embeddings):
+    # Clé de la réponse dans le cache
+    cache_key: Tuple
+    reranker: Optional[CrossEncoderReranker]
+    # Listes IVF parcourues (None hors stockage plat)
+    nprobe: Optional[int]
+    # Chunks retenus après la fusion (davantage que top_k avec reclassement ou MMR)
+    keep: int
+    # Candidats demandés à chaque recherche
+    candidates: int
+
+class IngestionCancelled(Exception):
     """
-    Embeddings simplifiés qui utilisent une représentation basique pour les tests
+    Levée quand l'indexation d'un document est annulée en cours de route
     """
-    
-    def __init__(self, dimension: int = 384):
-        self.dimension = dimension
-    
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Créer des embeddings de documents"""
-        return [self._get_embedding(text) for text in texts]
-    
-    def embed_query(self, text: str) -> List[float]:
-        """Créer un embedding de requête"""
-        return self._get_embedding(text)
-    
-    def _get_embedding(self, text: str) -> List[float]:
-        """Méthode interne de génération d'embedding simplifiée"""
-        # Hachage simple basé sur le texte
-        hash_val = hash(text) % (10**8)
-        # Convertir en une liste de valeurs pseudo-aléatoires mais déterministes
-        result = []
-        for i in range(self.dimension):
-            val = ((hash_val + i) * 1.0) / (10**8)
-            result.append(val - 0.5)  # Valeurs entre -0.5 et 0.5
-        
-        # Normaliser le vecteur
-        norm = sum(x*x for x in result) ** 0.5
-        return [x/norm for x in result]
+    pass
 
 class RAGSystem:
     """
@@ -172,58 +190,641 @@ class RAGSystem:
     def __init__(self):
         """
         Initialise le système RAG avec les paramètres par défaut
+        
+        Les découpeurs et le client ChromaDB sont créés à la première utilisation.
         """
-        # Configuration du splitter de texte
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,           # Taille maximale d'un chunk en caractères
-            chunk_overlap=200,         # Chevauchement entre chunks en caractères
-            length_function=len,       # Fonction pour calculer la longueur
-            separators=["\n\n", "\n", " ", ""]  # Séparateurs pour le découpage
-        )
+        # Découpeurs en tokens, par collection
+        self.chunkers: Dict[str, TokenChunker] = {}
         
-        # Modèle d'embedding
-        self.embedding_model = SimpleEmbeddings()
+        # Modèle d'embedding par défaut des nouvelles collections
+        self.embedding_model = get_embedding_engine()
         
         # Dictionnaire pour stocker les Vector Stores en mémoire
         self.vectorstores = {}
         
+        # Registres des documents indexés, par collection
+        self.registries: Dict[str, DocumentRegistry] = {}
+        
+        # Index des signatures des chunks (détection des quasi-doublons), par collection
+        self.near_duplicate_indices: Dict[str, NearDuplicateIndex] = {}
+        
+        # Index BM25 persistants (recherche hybride), par collection
+        self.bm25_indices: Dict[str, BM25Index] = {}
+        
+        # Réponses des requêtes récentes, par version de collection
+        self.query_cache = QueryCache()
+        
         # Client ChromaDB
-        self.chroma_client = chromadb.PersistentClient(path=VECTORS_DIR)
+        self._chroma_client = None
+        # Threads des recherches vectorielles (créés à la première requête)
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.RLock()
+        # Collections ChromaDB antérieures aux statistiques du manifeste déjà recensées
+        self._stats_migrated = False
         
         logger.info("Système RAG initialisé avec succès")
 
+    @property
+    def chroma_client(self):
+        """Client ChromaDB persistant (ouvert à la première utilisation)"""
+        if self._chroma_client is None:
+            with self._lock:
+                if self._chroma_client is None:
+                    import chromadb
+                    self._chroma_client = chromadb.PersistentClient(path=VECTORS_DIR)
+                    logger.info(f"Client ChromaDB ouvert sur {VECTORS_DIR}")
+        return self._chroma_client
+
+    @property
+    def search_executor(self) -> ThreadPoolExecutor:
+        """Threads des recherches vectorielles menées en parallèle de la recherche BM25"""
+        if self._search_executor is None:
+            with self._lock:
+                if self._search_executor is None:
+                    self._search_executor = ThreadPoolExecutor(
+                        max_workers=SEARCH_WORKERS,
+                        thread_name_prefix="turbochat-search"
+                    )
+        return self._search_executor
+
+    @staticmethod
+    def collection_dir(collection_name: str) -> str:
+        """Répertoire des index d'une collection (nom vérifié)"""
+        return os.path.join(INDICES_DIR, validate_collection_name(collection_name))
+
+    def _manifest_path(self, collection_name: str) -> str:
+        return os.path.join(self.collection_dir(collection_name), "manifest.json")
+
+    def load_manifest(self, collection_name: str) -> Dict[str, Any]:
+        """
+        Charge le manifeste d'une collection (vide s'il n'existe pas)
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Contenu du manifeste
+        """
+        try:
+            with open(self._manifest_path(collection_name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, collection_name: str, manifest: Dict[str, Any]) -> None:
+        path = self._manifest_path(collection_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un manifeste n'est jamais lu à moitié écrit
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def _resolve_embedding_model(self, collection_name: str) -> str:
+        """
+        Renvoie l'identifiant du modèle d'embedding d'une collection
+        
+        Les nouvelles collections utilisent le modèle par défaut. Les
+        collections antérieures au manifeste ont été indexées avec
+        SimpleEmbeddings.
+        """
+        manifest = self.load_manifest(collection_name)
+        model_id = manifest.get("embedding_model")
+        if model_id is None:
+            existing = [col.name for col in self.chroma_client.list_collections()]
+            model_id = SimpleEmbeddings.model_id if collection_name in existing else default_embedding_model_id()
+            manifest["embedding_model"] = model_id
+            self._save_manifest(collection_name, manifest)
+        return model_id
+
+    def _resolve_vector_backend(self, collection_name: str) -> str:
+        """
+        Renvoie le stockage vectoriel d'une collection ("chroma", "flat" ou "ivf")
+        
+        Les collections antérieures au choix du stockage sont dans ChromaDB.
+        """
+        manifest = self.load_manifest(collection_name)
+        backend = manifest.get("vector_backend")
+        if backend is None:
+            existing = [col.name for col in self.chroma_client.list_collections()]
+            backend = "chroma" if collection_name in existing else VECTOR_BACKEND
+            manifest["vector_backend"] = backend
+            if backend == "flat" and "quantization" not in manifest:
+                manifest["quantization"] = VECTOR_QUANTIZATION
+            self._save_manifest(collection_name, manifest)
+        return backend
+
+    def document_registry(self, collection_name: str) -> DocumentRegistry:
+        """
+        Renvoie le registre des documents d'une collection
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Registre des documents, indexé par empreinte de contenu
+        """
+        if collection_name not in self.registries:
+            with self._lock:
+                if collection_name not in self.registries:
+                    self.registries[collection_name] = DocumentRegistry(
+                        os.path.join(self.collection_dir(collection_name), "documents.json")
+                    )
+        return self.registries[collection_name]
+
+    def bm25_index(self, collection_name: str) -> BM25Index:
+        """
+        Renvoie l'index BM25 d'une collection
+        
+        Une collection indexée avant l'existence de l'index est reconstruite
+        une fois depuis le vectorstore ; l'index est ensuite tenu à jour à
+        chaque écriture et suppression de chunks.
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Index inversé persistant de la collection
+        """
+        if collection_name not in self.bm25_indices:
+            with self._lock:
+                if collection_name not in self.bm25_indices:
+                    index = BM25Index(os.path.join(self.collection_dir(collection_name), "bm25.sqlite3"))
+                    if not index.initialized:
+                        self._rebuild_bm25_index(collection_name, index)
+                    self.bm25_indices[collection_name] = index
+        return self.bm25_indices[collection_name]
+
+    def _rebuild_bm25_index(self, collection_name: str, index: BM25Index) -> None:
+        """Reconstruit l'index BM25 d'une collection à partir des chunks du vectorstore"""
+        start_time = time.time()
+        index.clear()
+        collection = self._get_vectorstore(collection_name)._collection
+        offset = 0
+        while True:
+            batch = collection.get(include=["documents", "metadatas"], limit=BM25_REBUILD_BATCH, offset=offset)
+            if not batch["ids"]:
+                break
+            index.add(
+                batch["ids"],
+                [text or "" for text in batch["documents"]],
+                [(metadata or {}).get("document_id") for metadata in batch["metadatas"]]
+            )
+            offset += len(batch["ids"])
+        index.mark_initialized()
+        logger.info(f"Index BM25 de {collection_name} reconstruit ({offset} chunks) en {time.time() - start_time:.2f} secondes")
+
+    def near_duplicate_index(self, collection_name: str) -> NearDuplicateIndex:
+        """
+        Renvoie l'index des chunks quasi identiques d'une collection
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Index LSH des signatures MinHash des chunks indexés
+        """
+        if collection_name not in self.near_duplicate_indices:
+            with self._lock:
+                if collection_name not in self.near_duplicate_indices:
+                    self.near_duplicate_indices[collection_name] = NearDuplicateIndex(
+                        os.path.join(self.collection_dir(collection_name), "near_duplicates.npz")
+                    )
+        return self.near_duplicate_indices[collection_name]
+
+    def drop_near_duplicates(
+        self,
+        collection_name: str,
+        document_id: str,
+        chunks: List[Document],
+        exclude_document_ids: List[str] = ()
+    ) -> Tuple[List[Document], List[Document]]:
+        """
+        Écarte les chunks quasi identiques à des chunks déjà indexés dans la collection
+        
+        Args:
+            collection_name: Nom de la collection
+            document_id: Identifiant du document en cours d'indexation
+            chunks: Chunks du document
+            exclude_document_ids: Documents ignorés pour la comparaison
+                (version précédente d'un document remplacé)
+            
+        Returns:
+            Chunks conservés et chunks écartés
+        """
+        if not NEAR_DUPLICATE_ENABLED:
+            return chunks, []
+        return self.near_duplicate_index(collection_name).filter_chunks(document_id, chunks, exclude_document_ids)
+
+    def flush_near_duplicates(self, collection_name: str) -> None:
+        """Enregistre l'index des quasi-doublons d'une collection une fois ses documents indexés"""
+        if NEAR_DUPLICATE_ENABLED:
+            self.near_duplicate_index(collection_name).flush()
+
+    def forget_near_duplicates(self, collection_name: str, document_ids: List[str]) -> int:
+        """
+        Retire de l'index des quasi-doublons les chunks de documents supprimés ou non indexés
+        
+        Les chunks d'autres documents écartés au profit de ces chunks
+        n'ont plus de copie dans la collection : ils sont indexés à
+        nouveau, sous leur propre document. Les statistiques de la
+        collection sont laissées à l'appelant.
+        
+        Args:
+            collection_name: Nom de la collection
+            document_ids: Documents retirés
+            
+        Returns:
+            Nombre de chunks restaurés
+        """
+        if not NEAR_DUPLICATE_ENABLED or not document_ids:
+            return 0
+        index = self.near_duplicate_index(collection_name)
+        orphans = index.remove_documents(document_ids)
+        # Regroupés par document : un chunk répété dans un même document n'est restauré qu'une fois
+        by_document: Dict[str, List[Document]] = {}
+        for chunk in orphans:
+            by_document.setdefault(chunk.metadata["document_id"], []).append(chunk)
+        restored = []
+        for document_id, chunks in by_document.items():
+            restored.extend(index.filter_chunks(document_id, chunks, restoring=True)[0])
+        try:
+            if restored:
+                self._add_to_vectorstore(restored, collection_name)
+                logger.info(
+                    f"{len(restored)} chunks écartés comme quasi-doublons restaurés dans {collection_name} "
+                    f"(documents retirés : {', '.join(document_ids)})"
+                )
+        except Exception:
+            # Pas de trace d'un chunk absent de la collection
+            index.remove_documents(list(by_document))
+            raise
+        finally:
+            index.flush()
+        return len(restored)
+
+    def near_duplicate_stats(self, collection_name: str, queries: int = NEAR_DUPLICATE_MEASURE_QUERIES) -> Dict[str, Any]:
+        """
+        Place et temps de recherche gagnés par l'élimination des chunks quasi identiques
+        
+        Le temps gagné est mesuré : des requêtes tirées des chunks indexés
+        sont chronométrées sur l'index BM25 de la collection, puis sur un
+        index temporaire des seuls chunks écartés. Une recherche ne lit que
+        les postings des termes de la requête, si bien que le second temps
+        est celui qu'ajouteraient ces chunks s'ils étaient indexés.
+        
+        Args:
+            collection_name: Nom de la collection
+            queries: Nombre de requêtes chronométrées (0 : pas de mesure)
+            
+        Returns:
+            Compteurs de l'index, octets d'embeddings non stockés, part
+            de l'index économisée et temps de recherche BM25 gagné
+        """
+        index = self.near_duplicate_index(collection_name)
+        stats = index.stats()
+        stats["enabled"] = NEAR_DUPLICATE_ENABLED
+        stats["embedding_bytes_dropped"] = stats["chunks_dropped"] * self._embedding_dimension(collection_name) * 4
+        if queries > 0:
+            stats["query_time"] = self._measure_near_duplicate_time(collection_name, index.dropped_texts(), queries)
+        return stats
+
+    def _measure_near_duplicate_time(self, collection_name: str, dropped: List[str], queries: int) -> Dict[str, Any]:
+        """Temps moyen d'une recherche BM25 avec et sans les chunks écartés"""
+        bm25_index = self.bm25_index(collection_name)
+        sample = bm25_index.sample_queries(queries)
+
+        def timed(index: BM25Index) -> float:
+            start_time = time.perf_counter()
+            for query in sample:
+                index.search(query, k=10)
+            return (time.perf_counter() - start_time) / len(sample) * 1000 if sample else 0.0
+
+        indexed_ms = timed(bm25_index)
+        dropped_ms = 0.0
+        if dropped and sample:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                dropped_index = BM25Index(os.path.join(tmp_dir, "dropped.sqlite3"))
+                try:
+                    # Coût fixe d'une recherche (termes absents) retranché : seuls
+                    # les postings des chunks écartés sont comptés
+                    dropped_index.add(["vide"], [""], [None])
+                    baseline_ms = timed(dropped_index)
+                    dropped_index.add([str(i) for i in range(len(dropped))], dropped, [None] * len(dropped))
+                    dropped_ms = max(0.0, timed(dropped_index) - baseline_ms)
+                finally:
+                    dropped_index.close()
+        total_ms = indexed_ms + dropped_ms
+        return {
+            "queries": len(sample),
+            # Chunks écartés depuis que leur texte est conservé avec l'index
+            "chunks_measured": len(dropped),
+            "bm25_query_ms": round(indexed_ms, 3),
+            "bm25_query_ms_saved": round(dropped_ms, 3),
+            "bm25_time_reduction": round(dropped_ms / total_ms, 4) if total_ms else 0.0
+        }
+
+    def get_chunking_settings(self, collection_name: str) -> ChunkingSettings:
+        """
+        Renvoie les réglages de découpage d'une collection
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Réglages du manifeste, ou réglages par défaut
+        """
+        return ChunkingSettings(**self.load_manifest(collection_name).get("chunking", {}))
+
+    def set_chunking_settings(self, collection_name: str, settings: ChunkingSettings) -> ChunkingSettings:
+        """
+        Modifie les réglages de découpage d'une collection
+        
+        Les documents déjà indexés ne sont pas redécoupés : les réglages
+        s'appliquent aux prochaines indexations.
+        
+        Args:
+            collection_name: Nom de la collection
+            settings: Nouveaux réglages
+            
+        Returns:
+            Réglages enregistrés
+            
+        Raises:
+            ValueError: Si les réglages sont invalides
+        """
+        chunker = TokenChunker(settings)
+        with self._lock:
+            manifest = self.load_manifest(collection_name)
+            manifest["chunking"] = settings.dict()
+            self._save_manifest(collection_name, manifest)
+            self.chunkers[collection_name] = chunker
+        logger.info(f"Découpage de {collection_name}: {settings.chunk_size} tokens, chevauchement {settings.chunk_overlap}")
+        return settings
+
+    def get_chunker(self, collection_name: str) -> TokenChunker:
+        """
+        Renvoie le découpeur d'une collection
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Découpeur en tokens configuré pour la collection
+        """
+        if collection_name not in self.chunkers:
+            with self._lock:
+                if collection_name not in self.chunkers:
+                    self.chunkers[collection_name] = TokenChunker(self.get_chunking_settings(collection_name))
+        return self.chunkers[collection_name]
+
+    def _get_vectorstore(self, collection_name: str):
+        """
+        Renvoie le vectorstore d'une collection, en le chargeant si nécessaire
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Le vectorstore de la collection (Chroma ou FlatVectorStore)
+        """
+        if collection_name not in self.vectorstores:
+            # Plusieurs workers d'indexation peuvent ouvrir la même collection
+            with self._lock:
+                if collection_name not in self.vectorstores:
+                    engine = get_embedding_engine(self._resolve_embedding_model(collection_name))
+                    backend = self._resolve_vector_backend(collection_name)
+                    if backend in ("flat", "ivf"):
+                        vectorstore = FlatVectorStore(
+                            os.path.join(self.collection_dir(collection_name), "flat"),
+                            engine,
+                            index="ivf" if backend == "ivf" else None,
+                            quantization=self.load_manifest(collection_name).get("quantization")
+                        )
+                    else:
+                        from langchain.vectorstores import Chroma
+                        vectorstore = Chroma(
+                            client=self.chroma_client,
+                            collection_name=collection_name,
+                            embedding_function=engine,
+                            persist_directory=VECTORS_DIR
+                        )
+                    self.vectorstores[collection_name] = vectorstore
+                    self._init_collection_stats(collection_name, vectorstore._collection)
+        return self.vectorstores[collection_name]
+
+    def initialize(self) -> None:
+        """
+        Ouvre le client ChromaDB, complète les statistiques des anciennes
+        collections et précharge les modules d'indexation et de recherche
+        
+        Appelée en tâche de fond au démarrage pour que la première requête
+        ne paie pas ces coûts.
+        """
+        self.chroma_client
+        self._migrate_collection_stats()
+        TokenChunker()
+        from langchain.vectorstores import Chroma  # noqa: F401
+
+    def _migrate_collection_stats(self) -> None:
+        """
+        Calcule une fois les statistiques des collections qui n'en ont pas encore
+        
+        Les collections créées avant les statistiques du manifeste sont
+        parcourues une seule fois ; ensuite, seules les écritures et
+        suppressions les tiennent à jour.
+        """
+        if self._stats_migrated:
+            return
+        with self._lock:
+            if self._stats_migrated:
+                return
+            for col in self.chroma_client.list_collections():
+                if not COLLECTION_NAME_PATTERN.fullmatch(col.name):
+                    logger.warning(f"Collection ChromaDB {col.name} ignorée : nom invalide")
+                    continue
+                if "stats" not in self.load_manifest(col.name):
+                    self._get_vectorstore(col.name)
+            self._stats_migrated = True
+
+    def _init_collection_stats(self, collection_name: str, collection: Any) -> None:
+        """Crée les statistiques d'une collection à son ouverture (verrou déjà pris)"""
+        manifest = self.load_manifest(collection_name)
+        if "stats" in manifest:
+            return
+        legacy_documents = set()
+        if collection.count():
+            # Collection antérieure aux statistiques : un seul parcours de ses métadonnées
+            logger.info(f"Calcul des statistiques de la collection {collection_name}")
+            for metadata in collection.get(include=["metadatas"])["metadatas"] or []:
+                metadata = metadata or {}
+                if "document_id" not in metadata and metadata.get("source", "init") != "init":
+                    legacy_documents.add(metadata["source"])
+        manifest["stats"] = {"legacy_document_count": len(legacy_documents)}
+        self._save_manifest(collection_name, manifest)
+        self.update_collection_stats(collection_name)
+
+    def update_collection_stats(self, collection_name: str) -> Dict[str, Any]:
+        """
+        Met à jour les statistiques du manifeste d'une collection
+        
+        Appelée une fois par document indexé, lot d'indexation ou
+        suppression (pas à chaque lot de chunks écrit) : le nombre de chunks
+        est compté dans l'index BM25 sur disque (écrit dans la même opération,
+        y compris par un autre processus), le nombre de documents est celui
+        du registre. La version de la collection est incrémentée, ce qui
+        écarte les réponses en cache. La génération, tirée à la création des
+        statistiques, distingue une collection recréée sous le même nom.
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            Statistiques enregistrées
+        """
+        with self._lock:
+            manifest = self.load_manifest(collection_name)
+            stats = manifest.setdefault("stats", {})
+            index_dir = self.collection_dir(collection_name)
+            chunk_count = self.bm25_index(collection_name).count_chunks()
+            dimension = self._embedding_dimension(collection_name, stats)
+            if dimension:
+                stats["embedding_dimension"] = dimension
+            stats.update(
+                document_count=len(self.document_registry(collection_name)) + stats.get("legacy_document_count", 0),
+                chunk_count=chunk_count,
+                last_updated=datetime.now().isoformat(),
+                size_bytes=self._collection_size(collection_name, index_dir, chunk_count * dimension * 4),
+                version=stats.get("version", 0) + 1
+            )
+            # Collections antérieures à la génération : tirée à leur prochaine mise à jour
+            stats.setdefault("generation", uuid.uuid4().hex)
+            self._save_manifest(collection_name, manifest)
+        return stats
+
+    def _embedding_dimension(self, collection_name: str, stats: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Dimension des vecteurs d'une collection
+        
+        Celle du moteur d'embedding une fois son modèle chargé (0 avant),
+        sinon celle retenue dans les statistiques du manifeste, sinon celle
+        d'un vecteur stocké : le modèle n'est pas chargé pour la connaître.
+        """
+        vectorstore = self._get_vectorstore(collection_name)
+        dimension = getattr(vectorstore.embeddings, "dimension", 0)
+        if not dimension:
+            if stats is None:
+                stats = self.load_manifest(collection_name).get("stats", {})
+            dimension = stats.get("embedding_dimension", 0)
+        if not dimension:
+            stored = vectorstore._collection.get(limit=1, include=["embeddings"]).get("embeddings")
+            dimension = len(stored[0]) if stored else 0
+        return dimension
+
+    def _collection_size(self, collection_name: str, index_dir: str, vector_bytes: int) -> int:
+        """Taille sur disque des fichiers d'une collection (vecteurs ChromaDB estimés)"""
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(index_dir)
+            for name in names
+        )
+        if not isinstance(self.vectorstores.get(collection_name), FlatVectorStore):
+            # Les vecteurs float32 stockés par ChromaDB, hors de indices/
+            size += vector_bytes
+        return size
+
+    def has_collection(self, collection_name: str) -> bool:
+        """
+        Indique si une collection existe, sans interroger ChromaDB
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            True si la collection existe
+        """
+        # Le manifeste suffit, sauf pour une collection ChromaDB antérieure aux statistiques
+        if "stats" in self.load_manifest(collection_name):
+            return True
+        self._migrate_collection_stats()
+        return "stats" in self.load_manifest(collection_name)
+
+    def collection_version(self, collection_name: str) -> Optional[Tuple[Optional[str], int]]:
+        """
+        Génération et version d'une collection
+        
+        La génération est tirée à la création de la collection, la version
+        incrémentée à chaque écriture ou suppression. Lues dans le
+        manifeste : une écriture, une suppression ou une recréation faite
+        par un autre processus est aussi prise en compte.
+        
+        Args:
+            collection_name: Nom de la collection
+            
+        Returns:
+            (génération, version), ou None si la collection n'existe pas
+        """
+        self._migrate_collection_stats()
+        stats = self.load_manifest(collection_name).get("stats")
+        return None if stats is None else (stats.get("generation"), stats.get("version", 0))
+
     def list_collections(self) -> List[RagCollection]:
         """
         Liste toutes les collections disponibles
         
+        Les statistiques sont lues dans le manifeste de chaque collection,
+        sans parcourir ses chunks.
+        
         Returns:
             Liste des collections RAG
         """
+        self._migrate_collection_stats()
         collections = []
-        for col in self.chroma_client.list_collections():
-            col_name = col.name
-            try:
-                collection = self.chroma_client.get_collection(col_name)
-                document_count = len(set([m.get('source', '') for m in collection.get()['metadatas'] or []]))
-                chunk_count = collection.count()
-                
-                collections.append(RagCollection(
-                    name=col_name,
-                    document_count=document_count,
-                    chunk_count=chunk_count
-                ))
-            except Exception as e:
-                logger.error(f"Erreur lors de la récupération de la collection {col_name}: {e}")
+        for col_name in sorted(
+            entry.name for entry in os.scandir(INDICES_DIR)
+            if entry.is_dir() and COLLECTION_NAME_PATTERN.fullmatch(entry.name)
+        ):
+            manifest = self.load_manifest(col_name)
+            stats = manifest.get("stats")
+            if stats is None:
+                continue
+            collections.append(RagCollection(
+                name=col_name,
+                document_count=stats.get("document_count", 0),
+                chunk_count=stats.get("chunk_count", 0),
+                last_updated=stats.get("last_updated"),
+                embedding_model=manifest.get("embedding_model"),
+                vector_backend=manifest.get("vector_backend"),
+                quantization=manifest.get("quantization"),
+                size_bytes=stats.get("size_bytes", 0)
+            ))
         
         return collections
 
-    def process_file(self, file_path: str, collection_name: str) -> RagDocument:
+    def process_file(
+        self,
+        file_path: str,
+        collection_name: str,
+        progress: Optional[Callable[..., None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        content_hash: Optional[str] = None,
+        filename: Optional[str] = None
+    ) -> RagDocument:
         """
         Traite un fichier pour l'indexation
         
+        Un contenu déjà indexé dans la collection n'est pas réindexé. Un
+        document de même nom mais de contenu différent remplace l'ancien,
+        dont les chunks sont retirés.
+        
         Args:
             file_path: Chemin vers le fichier à traiter
             collection_name: Nom de la collection dans laquelle indexer le document
+            progress: Fonction appelée avec les compteurs d'avancement
+                (`pages_parsed`, `chunks_total`, `chunks_embedded`, `chunks_written`)
+            should_cancel: Fonction indiquant si l'indexation doit être annulée
+            content_hash: Empreinte du contenu, si déjà calculée à la réception
+            filename: Nom d'origine du fichier (par défaut, celui du chemin)
             
         Returns:
             Document RAG créé
@@ -236,7 +837,20 @@ class RAGSystem:
         
         # Création d'un ID unique pour le document
         doc_id = str(uuid.uuid4())
-        filename = os.path.basename(file_path)
+        filename = filename or os.path.basename(file_path)
+        content_hash = content_hash or hash_file(file_path)
+        
+        # Un contenu déjà indexé (ou en cours d'indexation) n'est pas repris
+        registry = self.document_registry(collection_name)
+        if not registry.claim(content_hash):
+            existing = registry.get(content_hash)
+            logger.info(f"Document {filename} déjà indexé dans {collection_name}, ignoré")
+            return RagDocument(
+                id=existing["document_id"] if existing else doc_id,
+                filename=filename,
+                metadata={"source": file_path, "filename": filename, "content_hash": content_hash},
+                status="duplicate"
+            )
         
         # Initialisation du document RAG
         rag_doc = RagDocument(
@@ -245,20 +859,36 @@ class RAGSystem:
             metadata={
                 "source": file_path,
                 "filename": filename,
+                "content_hash": content_hash,
                 "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
             },
             status="processing"
         )
         
         try:
-            # Utilisation du chargeur approprié
-            loader = get_loader_for_file(file_path)
-            documents = loader.load()
+            # Analyse du fichier, répartie par plages de pages sur le pool de processus
+            documents = document_parser.parse_file(file_path, progress=progress)
             logger.info(f"Fichier {filename} chargé avec succès: {len(documents)} pages/sections")
             
-            # Découpage en chunks
-            chunks = self.text_splitter.split_documents(documents)
-            logger.info(f"Document découpé en {len(chunks)} chunks")
+            if should_cancel is not None and should_cancel():
+                raise IngestionCancelled(f"Indexation de {filename} annulée")
+            
+            # Découpage en chunks, selon les réglages de la collection ;
+            # chaque chunk référence son document d'origine
+            chunks = self.get_chunker(collection_name).split_documents(documents)
+            for chunk in chunks:
+                chunk.metadata["document_id"] = doc_id
+                chunk.metadata["content_hash"] = content_hash
+            
+            # Chunks quasi identiques à des chunks déjà indexés (en-têtes, pieds de page...) écartés ;
+            # la version précédente d'un document remplacé ne compte pas, elle va être retirée
+            previous = registry.get_by_filename(filename)
+            replaced_ids = [previous["document_id"]] if previous and previous["content_hash"] != content_hash else []
+            chunks, dropped = self.drop_near_duplicates(collection_name, doc_id, chunks, replaced_ids)
+            rag_doc.metadata["chunks_dropped"] = len(dropped)
+            logger.info(f"Document découpé en {len(chunks)} chunks ({len(dropped)} quasi-doublons écartés)")
+            if progress is not None:
+                progress(chunks_total=len(chunks), chunks_dropped=len(dropped))
             
             # Stockage des chunks dans le document RAG
             rag_doc.chunks = [{
@@ -268,7 +898,21 @@ class RAGSystem:
             } for chunk in chunks]
             
             # Création ou mise à jour de la collection ChromaDB
-            self._add_to_vectorstore(chunks, collection_name)
+            self._add_to_vectorstore(
+                chunks,
+                collection_name,
+                ids=[chunk["id"] for chunk in rag_doc.chunks],
+                progress=progress,
+                should_cancel=should_cancel
+            )
+            
+            # Enregistrement, et retrait de la version précédente du document
+            replaced = registry.register(content_hash, doc_id, filename, file_path, len(chunks))
+            if replaced is not None:
+                self.remove_replaced_document(collection_name, replaced)
+                rag_doc.metadata["replaced_document_id"] = replaced["document_id"]
+            self.flush_near_duplicates(collection_name)
+            self.update_collection_stats(collection_name)
             
             # Mise à jour du statut
             rag_doc.status = "indexed"
@@ -276,42 +920,384 @@ class RAGSystem:
             
             return rag_doc
             
+        except IngestionCancelled as e:
+            registry.release(content_hash)
+            if self.forget_near_duplicates(collection_name, [doc_id]):
+                self.update_collection_stats(collection_name)
+            logger.info(f"Indexation du fichier {filename} annulée")
+            rag_doc.status = "cancelled"
+            rag_doc.metadata["error"] = str(e)
+            return rag_doc
+            
         except Exception as e:
+            registry.release(content_hash)
+            if self.forget_near_duplicates(collection_name, [doc_id]):
+                self.update_collection_stats(collection_name)
             logger.error(f"Erreur lors du traitement du fichier {filename}: {str(e)}")
             rag_doc.status = "failed"
             rag_doc.metadata["error"] = str(e)
             return rag_doc
 
-    def _add_to_vectorstore(self, chunks: List[Document], collection_name: str) -> None:
+    def warm_up(self, collection_names: Optional[List[str]] = None) -> Dict[str, float]:
+        """
+        Préchauffe le système RAG avant la première requête réelle
+        
+        Charge l'encodage tiktoken, amorce le modèle d'embedding et exécute
+        une requête factice sur chaque collection pour ouvrir ses index.
+        
+        Args:
+            collection_names: Collections à préchauffer (toutes si None)
+            
+        Returns:
+            Durée de préchauffage de chaque collection, en secondes
+        """
+        get_token_encoding()
+        self.embedding_model.encode(["initialisation"])
+        
+        available = [col.name for col in self.list_collections()]
+        if collection_names is None:
+            collection_names = available
+        
+        timings = {}
+        for name in collection_names:
+            if name not in available:
+                logger.warning(f"Collection {name} introuvable, préchauffage ignoré")
+                continue
+            start_time = time.time()
+            self.query(RagQuery(query="initialisation", collection_name=name, top_k=1))
+            timings[name] = round(time.time() - start_time, 3)
+            logger.info(f"Collection {name} préchauffée en {timings[name]:.2f} secondes")
+        
+        return timings
+
+    def create_collection(
+        self,
+        collection_name: str,
+        documents: Optional[List[Document]] = None,
+        vector_backend: Optional[str] = None,
+        quantization: Optional[str] = None
+    ) -> None:
+        """
+        Crée une collection, éventuellement avec des documents initiaux
+        
+        Args:
+            collection_name: Nom de la collection
+            documents: Documents à indexer; à défaut, un document vide
+                d'initialisation est ajouté pour matérialiser la collection
+            vector_backend: Stockage vectoriel ("chroma", "flat" ou "ivf"; VECTOR_BACKEND par défaut)
+            quantization: Quantification des vecteurs d'une collection "flat"
+                ("int8" ou "binary"; VECTOR_QUANTIZATION par défaut)
+            
+        Raises:
+            ValueError: Si le stockage ou la quantification demandés sont inconnus,
+                ou si la quantification est demandée pour un autre stockage que "flat"
+        """
+        if (vector_backend is not None or quantization is not None) and not self.has_collection(collection_name):
+            if vector_backend is not None and vector_backend not in VECTOR_BACKENDS:
+                raise ValueError(f"Stockage vectoriel inconnu: {vector_backend} (choix: {', '.join(VECTOR_BACKENDS)})")
+            if quantization is not None:
+                if quantization not in QUANTIZERS:
+                    raise ValueError(f"Quantification inconnue: {quantization} (choix: {', '.join(QUANTIZERS)})")
+                if (vector_backend or VECTOR_BACKEND) != "flat":
+                    raise ValueError("La quantification ne s'applique qu'au stockage flat")
+            with self._lock:
+                manifest = self.load_manifest(collection_name)
+                manifest["vector_backend"] = vector_backend or VECTOR_BACKEND
+                if manifest["vector_backend"] == "flat":
+                    manifest["quantization"] = quantization or VECTOR_QUANTIZATION
+                self._save_manifest(collection_name, manifest)
+        if not documents:
+            documents = [Document(page_content="", metadata={"source": "init"})]
+        self._add_to_vectorstore(documents, collection_name)
+
+    def _add_to_vectorstore(
+        self,
+        chunks: List[Document],
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        progress: Optional[Callable[..., None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> None:
         """
         Ajoute des chunks à une collection du vectorstore
         
+        Les chunks sont encodés puis écrits par lots de INGEST_BATCH_SIZE.
+        En cas d'erreur ou d'annulation, les chunks déjà écrits sont retirés
+        pour ne pas laisser un document à moitié indexé.
+        
         Args:
             chunks: Liste des chunks à ajouter
             collection_name: Nom de la collection
+            ids: Identifiants des chunks (générés si absents)
+            progress: Fonction appelée avec les compteurs `chunks_embedded`
+                et `chunks_written` après chaque lot
+            should_cancel: Fonction indiquant si l'indexation doit être annulée
         """
-        # Création du vectorstore s'il n'existe pas déjà
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in chunks]
+        
+        written_ids = []
         try:
-            vectorstore = Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embedding_model,
-                persist_directory=VECTORS_DIR
-            )
+            # Création du vectorstore s'il n'existe pas déjà
+            vectorstore = self._get_vectorstore(collection_name)
+            engine = vectorstore.embeddings
             
-            # Ajout des documents
-            vectorstore.add_documents(chunks)
+            for start in range(0, len(chunks), INGEST_BATCH_SIZE):
+                if should_cancel is not None and should_cancel():
+                    raise IngestionCancelled(f"Indexation annulée après {len(written_ids)} chunks")
+                
+                batch = chunks[start:start + INGEST_BATCH_SIZE]
+                batch_ids = ids[start:start + INGEST_BATCH_SIZE]
+                
+                # Encodage du lot
+                embeddings = engine.embed_documents([chunk.page_content for chunk in batch])
+                if progress is not None:
+                    progress(chunks_embedded=start + len(batch))
+                
+                # Écriture du lot avec les vecteurs déjà calculés
+                self.write_chunks(collection_name, batch_ids, embeddings, batch)
+                written_ids.extend(batch_ids)
+                if progress is not None:
+                    progress(chunks_written=len(written_ids))
             
             # Persistance
             vectorstore.persist()
             
-            # Stockage du vectorstore en mémoire
-            self.vectorstores[collection_name] = vectorstore
-            
             logger.info(f"Collection {collection_name} mise à jour avec {len(chunks)} nouveaux chunks")
         except Exception as e:
-            logger.error(f"Erreur lors de l'ajout à la collection {collection_name}: {str(e)}")
+            self.delete_chunks(collection_name, written_ids)
+            if isinstance(e, IngestionCancelled):
+                logger.info(f"Ajout à la collection {collection_name} annulé")
+            else:
+                logger.error(f"Erreur lors de l'ajout à la collection {collection_name}: {str(e)}")
             raise
 
+    def write_chunks(
+        self,
+        collection_name: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        chunks: List[Document]
+    ) -> None:
+        """
+        Écrit des chunks dont les vecteurs sont déjà calculés
+        
+        Les statistiques de la collection ne sont pas mises à jour : l'appelant
+        le fait une fois le document ou le lot entièrement écrit.
+        
+        Args:
+            collection_name: Nom de la collection
+            ids: Identifiants des chunks
+            embeddings: Vecteurs des chunks
+            chunks: Chunks (texte et métadonnées)
+        """
+        bm25_index = self.bm25_index(collection_name)
+        self._get_vectorstore(collection_name)._collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            metadatas=[chunk.metadata for chunk in chunks],
+            documents=[chunk.page_content for chunk in chunks]
+        )
+        bm25_index.add(ids, [chunk.page_content for chunk in chunks], [chunk.metadata.get("document_id") for chunk in chunks])
+
+    def delete_chunks(self, collection_name: str, ids: List[str]) -> None:
+        """
+        Retire des chunks d'une collection (ex: indexation annulée)
+        
+        Args:
+            collection_name: Nom de la collection
+            ids: Identifiants des chunks à retirer
+        """
+        if not ids:
+            return
+        self._get_vectorstore(collection_name)._collection.delete(ids=ids)
+        self.bm25_index(collection_name).remove_chunks(ids)
+        self.update_collection_stats(collection_name)
+        logger.info(f"{len(ids)} chunks retirés de la collection {collection_name}")
+
+    def get_chunks(self, collection_name: str, ids: List[str]) -> List[Document]:
+        """
+        Lit des chunks par identifiant
+        
+        Args:
+            collection_name: Nom de la collection
+            ids: Identifiants des chunks
+            
+        Returns:
+            Chunks trouvés, dans l'ordre des identifiants
+        """
+        found = self._fetch_chunks(collection_name, ids)
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def _fetch_chunks(self, collection_name: str, ids: List[str]) -> Dict[str, Document]:
+        """Chunks trouvés, par identifiant (en une seule lecture)"""
+        if not ids:
+            return {}
+        result = self._get_vectorstore(collection_name)._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            chunk_id: Document(page_content=text or "", metadata=metadata or {})
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+
+    def _fetch_embeddings(self, collection_name: str, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Vecteurs stockés des chunks, par identifiant (sans recalculer d'embedding)"""
+        if not ids:
+            return {}
+        result = self._get_vectorstore(collection_name)._collection.get(ids=ids, include=["embeddings"])
+        return {
+            chunk_id: np.asarray(vector, dtype=np.float32)
+            for chunk_id, vector in zip(result["ids"], result["embeddings"])
+        }
+
+    def _vector_search(
+        self,
+        collection_name: str,
+        vectors: np.ndarray,
+        k: int,
+        filter: Optional[Dict] = None,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Recherche vectorielle de plusieurs requêtes déjà encodées, sans lire le texte des chunks
+        
+        Returns:
+            Pour chaque requête : (identifiant du chunk, similarité cosinus), par similarité décroissante
+        """
+        vectorstore = self._get_vectorstore(collection_name)
+        if isinstance(vectorstore, FlatVectorStore):
+            # Un seul produit matriciel pour toutes les requêtes
+            result = vectorstore.query(vectors, n_results=k, where=filter or None, include=[], nprobe=nprobe)
+            return [
+                [(chunk_id, 1.0 - distance) for chunk_id, distance in zip(ids, distances)]
+                for ids, distances in zip(result["ids"], result["distances"])
+            ]
+        
+        collection = vectorstore._collection
+        result = collection.query(query_embeddings=vectors.tolist(), n_results=k, where=filter or None, include=["distances"])
+        space = (getattr(collection, "metadata", None) or {}).get("hnsw:space")
+        return [
+            list(zip(ids, distances_to_similarities(distances, space)))
+            for ids, distances in zip(result["ids"], result["distances"])
+        ]
+
+    def _vector_search_batch(self, rag_queries: List[RagQuery], plans: List[QueryPlan]) -> List[List[Tuple[str, float]]]:
+        """
+        Recherches vectorielles d'un lot de requêtes
+        
+        Les requêtes d'une même collection sont encodées en un seul lot ;
+        celles qui partagent aussi filtre et nprobe sont cherchées ensemble.
+        
+        Returns:
+            Pour chaque requête : (identifiant du chunk, similarité cosinus), par similarité décroissante
+        """
+        by_collection: Dict[str, List[int]] = {}
+        for i, rag_query in enumerate(rag_queries):
+            by_collection.setdefault(rag_query.collection_name, []).append(i)
+        # Chaque collection a son modèle d'embedding : un lot d'encodage par collection
+        vectors: Dict[int, np.ndarray] = {}
+        for collection_name, indices in by_collection.items():
+            embeddings = self._get_vectorstore(collection_name).embeddings.embed_queries(
+                [rag_queries[i].query for i in indices]
+            )
+            vectors.update(zip(indices, np.asarray(embeddings, dtype=np.float32)))
+        
+        groups: Dict[Tuple[str, str, Optional[int]], List[int]] = {}
+        for i, rag_query in enumerate(rag_queries):
+            key = (rag_query.collection_name, json.dumps(rag_query.filter or {}, sort_keys=True), plans[i].nprobe)
+            groups.setdefault(key, []).append(i)
+        results: List[List[Tuple[str, float]]] = [[] for _ in rag_queries]
+        for indices in groups.values():
+            first = rag_queries[indices[0]]
+            hits = self._vector_search(
+                first.collection_name,
+                np.stack([vectors[i] for i in indices]),
+                max(plans[i].candidates for i in indices),
+                first.filter,
+                plans[indices[0]].nprobe
+            )
+            for i, query_hits in zip(indices, hits):
+                results[i] = query_hits[:plans[i].candidates]
+        return results
+
+    def _bm25_search(
+        self,
+        collection_name: str,
+        query: str,
+        k: int,
+        filter: Optional[Dict] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Recherche lexicale sur l'index BM25 persistant : seuls les postings
+        des termes de la requête sont lus
+        
+        Returns:
+            (identifiant du chunk, score BM25), par score décroissant
+        """
+        hits = self.bm25_index(collection_name).search(query, k)
+        if filter and hits:
+            # L'index BM25 ne connaît pas les métadonnées : le filtre est vérifié par le vectorstore
+            allowed = set(self._get_vectorstore(collection_name)._collection.get(
+                ids=[chunk_id for chunk_id, _ in hits], where=filter, include=[]
+            )["ids"])
+            hits = [(chunk_id, score) for chunk_id, score in hits if chunk_id in allowed]
+        return hits
+
+    def ann_report(self, collection_name: str, queries: int = 100, k: int = 10) -> Dict[str, Any]:
+        """
+        Rappel et latence de la recherche approchée d'une collection "ivf"
+        (pour chaque valeur de `nprobe`) ou quantifiée, face à la recherche
+        exacte sur les mêmes vecteurs
+
+        Args:
+            collection_name: Nom de la collection
+            queries: Nombre de requêtes (vecteurs de la collection tirés au hasard)
+            k: Nombre de voisins par requête
+
+        Returns:
+            Rapport rappel/latence (voir `FlatVectorStore.recall_report`)
+        """
+        vectorstore = self._get_vectorstore(collection_name)
+        if not isinstance(vectorstore, FlatVectorStore) or (vectorstore.ivf is None and not vectorstore.quantization):
+            raise ValueError(f"La collection '{collection_name}' n'utilise ni le stockage ivf ni la quantification")
+        return vectorstore.recall_report(queries=queries, k=k)
+
+    def delete_document(self, collection_name: str, document_id: str, update_stats: bool = True) -> None:
+        """
+        Retire tous les chunks d'un document d'une collection
+        
+        Args:
+            collection_name: Nom de la collection
+            document_id: Identifiant du document
+            update_stats: Mettre à jour les statistiques de la collection
+                (False si l'appelant le fait ensuite)
+        """
+        self._get_vectorstore(collection_name)._collection.delete(where={"document_id": document_id})
+        self.bm25_index(collection_name).remove_document(document_id)
+        self.forget_near_duplicates(collection_name, [document_id])
+        if update_stats:
+            self.update_collection_stats(collection_name)
+        logger.info(f"Document {document_id} retiré de la collection {collection_name}")
+
+    def remove_replaced_document(self, collection_name: str, replaced: Dict[str, Any]) -> None:
+        """
+        Retire la version précédente d'un document remplacé
+        
+        Ses chunks sont retirés de la collection et son fichier, s'il a été
+        téléversé, est supprimé de DOCUMENTS_DIR. Les statistiques sont mises
+        à jour par l'appelant, une fois le nouveau document enregistré.
+        
+        Args:
+            collection_name: Nom de la collection
+            replaced: Entrée du registre renvoyée par `DocumentRegistry.register`
+        """
+        self.delete_document(collection_name, replaced["document_id"], update_stats=False)
+        source = os.path.abspath(replaced.get("source", ""))
+        if source.startswith(os.path.abspath(DOCUMENTS_DIR) + os.sep):
+            try:
+                os.remove(source)
+            except OSError:
+                pass
+
     def query(self, rag_query: RagQuery) -> RagResponse:
         """
         Interroge une collection RAG pour trouver du contexte pertinent
@@ -322,99 +1308,174 @@ class RAGSystem:
         Returns:
             Réponse RAG avec le contexte et les sources
         """
+        return self.query_batch([rag_query])[0]
+
+    def query_batch(self, rag_queries: List[RagQuery]) -> List[RagResponse]:
+        """
+        Interroge des collections RAG pour plusieurs requêtes à la fois
+        
+        Les requêtes absentes du cache sont encodées en un seul lot par
+        collection et cherchées ensemble (un seul produit matriciel avec le
+        stockage plat) ; leurs recherches BM25 sont menées en parallèle dans
+        les threads de recherche, pendant l'encodage et la recherche vectorielle.
+        
+        Args:
+            rag_queries: Requêtes RAG (une requête invalide fait échouer le lot)
+            
+        Returns:
+            Réponses RAG, dans l'ordre des requêtes
+        """
         start_time = time.time()
         
         try:
-            # Récupérer la collection
-            if rag_query.collection_name not in [col.name for col in self.list_collections()]:
-                raise ValueError(f"Collection '{rag_query.collection_name}' non trouvée")
-            
-            # Charger le vectorstore s'il n'est pas déjà en mémoire
-            if rag_query.collection_name not in self.vectorstores:
-                self.vectorstores[rag_query.collection_name] = Chroma(
-                    collection_name=rag_query.collection_name,
-                    embedding_function=self.embedding_model,
-                    persist_directory=VECTORS_DIR
-                )
-            
-            vectorstore = self.vectorstores[rag_query.collection_name]
+            plans = [self._plan_query(rag_query) for rag_query in rag_queries]
             
-            # Créer un retriever BM25 pour la recherche hybride
-            if rag_query.hybrid_search:
-                # Récupérer tous les documents de la collection
-                documents = vectorstore.get()["documents"]
-                metadatas = vectorstore.get()["metadatas"]
-                ids = vectorstore.get()["ids"]
-                
-                # Créer des objets Document pour le retriever BM25
-                langchain_docs = []
-                for i, doc in enumerate(documents):
-                    langchain_docs.append(Document(
-                        page_content=doc,
-                        metadata=metadatas[i] if metadatas and i < len(metadatas) else {}
-                    ))
-                
-                # Créer le retriever BM25
-                bm25_retriever = BM25Retriever.from_documents(langchain_docs)
-                bm25_retriever.k = rag_query.top_k
-                
-                # Créer un retriever pour le vectorstore
-                vector_retriever = vectorstore.as_retriever(search_kwargs={"k": rag_query.top_k})
-                
-                # Créer un retriever d'ensemble
-                ensemble_retriever = EnsembleRetriever(
-                    retrievers=[bm25_retriever, vector_retriever],
-                    weights=[0.5, 0.5]
-                )
-                
-                # Récupérer les documents
-                retrieved_docs = ensemble_retriever.get_relevant_documents(rag_query.query)
-            else:
-                # Utiliser uniquement la recherche vectorielle
-                retrieved_docs = vectorstore.similarity_search(
-                    rag_query.query,
-                    k=rag_query.top_k,
-                    filter=rag_query.filter
-                )
+            # Même requête normalisée et mêmes réglages sur la même version : réponse en cache
+            responses: List[Optional[RagResponse]] = []
+            for rag_query, plan in zip(rag_queries, plans):
+                cached = self.query_cache.get(plan.cache_key)
+                responses.append(None if cached is None else RagResponse(
+                    query=rag_query.query,
+                    contexts=list(cached.contexts),
+                    sources=copy.deepcopy(cached.sources),
+                    elapsed_time=time.time() - start_time
+                ))
+            pending = [i for i, response in enumerate(responses) if response is None]
+            if not pending:
+                return responses
             
-            # Extraire le contexte et les sources
-            contexts = []
-            sources = []
+            # Recherches BM25 dans les autres threads, pendant les recherches vectorielles
+            bm25_futures = {}
+            for i in pending:
+                rag_query = rag_queries[i]
+                if rag_query.hybrid_search:
+                    bm25_futures[i] = self.search_executor.submit(
+                        self._bm25_search, rag_query.collection_name, rag_query.query, plans[i].candidates, rag_query.filter
+                    )
+            vector_hits = self._vector_search_batch([rag_queries[i] for i in pending], [plans[i] for i in pending])
             
-            for i, doc in enumerate(retrieved_docs):
-                # Ajouter le contenu au contexte
-                contexts.append(doc.page_content)
-                
-                # Calculer un score pour chaque source (basé sur leur position relative)
-                # Plus le document est haut dans la liste, plus son score est élevé
-                score = 1.0 - (i / len(retrieved_docs)) if len(retrieved_docs) > 1 else 1.0
-                
-                # Ajouter les métadonnées du document
-                metadata = doc.metadata.copy() if hasattr(doc, 'metadata') else {}
-                
-                # Ajouter le score aux métadonnées
-                metadata["score"] = score
-                
-                # Ajouter aux sources
-                sources.append({
-                    "content": doc.page_content,
-                    "metadata": metadata
-                })
-            
-            # Calculer le temps d'exécution
-            elapsed_time = time.time() - start_time
-            
-            # Créer et retourner la réponse RAG
-            return RagResponse(
-                query=rag_query.query,
-                contexts=contexts,
-                sources=sources,
-                elapsed_time=elapsed_time
-            )
+            for i, hits in zip(pending, vector_hits):
+                bm25_hits = bm25_futures[i].result() if i in bm25_futures else None
+                responses[i] = self._build_response(rag_queries[i], plans[i], hits, bm25_hits, start_time)
+            return responses
         except Exception as e:
             logger.error(f"Erreur lors de l'interrogation RAG: {str(e)}")
             raise
 
+    def _plan_query(self, rag_query: RagQuery) -> QueryPlan:
+        """Vérifie une requête et résout ses réglages (clé de cache, candidats, reclassement)"""
+        # Récupérer la collection
+        version = self.collection_version(rag_query.collection_name)
+        if version is None:
+            raise ValueError(f"Collection '{rag_query.collection_name}' non trouvée")
+        
+        reranker = get_reranker() if rag_query.rerank is not False else None
+        if rag_query.rerank and reranker is None:
+            raise ValueError("Aucun modèle de reclassement configuré (RERANK_MODEL)")
+        if rag_query.mmr_lambda is not None and not 0.0 <= rag_query.mmr_lambda <= 1.0:
+            raise ValueError("mmr_lambda doit être compris entre 0 et 1")
+        
+        # Réglage rappel/latence de l'index IVF (sans effet sur les autres stockages)
+        vectorstore = self._get_vectorstore(rag_query.collection_name)
+        nprobe = rag_query.nprobe if isinstance(vectorstore, FlatVectorStore) else None
+        # Avec reclassement ou MMR, la recherche fournit davantage de candidats que top_k
+        keep = max(rag_query.top_k, RERANK_CANDIDATES) if reranker else rag_query.top_k
+        if rag_query.mmr_lambda is not None:
+            keep = max(keep, MMR_CANDIDATES)
+        
+        return QueryPlan(
+            cache_key=cache_key(
+                rag_query.collection_name,
+                *version,
+                rag_query.query,
+                rag_query.dict(exclude={"query", "collection_name"})
+            ),
+            reranker=reranker,
+            nprobe=nprobe,
+            keep=keep,
+            candidates=keep * HYBRID_CANDIDATES if rag_query.hybrid_search else keep
+        )
+
+    def _build_response(
+        self,
+        rag_query: RagQuery,
+        plan: QueryPlan,
+        vector_hits: List[Tuple[str, float]],
+        bm25_hits: Optional[List[Tuple[str, float]]],
+        start_time: float
+    ) -> RagResponse:
+        """
+        Fusionne les résultats des recherches d'une requête, lit les chunks
+        retenus puis les reclasse et les diversifie si demandé
+        
+        Args:
+            rag_query: Requête RAG
+            plan: Réglages résolus de la requête
+            vector_hits: Résultats de la recherche vectorielle
+            bm25_hits: Résultats de la recherche BM25 (None sans recherche hybride)
+            start_time: Début du traitement de la requête
+            
+        Returns:
+            Réponse RAG, mise en cache
+        """
+        collection_name = rag_query.collection_name
+        if bm25_hits is not None:
+            scored = fuse(bm25_hits, vector_hits, rag_query.fusion, rag_query.vector_weight)
+        else:
+            scored = [ScoredChunk(chunk_id, score, vector_score=score) for chunk_id, score in vector_hits]
+        
+        if rag_query.min_score is not None:
+            scored = [chunk for chunk in scored if chunk.score >= rag_query.min_score]
+        scored = scored[:plan.keep]
+        
+        # Seuls les chunks retenus sont lus
+        chunks = self._fetch_chunks(collection_name, [chunk.chunk_id for chunk in scored])
+        retrieved = [(chunk, chunks[chunk.chunk_id], None) for chunk in scored if chunk.chunk_id in chunks]
+        if plan.reranker is not None and retrieved:
+            # Tous les candidats notés en un seul lot par le cross-encoder
+            rerank_scores = plan.reranker.score(rag_query.query, [doc.page_content for _, doc, _ in retrieved])
+            retrieved = sorted(
+                ((chunk, doc, score) for (chunk, doc, _), score in zip(retrieved, rerank_scores)),
+                key=lambda item: item[2],
+                reverse=True
+            )
+        if rag_query.mmr_lambda is not None and len(retrieved) > rag_query.top_k:
+            # Pertinence : score du cross-encoder s'il a noté les chunks, sinon score de la recherche
+            embeddings = self._fetch_embeddings(collection_name, [chunk.chunk_id for chunk, _, _ in retrieved])
+            retrieved = [item for item in retrieved if item[0].chunk_id in embeddings]
+            selected = maximal_marginal_relevance(
+                np.array([score if score is not None else chunk.score for chunk, _, score in retrieved]),
+                np.stack([embeddings[chunk.chunk_id] for chunk, _, _ in retrieved]),
+                rag_query.top_k,
+                rag_query.mmr_lambda
+            )
+            retrieved = [retrieved[i] for i in selected]
+        
+        contexts = []
+        sources = []
+        for chunk, doc, rerank_score in retrieved[:rag_query.top_k]:
+            contexts.append(doc.page_content)
+            metadata = dict(doc.metadata)
+            metadata["score"] = round(chunk.score, 4)
+            metadata["bm25_score"] = round(chunk.bm25_score, 4) if chunk.bm25_score is not None else None
+            metadata["vector_score"] = round(chunk.vector_score, 4) if chunk.vector_score is not None else None
+            if rerank_score is not None:
+                metadata["rerank_score"] = round(rerank_score, 4)
+            sources.append({
+                "content": doc.page_content,
+                "metadata": metadata
+            })
+        
+        # Créer et retourner la réponse RAG
+        response = RagResponse(
+            query=rag_query.query,
+            contexts=contexts,
+            sources=sources,
+            elapsed_time=time.time() - start_time
+        )
+        self.query_cache.put(plan.cache_key, response.copy(deep=True))
+        return response
+
     def get_sources_str(self, sources: List[Dict]) -> str:
         """
         Formate les sources pour l'inclusion dans un prompt
@@ -459,11 +1520,26 @@ class RAGSystem:
         Returns:
             True si la suppression a réussi, False sinon
         """
+        # Un nom invalide est refusé avant toute suppression de fichier
+        validate_collection_name(collection_name)
         try:
-            if collection_name in self.vectorstores:
-                del self.vectorstores[collection_name]
+            backend = self.load_manifest(collection_name).get("vector_backend", "chroma")
+            vectorstore = self.vectorstores.pop(collection_name, None)
+            if isinstance(vectorstore, FlatVectorStore):
+                vectorstore.close()
+            self.registries.pop(collection_name, None)
+            self.chunkers.pop(collection_name, None)
+            self.near_duplicate_indices.pop(collection_name, None)
+            # Libère la place ; une collection recréée sous le même nom a une autre
+            # génération, ce qui écarte aussi les réponses gardées par les autres processus
+            self.query_cache.invalidate(collection_name)
+            bm25_index = self.bm25_indices.pop(collection_name, None)
+            if bm25_index is not None:
+                bm25_index.close()
             
-            self.chroma_client.delete_collection(collection_name)
+            if backend == "chroma":
+                self.chroma_client.delete_collection(collection_name)
+            shutil.rmtree(self.collection_dir(collection_name), ignore_errors=True)
             logger.info(f"Collection {collection_name} supprimée avec succès")
             return True
         except Exception as e:
@@ -481,17 +1557,28 @@ class RAGSystem:
             Nombre de tokens
         """
         # Utilisation de tiktoken pour le comptage de tokens
-        enc = tiktoken.get_encoding("cl100k_base")  # Encodage compatible avec la plupart des modèles
-        return len(enc.encode(text))
+        return len(get_token_encoding().encode(text))
+
+def get_token_encoding():
+    """
+    Renvoie l'encodage tiktoken utilisé pour le comptage de tokens
+    """
+    return get_tokenizer("cl100k_base")  # Encodage compatible avec la plupart des modèles
 
-# Création d'une instance globale du système RAG
-rag_system = RAGSystem()
+# Instance globale du système RAG (créée au premier appel de get_rag_system)
+rag_system = None
+_rag_system_lock = threading.Lock()
 
 # Fonction pour obtenir l'instance du système RAG
 def get_rag_system() -> RAGSystem:
     """
-    Renvoie l'instance globale du système RAG
+    Renvoie l'instance globale du système RAG, en la créant si nécessaire
     """
+    global rag_system
+    if rag_system is None:
+        with _rag_system_lock:
+            if rag_system is None:
+                rag_system = RAGSystem()
     return rag_system
 
 if __name__ == "__main__":
@@ -502,7 +1589,7 @@ if __name__ == "__main__":
     collection_name = "test_collection"
     
     # Récupération des collections existantes
-    collections = rag_system.list_collections()
+    collections = get_rag_system().list_collections()
     print(f"Collections existantes: {[col.name for col in collections]}")
     
     # Affichage d'un message de confirmation
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de reclassement des chunks pour TurboChat
+
+Ce module fournit une étape optionnelle après la recherche :
+- Un modèle cross-encoder local (sentence-transformers, sur CPU) note chaque
+  couple (requête, chunk) en lisant les deux textes ensemble
+- Tous les candidats d'une requête sont notés en un seul lot
+- Les scores sont gardés en cache (LRU) par couple (requête, texte du chunk)
+- Des statistiques de latence et de taux de succès du cache
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-reranker")
+
+# Répertoire des modèles de reclassement locaux
+RERANK_MODELS_DIR = os.environ.get(
+    "RERANK_MODELS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "rerankers")
+)
+# Modèle cross-encoder (nom d'un sous-répertoire de RERANK_MODELS_DIR ou
+# chemin absolu). Vide : pas de reclassement.
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "")
+# Candidats de la recherche notés par le modèle
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "20"))
+# Longueur maximale (en tokens du modèle) d'un couple requête + chunk
+RERANK_MAX_LENGTH = int(os.environ.get("RERANK_MAX_LENGTH", "512"))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", "32"))
+# Nombre de scores gardés en cache
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", "20000"))
+
+
+def pair_key(query: str, text: str) -> bytes:
+    """Clé de cache d'un couple (requête, texte du chunk)"""
+    return hashlib.blake2b(f"{query.strip()}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+
+class CrossEncoderReranker:
+    """
+    Reclassement par un modèle cross-encoder local
+
+    Le modèle est chargé depuis le disque à la première utilisation, sans
+    accès réseau. Les couples absents du cache sont notés en un seul appel
+    au modèle, par lots de RERANK_BATCH_SIZE.
+    """
+
+    def __init__(self, model_name: str, cache_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.model_path = model_name if os.path.isabs(model_name) else os.path.join(RERANK_MODELS_DIR, model_name)
+        self.cache_size = cache_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "pairs": 0, "cache_hits": 0, "model_calls": 0, "model_time": 0.0}
+
+    @property
+    def model(self):
+        """Modèle cross-encoder (chargé à la première utilisation)"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    def _load(self):
+        if not os.path.isdir(self.model_path):
+            raise FileNotFoundError(
+                f"Modèle de reclassement introuvable: {self.model_path}. "
+                f"Copiez le modèle dans {RERANK_MODELS_DIR} pour un fonctionnement hors ligne."
+            )
+
+        # Aucun téléchargement : le modèle doit être présent sur le disque
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+        start_time = time.perf_counter()
+        from sentence_transformers import CrossEncoder
+
+        model = CrossEncoder(self.model_path, device="cpu", max_length=RERANK_MAX_LENGTH)
+        logger.info(f"Modèle de reclassement {self.model_name} chargé en {time.perf_counter() - start_time:.2f} secondes")
+        return model
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Note la pertinence de chunks pour une requête
+
+        Args:
+            query: Texte de la requête
+            texts: Textes des chunks candidats
+
+        Returns:
+            Score de chaque chunk (plus élevé = plus pertinent), dans l'ordre des textes
+        """
+        keys = [pair_key(query, text) for text in texts]
+        scores: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        elapsed = 0.0
+        if missing:
+            model = self.model
+            start_time = time.perf_counter()
+            predicted = model.predict(
+                [(query, texts[i]) for i in missing],
+                batch_size=RERANK_BATCH_SIZE,
+                show_progress_bar=False
+            )
+            elapsed = time.perf_counter() - start_time
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+
+        with self._lock:
+            for i in missing:
+                self._cache[keys[i]] = scores[i]
+                self._cache.move_to_end(keys[i])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._stats["queries"] += 1
+            self._stats["pairs"] += len(texts)
+            self._stats["cache_hits"] += len(texts) - len(missing)
+            if missing:
+                self._stats["model_calls"] += 1
+                self._stats["model_time"] += elapsed
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        """Latence du modèle et taux de succès du cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            cached = len(self._cache)
+        model_time = stats.pop("model_time")
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            **stats,
+            "cache_entries": cached,
+            "cache_hit_rate": round(stats["cache_hits"] / stats["pairs"], 4) if stats["pairs"] else 0.0,
+            "avg_model_ms": round(model_time / stats["model_calls"] * 1000, 2) if stats["model_calls"] else 0.0
+        }
+
+
+# Instance partagée (créée à la première utilisation)
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Renvoie le modèle de reclassement configuré, ou None si RERANK_MODEL est vide"""
+    global _reranker
+    if not RERANK_MODEL:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(RERANK_MODEL)
+    return _reranker
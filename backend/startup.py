@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de démarrage pour TurboChat
+
+Ce module fournit les fonctionnalités pour :
+- Initialiser les sous-systèmes lourds en tâche de fond (modèle, RAG, encodeurs)
+- Mesurer la durée d'initialisation de chaque sous-système
+- Produire un rapport de démarrage consultable via l'API
+- Signaler quand l'instance est prête (initialisation et préchauffage terminés)
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import psutil
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-startup")
+
+
+class StartupReport:
+    """
+    Suivi de l'initialisation des sous-systèmes
+
+    Chaque sous-système passe par les états "pending", "loading", puis
+    "ready", "skipped" ou "failed", avec sa durée d'initialisation.
+    """
+
+    def __init__(self):
+        self.subsystems: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.process_started_at = psutil.Process().create_time()
+        self.serving_at = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    def _update(self, name: str, **fields) -> None:
+        with self._lock:
+            entry = self.subsystems.setdefault(name, {
+                "status": "pending",
+                "started_at": None,
+                "duration": None,
+                "error": None
+            })
+            entry.update(fields)
+
+    def register(self, name: str) -> None:
+        """Déclare un sous-système dont l'initialisation est attendue"""
+        self._update(name)
+
+    def mark_serving(self) -> None:
+        """Note l'instant où l'API commence à accepter des requêtes"""
+        self.serving_at = time.time()
+        logger.info(f"API prête à servir en {self.serving_at - self.process_started_at:.2f} secondes")
+
+    def mark_ready(self) -> None:
+        """Note la fin de l'initialisation et du préchauffage"""
+        self.ready_at = time.time()
+        logger.info(f"Instance prête en {self.ready_at - self.process_started_at:.2f} secondes")
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def skip(self, name: str, reason: str) -> None:
+        """Marque un sous-système comme ignoré (ex: modèle absent)"""
+        self._update(name, status="skipped", error=reason)
+
+    @contextmanager
+    def track(self, name: str):
+        """
+        Mesure l'initialisation d'un sous-système
+
+        Args:
+            name: Nom du sous-système
+        """
+        self._update(name, status="loading", started_at=datetime.now().isoformat(), error=None)
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._update(name, status="failed", duration=round(time.perf_counter() - start_time, 3), error=str(e))
+            logger.error(f"Échec de l'initialisation de {name}: {e}")
+            raise
+        else:
+            # Le bloc a pu marquer lui-même le sous-système comme ignoré
+            if self.status(name) == "loading":
+                duration = round(time.perf_counter() - start_time, 3)
+                self._update(name, status="ready", duration=duration)
+                logger.info(f"{name} initialisé en {duration:.2f} secondes")
+
+    def run_in_background(self, name: str, fn: Callable[[], Any]) -> asyncio.Task:
+        """
+        Initialise un sous-système dans un thread sans bloquer la boucle d'événements
+
+        Args:
+            name: Nom du sous-système
+            fn: Fonction d'initialisation (bloquante)
+
+        Returns:
+            La tâche asyncio correspondante
+        """
+        self.register(name)
+
+        def _run():
+            with self.track(name):
+                result = fn()
+            # Les détails éventuels (ex: durée par collection) sont joints au rapport
+            if isinstance(result, dict):
+                self._update(name, details=result)
+            return result
+
+        async def _task():
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(None, _run)
+            except Exception:
+                # L'erreur est déjà consignée dans le rapport
+                return None
+
+        return asyncio.create_task(_task())
+
+    def status(self, name: str) -> Optional[str]:
+        entry = self.subsystems.get(name)
+        return entry["status"] if entry else None
+
+    def is_loading(self, name: str) -> bool:
+        return self.status(name) in ("pending", "loading")
+
+    def report(self) -> Dict[str, Any]:
+        """Renvoie le rapport de démarrage complet"""
+        with self._lock:
+            subsystems = {name: dict(entry) for name, entry in self.subsystems.items()}
+        return {
+            "process_started_at": datetime.fromtimestamp(self.process_started_at).isoformat(),
+            "time_to_serve": round(self.serving_at - self.process_started_at, 3) if self.serving_at else None,
+            "ready": self.ready,
+            "time_to_ready": round(self.ready_at - self.process_started_at, 3) if self.ready_at else None,
+            "subsystems": subsystems
+        }
+
+
+# Instance globale du rapport de démarrage
+startup_report = StartupReport()
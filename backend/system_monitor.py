@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Module de surveillance système pour TurboChat
+
+Ce module fournit un échantillonneur en tâche de fond qui relève à intervalle
+régulier les métriques de l'hôte et du processus dans un tampon circulaire :
+- CPU et mémoire de l'hôte
+- RSS, nombre de threads et descripteurs ouverts du processus
+- Latence de la boucle d'événements
+- Utilisation des threads natifs (llama.cpp / ggml)
+"""
+
+import os
+import time
+import asyncio
+import logging
+import platform
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+# Configuration du logger
+logger = logging.getLogger("turbochat-system-monitor")
+
+# Intervalle d'échantillonnage (secondes) et taille de l'historique
+SAMPLER_INTERVAL = float(os.environ.get("SYSTEM_SAMPLER_INTERVAL", "5"))
+SAMPLER_HISTORY = int(os.environ.get("SYSTEM_SAMPLER_HISTORY", "120"))
+
+
+class SystemSampler:
+    """
+    Échantillonneur périodique des métriques hôte et processus
+
+    Les relevés sont stockés dans un tampon circulaire de taille fixe : la
+    lecture du dernier relevé est en O(1) et ne déclenche aucun appel système.
+    """
+
+    def __init__(self, interval: float = SAMPLER_INTERVAL, history_size: int = SAMPLER_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history_size)
+        self.process = psutil.Process()
+        self.cpu_count = psutil.cpu_count() or 1
+        self.static_info = {
+            "platform": platform.platform(),
+            "python_version": platform.python_version(),
+            "boot_time": psutil.boot_time(),
+            "cpu_count": self.cpu_count
+        }
+        self._task = None
+        self._last_loop_lag = 0.0
+        self._native_cpu_times = {}
+        self._last_collect = None
+
+        # Premier appel pour initialiser les compteurs CPU de psutil
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    def start(self) -> None:
+        """Démarre la tâche d'échantillonnage sur la boucle courante"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Échantillonneur système démarré (intervalle {self.interval}s, historique {self.samples.maxlen})")
+
+    async def stop(self) -> None:
+        """Arrête la tâche d'échantillonnage"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Premier relevé dès le démarrage, hors de la boucle d'événements
+        try:
+            self.samples.append(await loop.run_in_executor(None, self.collect))
+        except Exception as e:
+            logger.error(f"Erreur lors de l'échantillonnage système: {e}")
+        while True:
+            try:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                # Retard du réveil par rapport à l'échéance = latence de la boucle
+                self._last_loop_lag = max(0.0, loop.time() - expected)
+
+                # Les appels psutil se font hors de la boucle d'événements
+                sample = await loop.run_in_executor(None, self.collect)
+                self.samples.append(sample)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur lors de l'échantillonnage système: {e}")
+
+    def _native_thread_usage(self, threads, elapsed: Optional[float]) -> Dict[str, Any]:
+        """
+        Calcule l'utilisation des threads natifs du processus
+
+        Les threads qui ne sont pas connus de l'interpréteur Python sont ceux
+        créés par les bibliothèques natives, principalement le pool de calcul
+        llama.cpp / ggml pendant l'inférence.
+        """
+        python_ids = {t.native_id for t in threading.enumerate()}
+        cpu_times = {t.id: t.user_time + t.system_time for t in threads if t.id not in python_ids}
+
+        cpu_delta = 0.0
+        for thread_id, cpu_time in cpu_times.items():
+            cpu_delta += cpu_time - self._native_cpu_times.get(thread_id, cpu_time)
+        self._native_cpu_times = cpu_times
+
+        utilization = None
+        if elapsed:
+            utilization = round(100.0 * cpu_delta / (elapsed * self.cpu_count), 1)
+
+        return {
+            "count": len(cpu_times),
+            "cpu_seconds": round(cpu_delta, 3),
+            "utilization_percent": utilization
+        }
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Relève l'ensemble des métriques (appels système bloquants)
+
+        Returns:
+            Un relevé horodaté
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_collect if self._last_collect is not None else None
+        self._last_collect = now
+
+        memory = psutil.virtual_memory()
+        with self.process.oneshot():
+            memory_info = self.process.memory_info()
+            threads = self.process.threads()
+            try:
+                open_fds = self.process.num_fds()
+            except AttributeError:
+                # Windows : pas de descripteurs POSIX, on compte les handles
+                open_fds = self.process.num_handles()
+            process_cpu = self.process.cpu_percent(interval=None)
+
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "percent": memory.percent,
+                "used": memory.used
+            },
+            "process": {
+                "rss": memory_info.rss,
+                "cpu_percent": process_cpu,
+                "threads": len(threads),
+                "open_fds": open_fds
+            },
+            "event_loop_lag": round(self._last_loop_lag, 4),
+            "native_threads": self._native_thread_usage(threads, elapsed)
+        }
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Renvoie le dernier relevé, ou None si aucun n'a encore été effectué"""
+        return self.samples[-1] if self.samples else None
+
+    def history(self, limit: int) -> List[Dict[str, Any]]:
+        """Renvoie au plus `limit` relevés, du plus ancien au plus récent"""
+        size = len(self.samples)
+        return list(islice(self.samples, max(0, size - limit), size))
+
+
+# Instance globale de l'échantillonneur
+system_sampler = SystemSampler()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from flat_vectors import FlatVectorStore
+
+
+def unit_vectors(count, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / "collection")
+
+
+@pytest.mark.parametrize("quantization", [None, "int8", "binary"])
+def test_upsert_delete_compact_survive_reopen(store_dir, quantization):
+    vectors = unit_vectors(30)
+    ids = [f"chunk-{i}" for i in range(30)]
+    store = FlatVectorStore(store_dir, None, quantization=quantization)
+    store.upsert(ids, vectors, [{"document_id": f"doc-{i % 3}"} for i in range(30)], [f"texte {i}" for i in range(30)])
+
+    # Remplacement d'un identifiant existant : nouvelle ligne, ancienne supprimée
+    replacement = unit_vectors(1, seed=1)
+    store.upsert(["chunk-5"], replacement, [{"document_id": "doc-9"}], ["texte remplacé"])
+    store.delete(ids=["chunk-0", "chunk-1"])
+    store.delete(where={"document_id": "doc-2"})
+    # chunk-5 (doc-2) a été remplacé par un chunk de doc-9 : il reste
+    expected = {f"chunk-{i}" for i in range(2, 30) if i % 3 != 2} | {"chunk-5"}
+    assert store.count() == len(expected)
+    store.compact()
+    store.close()
+
+    reopened = FlatVectorStore(store_dir, None, quantization=quantization)
+    assert reopened.count() == len(expected)
+    assert set(reopened.get()["ids"]) == expected
+    chunk = reopened.get(ids=["chunk-5"], include=["documents", "metadatas", "embeddings"])
+    assert chunk["documents"] == ["texte remplacé"]
+    assert chunk["metadatas"] == [{"document_id": "doc-9"}]
+    np.testing.assert_allclose(chunk["embeddings"][0], replacement[0], atol=1e-6)
+    assert reopened.get(ids=["chunk-0"])["ids"] == []
+
+    # Chaque vecteur conservé est retrouvé à sa place après compactage
+    for i in (3, 4, 5, 28):
+        query = replacement[0] if i == 5 else vectors[i]
+        hits = reopened.query(query_embeddings=[query.tolist()], n_results=1)
+        assert hits["ids"] == [[f"chunk-{i}"]]
+    reopened.close()
+
+
+def test_dimension_mismatch(store_dir):
+    store = FlatVectorStore(store_dir, None)
+    store.upsert(["a"], unit_vectors(1))
+    with pytest.raises(ValueError):
+        store.upsert(["b"], unit_vectors(1, dimension=8))
+    store.close()
@@ -0,0 +1,49 @@
+import pytest
+
+from hybrid_search import fuse
+
+BM25_HITS = [("a", 12.0), ("b", 7.5), ("c", 1.0)]
+VECTOR_HITS = [("b", 0.91), ("d", 0.80), ("a", 0.42)]
+
+
+@pytest.mark.parametrize("method", ["rrf", "weighted"])
+@pytest.mark.parametrize("vector_weight", [0.0, 0.3, 0.5, 1.0])
+def test_fused_scores_between_0_and_1_and_sorted(method, vector_weight):
+    fused = fuse(BM25_HITS, VECTOR_HITS, method=method, vector_weight=vector_weight)
+    scores = [chunk.score for chunk in fused]
+    assert all(0.0 <= score <= 1.0 for score in scores)
+    assert scores == sorted(scores, reverse=True)
+    assert {chunk.chunk_id for chunk in fused} == {"a", "b", "c", "d"}
+
+
+@pytest.mark.parametrize("method", ["rrf", "weighted"])
+def test_first_in_both_rankings_scores_1(method):
+    fused = fuse([("a", 3.0), ("b", 1.0)], [("a", 0.9), ("c", 0.5)], method=method)
+    assert fused[0].chunk_id == "a"
+    assert fused[0].score == pytest.approx(1.0)
+
+
+def test_chunk_found_by_both_searches_ranks_first():
+    fused = fuse(BM25_HITS, VECTOR_HITS, method="rrf", vector_weight=0.5)
+    assert fused[0].chunk_id == "b"
+    assert (fused[0].bm25_score, fused[0].vector_score) == (7.5, 0.91)
+    assert fused[-1].chunk_id in ("c", "d")
+
+
+def test_single_ranking_keeps_its_order():
+    fused = fuse(BM25_HITS, [], method="weighted")
+    assert [chunk.chunk_id for chunk in fused] == ["a", "b", "c"]
+    assert fused[0].score == pytest.approx(1.0)
+    assert fused[-1].score == pytest.approx(0.0)
+    assert fused[0].vector_score is None
+
+
+def test_empty_rankings():
+    assert fuse([], []) == []
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        fuse(BM25_HITS, VECTOR_HITS, method="max")
+    with pytest.raises(ValueError):
+        fuse(BM25_HITS, VECTOR_HITS, vector_weight=1.5)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from ivf_index import IVFIndex
+
+
+def clustered_vectors(count, dimension, clusters, seed=0):
+    """Vecteurs unitaires groupés autour de centres aléatoires"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(matrix, queries, k):
+    return [set(np.argsort(-(matrix @ query))[:k]) for query in queries]
+
+
+def recall(results, expected):
+    return np.mean([len({row for row, _ in hits} & truth) / len(truth) for hits, truth in zip(results, expected)])
+
+
+@pytest.fixture
+def trained_index(tmp_path):
+    matrix = clustered_vectors(4000, 32, clusters=40)
+    index = IVFIndex(str(tmp_path))
+    index.train(matrix, nlist=64)
+    index.load(len(matrix))
+    return index, matrix, str(tmp_path)
+
+
+def test_recall_against_exact_search(trained_index):
+    index, matrix, _ = trained_index
+    queries = clustered_vectors(50, 32, clusters=40, seed=1)
+    expected = exact_neighbors(matrix, queries, 10)
+    alive = np.ones(len(matrix), dtype=bool)
+
+    low = recall(index.search(matrix, alive, queries, 10, nprobe=4), expected)
+    high = recall(index.search(matrix, alive, queries, 10, nprobe=16), expected)
+    full = recall(index.search(matrix, alive, queries, 10, nprobe=index.nlist), expected)
+    assert high >= 0.9
+    assert low <= high <= full
+    assert full == 1.0
+
+
+def test_results_sorted_and_deleted_rows_skipped(trained_index):
+    index, matrix, _ = trained_index
+    alive = np.ones(len(matrix), dtype=bool)
+    alive[::2] = False
+    for hits in index.search(matrix, alive, matrix[:5], 10, nprobe=8):
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+        assert all(row % 2 == 1 for row, _ in hits)
+
+
+def test_append_and_reload(trained_index):
+    index, matrix, directory = trained_index
+    extra = clustered_vectors(100, 32, clusters=40, seed=2)
+    index.append(len(matrix), extra)
+
+    reloaded = IVFIndex(directory)
+    reloaded.load(len(matrix) + len(extra))
+    assert reloaded.nlist == 64
+    assert reloaded.offsets[-1] == len(matrix) + len(extra)
+
+    everything = np.vstack([matrix, extra])
+    alive = np.ones(len(everything), dtype=bool)
+    hits = reloaded.search(everything, alive, extra[:3], 1, nprobe=reloaded.nlist)
+    assert [row for (row, _), in hits] == [len(matrix), len(matrix) + 1, len(matrix) + 2]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from mmr import maximal_marginal_relevance
+
+# Deux copies quasi identiques (0 et 1) et deux passages distincts (2 et 3)
+EMBEDDINGS = np.array([
+    [1.0, 0.0, 0.0],
+    [0.99, 0.01, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+], dtype=np.float32)
+RELEVANCE = np.array([0.9, 0.88, 0.6, 0.5], dtype=np.float32)
+
+
+def test_relevance_only_keeps_relevance_order():
+    assert maximal_marginal_relevance(RELEVANCE, EMBEDDINGS, 4, lambda_mult=1.0) == [0, 1, 2, 3]
+
+
+def test_duplicate_selected_after_distinct_passages():
+    assert maximal_marginal_relevance(RELEVANCE, EMBEDDINGS, 4, lambda_mult=0.5) == [0, 2, 3, 1]
+
+
+def test_k_larger_than_candidates_and_empty():
+    assert sorted(maximal_marginal_relevance(RELEVANCE, EMBEDDINGS, 10)) == [0, 1, 2, 3]
+    assert maximal_marginal_relevance(np.zeros(0), np.zeros((0, 3)), 5) == []
+
+
+def test_equal_relevance_and_zero_vector():
+    relevance = np.ones(3, dtype=np.float32)
+    embeddings = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 0.0]], dtype=np.float32)
+    selected = maximal_marginal_relevance(relevance, embeddings, 3)
+    assert selected[0] == 0
+    assert sorted(selected) == [0, 1, 2]
+
+
+def test_invalid_lambda():
+    with pytest.raises(ValueError):
+        maximal_marginal_relevance(RELEVANCE, EMBEDDINGS, 2, lambda_mult=1.5)
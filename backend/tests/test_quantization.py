@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from quantization import BinaryQuantizer, Int8Quantizer, get_quantizer
+
+
+def unit_vectors(count, dimension, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_int8_round_trip():
+    vectors = unit_vectors(200, 96)
+    quantizer = Int8Quantizer(96)
+    codes = quantizer.encode(vectors)
+    assert codes.dtype == quantizer.dtype
+    decoded = codes["codes"].astype(np.float32) * codes["scale"][:, None]
+    # Erreur d'arrondi d'au plus un demi-pas par composante
+    assert np.all(np.abs(decoded - vectors) <= codes["scale"][:, None] / 2 + 1e-6)
+    assert np.abs(codes["codes"]).max() == 127
+
+
+def test_int8_scores_match_exact_similarities():
+    vectors = unit_vectors(500, 64)
+    query = unit_vectors(1, 64, seed=1)[0]
+    quantizer = Int8Quantizer(64)
+    scores = quantizer.scores(quantizer.encode(vectors), query)
+    np.testing.assert_allclose(scores, vectors @ query, atol=0.02)
+    exact_top = set(np.argsort(-(vectors @ query))[:10])
+    approx_top = set(np.argsort(-scores)[:quantizer.candidates(10)])
+    assert exact_top <= approx_top
+
+
+def test_int8_zero_vector():
+    quantizer = Int8Quantizer(8)
+    codes = quantizer.encode(np.zeros((1, 8), dtype=np.float32))
+    assert codes["scale"][0] == 1.0
+    assert not codes["codes"].any()
+
+
+@pytest.mark.parametrize("dimension", [64, 100])
+def test_binary_round_trip(dimension):
+    vectors = unit_vectors(50, dimension)
+    quantizer = BinaryQuantizer(dimension)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (50, (dimension + 63) // 64 * 8)
+    bits = np.unpackbits(codes, axis=1)
+    np.testing.assert_array_equal(bits[:, :dimension], vectors > 0)
+    # Bits de complément à zéro
+    assert not bits[:, dimension:].any()
+
+
+def test_binary_scores_are_negative_hamming_distances():
+    vectors = unit_vectors(300, 100)
+    quantizer = BinaryQuantizer(100)
+    codes = quantizer.encode(vectors)
+    scores = quantizer.scores(codes, vectors[7])
+    hamming = ((vectors > 0) != (vectors[7] > 0)).sum(axis=1)
+    np.testing.assert_array_equal(scores, -hamming.astype(np.float32))
+    assert scores[7] == 0.0
+    assert scores.max() == 0.0
+
+
+def test_get_quantizer():
+    assert get_quantizer(None, 8) is None
+    assert isinstance(get_quantizer("int8", 8), Int8Quantizer)
+    with pytest.raises(ValueError):
+        get_quantizer("pq", 8)
@@ -0,0 +1,54 @@
+from query_cache import QueryCache, cache_key, normalize_query
+
+SETTINGS = {"top_k": 5, "filter": None}
+
+
+def test_normalized_queries_share_a_key():
+    assert normalize_query("  Théorème   de\tPythagore ") == "théorème de pythagore"
+    assert cache_key("c1", "g1", 3, "Théorème de Pythagore", SETTINGS) == cache_key("c1", "g1", 3, "théorème  DE pythagore", dict(SETTINGS))
+    assert cache_key("c1", "g1", 3, "pythagore", SETTINGS) != cache_key("c1", "g1", 3, "pythagore", {"top_k": 6, "filter": None})
+
+
+def test_version_bump_misses_previous_answer():
+    cache = QueryCache(max_entries=10)
+    cache.put(cache_key("c1", "g1", 1, "pythagore", SETTINGS), "réponse v1")
+    assert cache.get(cache_key("c1", "g1", 1, "pythagore", SETTINGS)) == "réponse v1"
+    assert cache.get(cache_key("c1", "g1", 2, "pythagore", SETTINGS)) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["collections"]["c1"]["hit_ratio"] == 0.5
+
+
+def test_recreated_collection_misses_previous_answer():
+    cache = QueryCache(max_entries=10)
+    cache.put(cache_key("c1", "g1", 1, "pythagore", SETTINGS), "ancienne collection")
+    assert cache.get(cache_key("c1", "g2", 1, "pythagore", SETTINGS)) is None
+
+
+def test_invalidate_removes_only_that_collection():
+    cache = QueryCache(max_entries=10)
+    cache.put(cache_key("c1", "g1", 1, "a", SETTINGS), 1)
+    cache.put(cache_key("c1", "g1", 1, "b", SETTINGS), 2)
+    cache.put(cache_key("c2", "g1", 1, "a", SETTINGS), 3)
+    assert cache.invalidate("c1") == 2
+    assert cache.get(cache_key("c1", "g1", 1, "a", SETTINGS)) is None
+    assert cache.get(cache_key("c2", "g1", 1, "a", SETTINGS)) == 3
+
+
+def test_lru_eviction():
+    cache = QueryCache(max_entries=2)
+    keys = [cache_key("c1", "g1", 1, query, SETTINGS) for query in ("a", "b", "c")]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    cache.get(keys[0])
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disabled_cache():
+    cache = QueryCache(max_entries=0)
+    cache.put(cache_key("c1", "g1", 1, "a", SETTINGS), 1)
+    assert cache.get(cache_key("c1", "g1", 1, "a", SETTINGS)) is None
+    assert not cache.stats()["enabled"]
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import {
   Container,
@@ -28,6 +28,7 @@ import {
   Modal,
   Notification,
   Code,
+  Progress,
 } from '@mantine/core';
 import { notifications } from '@mantine/notifications';
 import { IconUpload, IconSearch, IconTrash, IconPlus, IconExclamationCircle, IconX, IconInfoCircle } from '@tabler/icons-react';
@@ -41,7 +42,10 @@ export default function RagManager() {
   const [newCollectionName, setNewCollectionName] = useState('');
   const [selectedCollection, setSelectedCollection] = useState(null);
   const [file, setFile] = useState(null);
+  const [bulkFiles, setBulkFiles] = useState([]);
   const [uploadStatus, setUploadStatus] = useState(null);
+  const [uploadJob, setUploadJob] = useState(null);
+  const jobPollRef = useRef(null);
   const [queryText, setQueryText] = useState('');
   const [queryTopK, setQueryTopK] = useState(3);
   const [useHybridSearch, setUseHybridSearch] = useState(true);
@@ -53,6 +57,7 @@ export default function RagManager() {
   // Charger les collections au chargement de la page
   useEffect(() => {
     fetchCollections();
+    return () => clearInterval(jobPollRef.current);
   }, []);
 
   // Récupérer les collections
@@ -149,30 +154,137 @@ export default function RagManager() {
     formData.append('collection_name', selectedCollection);
 
     setUploadStatus('uploading');
+    setUploadJob(null);
     try {
       const response = await axios.post('/api/rag/upload', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
       });
+      setFile(null);
+      if (response.data.status === 'duplicate') {
+        setUploadStatus(null);
+        notifications.show({
+          title: 'Déjà indexé',
+          message: response.data.message,
+          color: 'blue',
+        });
+        return;
+      }
+      setUploadStatus('indexing');
+      pollJob(response.data.job_id);
+    } catch (error) {
+      setUploadStatus('error');
+      notifications.show({
+        title: 'Erreur',
+        message: `Erreur lors de l'indexation: ${error.response?.data?.detail || error.message}`,
+        color: 'red',
+      });
+    }
+  };
+
+  // Télécharger et indexer un lot de fichiers ou une archive zip
+  const uploadBulk = async () => {
+    if (!bulkFiles.length || !selectedCollection) {
+      return;
+    }
+
+    const formData = new FormData();
+    bulkFiles.forEach((bulkFile) => formData.append('files', bulkFile));
+    formData.append('collection_name', selectedCollection);
+
+    setUploadStatus('uploading');
+    setUploadJob(null);
+    try {
+      const response = await axios.post('/api/rag/upload/bulk', formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+        },
+      });
+      setUploadStatus('indexing');
+      pollJob(response.data.job_id);
+      setBulkFiles([]);
+    } catch (error) {
+      setUploadStatus('error');
+      notifications.show({
+        title: 'Erreur',
+        message: `Erreur lors de l'indexation: ${error.response?.data?.detail || error.message}`,
+        color: 'red',
+      });
+    }
+  };
+
+  // Suivre l'avancement d'une tâche d'indexation
+  const pollJob = (jobId) => {
+    clearInterval(jobPollRef.current);
+    jobPollRef.current = setInterval(async () => {
+      try {
+        const { data: job } = await axios.get(`/api/rag/jobs/${jobId}`);
+        setUploadJob(job);
+        if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+          clearInterval(jobPollRef.current);
+          onJobFinished(job);
+        }
+      } catch (error) {
+        clearInterval(jobPollRef.current);
+        setUploadStatus('error');
+      }
+    }, 1000);
+  };
+
+  const onJobFinished = (job) => {
+    if (job.status === 'completed') {
       setUploadStatus('success');
       notifications.show({
         title: 'Succès',
-        message: `Fichier ${file.name} indexé avec succès dans ${selectedCollection}`,
-        color: 'green',
+        message: job.kind === 'bulk'
+          ? `${job.document_ids.length} documents indexés dans ${job.collection_name}` +
+            (job.files_skipped ? `, ${job.files_skipped} déjà présents` : '') +
+            (job.failed_files.length ? ` (${job.failed_files.length} en échec)` : '')
+          : job.files_skipped
+            ? `Fichier ${job.filename} déjà indexé dans ${job.collection_name}`
+            : `Fichier ${job.filename} indexé avec succès dans ${job.collection_name}`,
+        color: job.failed_files.length ? 'yellow' : 'green',
       });
       fetchCollections();
-      setFile(null);
-    } catch (error) {
+    } else if (job.status === 'cancelled') {
+      setUploadStatus('cancelled');
+    } else {
       setUploadStatus('error');
       notifications.show({
         title: 'Erreur',
-        message: `Erreur lors de l'indexation: ${error.response?.data?.detail || error.message}`,
+        message: `Erreur lors de l'indexation: ${job.error}`,
         color: 'red',
       });
     }
   };
 
+  const cancelJob = async () => {
+    try {
+      await axios.post(`/api/rag/jobs/${uploadJob.id}/cancel`);
+    } catch (error) {
+      console.error('Erreur lors de l\'annulation:', error);
+    }
+  };
+
+  const retryJob = async () => {
+    try {
+      await axios.post(`/api/rag/jobs/${uploadJob.id}/retry`);
+      setUploadStatus('indexing');
+      pollJob(uploadJob.id);
+    } catch (error) {
+      notifications.show({
+        title: 'Erreur',
+        message: `Impossible de relancer l'indexation: ${error.response?.data?.detail || error.message}`,
+        color: 'red',
+      });
+    }
+  };
+
+  const jobProgress = uploadJob && uploadJob.chunks_total
+    ? (100 * uploadJob.chunks_written) / uploadJob.chunks_total
+    : 0;
+
   // Interroger une collection
   const queryCollection = async () => {
     if (!queryText || !selectedCollection) {
@@ -364,19 +476,62 @@ export default function RagManager() {
                         value={file}
                         onChange={setFile}
                         style={{ flex: 1 }}
-                        disabled={uploadStatus === 'uploading'}
+                        disabled={uploadStatus === 'uploading' || uploadStatus === 'indexing'}
                       />
                     </Group>
                     
                     <Button
                       onClick={uploadFile}
-                      loading={uploadStatus === 'uploading'}
+                      loading={uploadStatus === 'uploading' || uploadStatus === 'indexing'}
                       disabled={!file}
                       fullWidth
                     >
-                      {uploadStatus === 'uploading' ? 'Indexation en cours...' : 'Télécharger et indexer'}
+                      {uploadStatus === 'uploading' ? 'Téléversement...' : 'Télécharger et indexer'}
+                    </Button>
+                    
+                    <Divider my="md" label="ou" labelPosition="center" />
+                    
+                    <Group position="apart" mb="md">
+                      <FileInput
+                        placeholder="Choisir des fichiers ou une archive"
+                        label="Dossier de cours"
+                        description="Plusieurs fichiers ou une archive .zip, indexés en une seule tâche"
+                        multiple
+                        accept=".zip,.pdf,.txt,.docx,.html,.csv,.md"
+                        icon={<IconUpload size={14} />}
+                        value={bulkFiles}
+                        onChange={setBulkFiles}
+                        style={{ flex: 1 }}
+                        disabled={uploadStatus === 'uploading' || uploadStatus === 'indexing'}
+                      />
+                    </Group>
+                    
+                    <Button
+                      onClick={uploadBulk}
+                      loading={uploadStatus === 'uploading' || uploadStatus === 'indexing'}
+                      disabled={!bulkFiles.length}
+                      variant="outline"
+                      fullWidth
+                    >
+                      Télécharger et indexer le lot
                     </Button>
                     
+                    {uploadStatus === 'indexing' && uploadJob && (
+                      <Box mt="md">
+                        <Group position="apart" mb="xs">
+                          <Text size="sm">
+                            {uploadJob.status === 'queued'
+                              ? 'En attente...'
+                              : `${uploadJob.kind === 'bulk' ? `${uploadJob.files_parsed}/${uploadJob.files_total} fichiers, ` : ''}${uploadJob.pages_parsed} pages lues, ${uploadJob.chunks_embedded}/${uploadJob.chunks_total} chunks encodés, ${uploadJob.chunks_written} écrits`}
+                          </Text>
+                          <Button size="xs" variant="subtle" color="red" onClick={cancelJob} disabled={uploadJob.cancel_requested}>
+                            Annuler
+                          </Button>
+                        </Group>
+                        <Progress value={jobProgress} animate />
+                      </Box>
+                    )}
+                    
                     {uploadStatus === 'success' && (
                       <Alert title="Succès" color="green" withCloseButton onClose={() => setUploadStatus(null)} mt="md">
                         Le fichier a été indexé avec succès.
@@ -386,6 +541,20 @@ export default function RagManager() {
                     {uploadStatus === 'error' && (
                       <Alert title="Erreur" color="red" withCloseButton onClose={() => setUploadStatus(null)} mt="md">
                         Une erreur s'est produite lors de l'indexation.
+                        {uploadJob && (
+                          <Button size="xs" variant="outline" color="red" ml="md" onClick={retryJob}>
+                            Réessayer
+                          </Button>
+                        )}
+                      </Alert>
+                    )}
+                    
+                    {uploadStatus === 'cancelled' && (
+                      <Alert title="Annulée" color="yellow" withCloseButton onClose={() => setUploadStatus(null)} mt="md">
+                        L'indexation a été annulée.
+                        <Button size="xs" variant="outline" color="yellow" ml="md" onClick={retryJob}>
+                          Relancer
+                        </Button>
                       </Alert>
                     )}
                   </Paper>